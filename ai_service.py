@@ -3,36 +3,95 @@ import json, tempfile, base64
 import os
 from dotenv import load_dotenv
 import re
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import canvas_analysis
+import circuit
+import complexity
+import design_diff
+import fanout
+import interactive_rules
+import journal
+import layout
+import metrics
+import template_generator
+import tracing
 
 load_dotenv()
 
+# v2 responses carry each file once in project_structure; main_html/main_css/main_js
+# hold the file name they refer to instead of a second copy of the content.
+RESPONSE_FORMAT_VERSION = 2
+
+# Bump when create_code_generation_prompt changes; recorded in the journal for replay comparisons
+PROMPT_VERSION = 2
+
+# Designs the templates recognise at least this well skip the model (above 1 disables)
+TEMPLATE_CONFIDENCE_THRESHOLD = float(os.getenv("TEMPLATE_CONFIDENCE_THRESHOLD", "0.85"))
+
+# The whiteboard's Generate button sends this; anything else carries the user's own instructions
+DEFAULT_USER_REQUEST = ("Convert this design into a modern, responsive website with proper HTML structure, "
+                        "CSS styling, and JavaScript interactivity.")
+
+# "single": one completion returns every file; "fanout": plan, then one completion per file (fanout.py)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+
+SYSTEM_PROMPT = """You are a senior full-stack developer who creates COMPLETE, 
+                    FUNCTIONAL, PRODUCTION-READY websites. EVERY element must work. 
+                    Forms must validate and submit. Buttons must have click handlers. 
+                    Navigation must work. Generate multiple HTML files if design has 
+                    multiple sections. Return valid JSON with project_structure array."""
+
+MAIN_FILE_DEFAULTS = {
+    "main_html": ("index.html", ".html"),
+    "main_css": ("styles.css", ".css"),
+    "main_js": ("script.js", ".js"),
+}
+
+
+def expand_main_file_refs(code_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compatibility shim: turn a v2 response back into the v1 shape where
+    main_html/main_css/main_js contain the full file contents."""
+    if code_data.get("format_version") != RESPONSE_FORMAT_VERSION:
+        return code_data
+
+    contents = {f.get("file"): f.get("content", "") for f in code_data.get("project_structure", [])}
+    expanded = dict(code_data)
+    for key in MAIN_FILE_DEFAULTS:
+        ref = code_data.get(key)
+        if ref:
+            expanded[key] = contents.get(ref, "")
+    expanded["format_version"] = 1
+    return expanded
+
+
+# Shared by every assistant in the process: they all talk to the same upstream
+upstream_circuit = circuit.CircuitBreaker("upstream")
+
+
+def is_stock_request(user_request: Optional[str]) -> bool:
+    """True when the request is empty or the Generate button's default prompt"""
+    normalized = " ".join((user_request or "").split()).lower()
+    return not normalized or normalized == " ".join(DEFAULT_USER_REQUEST.split()).lower()
+
+
 class AIdesignAssistant:
-    def __init__(self):
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        # Point at fake_openrouter.py (e.g. http://localhost:8001/api/v1/chat/completions) for load tests
+        self.base_url = base_url or os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
+        # Server-sent events: gives a real time-to-first-token and keeps idle connections alive
+        self.stream = os.getenv("OPENROUTER_STREAM", "0") == "1"
 
         if not self.api_key:
             print("⚠️ The API key was not found in environment variables")
 
     def create_code_generation_prompt(self, design_data, user_request):
-        # Extract the enhanced design analysis
-        design_analysis = design_data.get('design_analysis', {})
-        
-        # Detect interactive elements
-        interactive_elements = self._detect_interactive_elements(design_analysis)
-        
         prompt = f"""
 You are an expert web developer. Convert this visual design into a COMPLETE, FUNCTIONAL, PRODUCTION-READY website.
 
-# DESIGN ANALYSIS:
-{json.dumps(design_analysis, indent=2)}
-
-# DETECTED INTERACTIVE ELEMENTS:
-{self._format_interactive_detection(interactive_elements)}
-
-# USER REQUEST: 
-{user_request}
+{self.describe_design(design_data, user_request)}
 
 
 # 🚀 CRITICAL REQUIREMENTS:
@@ -89,9 +148,6 @@ Return ONLY valid JSON format:
         {{"file": "about.html", "content": "About page HTML (if needed)"}},
         {{"file": "contact.html", "content": "Contact page HTML (if needed)"}}
     ],
-    "main_html": "index.html content (for preview)",
-    "main_css": "styles.css content (for preview)",
-    "main_js": "script.js content (for preview)",
     "explanation": "Brief description of what you created and ALL functional features implemented",
     "layout_type": "identified layout type",
     "functional_features": ["list", "of", "working", "features"],
@@ -109,83 +165,68 @@ Return ONLY valid JSON format:
 
         return prompt
 
-    def _detect_interactive_elements(self, design_analysis: Dict) -> Dict:
-        """Detect what interactive elements are in the design"""
-        elements = design_analysis.get('elements', {})
-        
-        detected = {
-            "has_forms": False,
-            "has_buttons": False,
-            "has_navigation": False,
-            "has_inputs": False,
-            "has_images": False,
-            "has_cards": False,
-            "has_tables": False,
-            "has_search": False,
-            "has_login": False,
-            "has_contact": False
+    def describe_design(self, design_data, user_request) -> str:
+        """Layout, styles, interactive elements and user request: the design part of every prompt"""
+        # Extract the enhanced design analysis
+        design_analysis = design_data.get('design_analysis', {})
+
+        # Detect interactive elements
+        interactive_elements = self._detect_interactive_elements(design_analysis)
+
+        # The nested layout replaces the flat element/row lists: fewer tokens, clearer structure
+        layout_tree = layout.build_layout_tree(design_analysis)
+        design_styles = {
+            "canvas": design_analysis.get('canvas', {}),
+            "styles": design_analysis.get('styles', {}),
         }
         
-        # Check for forms
-        if elements.get('forms') or elements.get('buttons'):
-            detected["has_forms"] = True
-            
-        # Check for buttons
-        if elements.get('buttons'):
-            detected["has_buttons"] = True
-            
-        # Check for navigation
-        if elements.get('navigation') or any('nav' in str(el).lower() 
-                                           for el in elements.get('text', [])):
-            detected["has_navigation"] = True
-            
-        # Check for inputs/search
-        if any('search' in str(el).lower() or 'input' in str(el).lower()
-              for el in elements.get('text', [])):
-            detected["has_search"] = True
-            detected["has_inputs"] = True
-            
-        # Check for login/contact forms
-        text_contents = [el.get('content', '').lower() 
-                        for el in elements.get('text', [])]
-        if any('login' in text or 'sign in' in text for text in text_contents):
-            detected["has_login"] = True
-        if any('contact' in text or 'email' in text for text in text_contents):
-            detected["has_contact"] = True
-            
-        # Check for images
-        if elements.get('images'):
-            detected["has_images"] = True
-            
-        # Check for cards
-        if elements.get('containers') or any('card' in str(el).lower()
-                                           for el in elements.get('text', [])):
-            detected["has_cards"] = True
-            
+        return f"""# DESIGN LAYOUT (sections -> rows -> columns, top to bottom; sizes in px):
+{json.dumps(layout_tree, separators=(',', ':'))}
+
+# DESIGN STYLES:
+{json.dumps(design_styles, separators=(',', ':'))}
+
+# DETECTED INTERACTIVE ELEMENTS:
+{self._format_interactive_detection(interactive_elements)}
+
+# USER REQUEST: 
+{user_request}"""
+
+    def _detect_interactive_elements(self, design_analysis: Dict) -> Dict:
+        """Detect what interactive elements are in the design (flags plus per-flag evidence)"""
+        detected, evidence = interactive_rules.detect(design_analysis)
+        detected["evidence"] = evidence
         return detected
 
     def _format_interactive_detection(self, detected: Dict) -> str:
         """Format detected interactive elements for prompt"""
         features = []
+        evidence = detected.get("evidence", {})
+
+        def found(flag: str) -> str:
+            texts = list(dict.fromkeys(e["text"] for e in evidence.get(flag, []) if "text" in e))
+            return f" (e.g. {', '.join(repr(t) for t in texts)})" if texts else ""
         
         if detected["has_forms"]:
-            features.append("✅ Forms detected - will implement validation & submission")
+            features.append(f"✅ Forms detected{found('has_forms')} - will implement validation & submission")
         if detected["has_buttons"]:
-            features.append("✅ Buttons detected - will add click handlers & feedback")
+            features.append(f"✅ Buttons detected{found('has_buttons')} - will add click handlers & feedback")
         if detected["has_navigation"]:
-            features.append("✅ Navigation detected - will implement smooth scrolling/page navigation")
+            features.append(f"✅ Navigation detected{found('has_navigation')} - will implement smooth scrolling/page navigation")
         if detected["has_inputs"]:
-            features.append("✅ Input fields detected - will add validation & user feedback")
+            features.append(f"✅ Input fields detected{found('has_inputs')} - will add validation & user feedback")
         if detected["has_search"]:
-            features.append("✅ Search bar detected - will implement live search filtering")
+            features.append(f"✅ Search bar detected{found('has_search')} - will implement live search filtering")
         if detected["has_login"]:
-            features.append("✅ Login form detected - will implement mock authentication")
+            features.append(f"✅ Login form detected{found('has_login')} - will implement mock authentication")
         if detected["has_contact"]:
-            features.append("✅ Contact form detected - will implement form submission")
+            features.append(f"✅ Contact form detected{found('has_contact')} - will implement form submission")
         if detected["has_images"]:
-            features.append("✅ Images detected - will add lightbox/zoom functionality")
+            features.append(f"✅ Images detected{found('has_images')} - will add lightbox/zoom functionality")
         if detected["has_cards"]:
-            features.append("✅ Cards detected - will add hover effects & click actions")
+            features.append(f"✅ Cards detected{found('has_cards')} - will add hover effects & click actions")
+        if detected["has_tables"]:
+            features.append(f"✅ Tables detected{found('has_tables')} - will render semantic, sortable tables")
             
         if not features:
             features.append("⚠️ Basic design - will implement core functionality with working buttons/forms")
@@ -258,7 +299,7 @@ Return ONLY valid JSON format:
         else:
             return content.strip()
 
-    def call_ai_api(self, prompt, model="deepseek/deepseek-chat"):
+    def call_ai_api(self, prompt, model="deepseek/deepseek-chat", max_tokens=6000, system_prompt=None, timeout=30):
         headers = {
             "content-type": "application/json",
             "authorization": f"Bearer {self.api_key}",
@@ -266,142 +307,379 @@ Return ONLY valid JSON format:
             "X-Title": "Whiteboard2Web Functional Generator"
         }
 
+        # Opt-in: lets a traced gateway's logs line up with ours
+        if tracing.PROPAGATE_UPSTREAM and tracing.current_request_id():
+            headers["X-Request-ID"] = tracing.current_request_id()
+            headers["traceparent"] = tracing.traceparent()
+
         payload = {
             "model": model,
             "messages": [
                 {
                     "role": "system",
-                    "content": """You are a senior full-stack developer who creates COMPLETE, 
-                    FUNCTIONAL, PRODUCTION-READY websites. EVERY element must work. 
-                    Forms must validate and submit. Buttons must have click handlers. 
-                    Navigation must work. Generate multiple HTML files if design has 
-                    multiple sections. Return valid JSON with project_structure array."""
+                    "content": system_prompt or SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
                     "content": prompt
                 }
             ],
-            "max_tokens": 6000,  # Increased for complex projects
+            "max_tokens": max_tokens,
             "temperature": 0.5,
             "top_p": 0.9
         }
+        if self.stream:
+            payload["stream"] = True
+        journal.annotate(model=model, params={k: payload[k] for k in ("max_tokens", "temperature", "top_p")}, stream=self.stream)
+
+        # Upstream known to be down: fall back now instead of waiting out the timeout
+        if not upstream_circuit.allow():
+            metrics.UPSTREAM_RESPONSES.labels(status="circuit_open").inc()
+            journal.annotate(upstream={"circuit": "open"})
+            print("🔌 Upstream circuit open, skipping the API call")
+            return None
 
-        try:
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=30)
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"API Error: {response.status_code} - {response.text}")
+        with tracing.stage("upstream_total", model=model) as upstream_span:
+            try:
+                start = time.perf_counter()
+                response = requests.post(self.base_url, headers=headers, json=payload, timeout=timeout, stream=True)
+                if response.status_code == 429 or response.status_code >= 500:
+                    upstream_circuit.record_failure()
+                else:
+                    upstream_circuit.record_success()
+
+                if self.stream and response.status_code == 200:
+                    return self._read_event_stream(response, start, upstream_span)
+
+                # Read the body incrementally so time-to-first-byte can be told apart from total time.
+                # Unstreamed, the first byte arrives with the whole completion: it is not a first token
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=16384):
+                    if not body:
+                        upstream_span.set_attribute("first_byte_ms", round((time.perf_counter() - start) * 1000, 1))
+                    body.extend(chunk)
+                metrics.UPSTREAM_RESPONSES.labels(status=str(response.status_code)).inc()
+                upstream_span.set_attribute("http.status_code", response.status_code)
+                upstream_span.set_attribute("response_bytes", len(body))
+
+                if response.status_code == 200:
+                    return json.loads(body)
+                else:
+                    upstream_span.status = "error"
+                    print(f"API Error: {response.status_code} - {body.decode('utf-8', 'replace')}")
+                    return None
+
+            except (requests.exceptions.RequestException, ValueError) as e:
+                if isinstance(e, requests.exceptions.RequestException):
+                    upstream_circuit.record_failure()
+                metrics.UPSTREAM_RESPONSES.labels(status="error").inc()
+                upstream_span.status = "error"
+                upstream_span.set_attribute("error", str(e)[:200])
+                print(f"Request failed: {e}")
+                return None
+            finally:
+                journal.annotate(upstream=dict(upstream_span.attributes, duration_ms=round(upstream_span.duration_ms, 1)))
+
+    def _read_event_stream(self, response, start: float, upstream_span) -> Optional[Dict[str, Any]]:
+        """Assemble an SSE chat-completion stream into the non-streamed response shape"""
+        parts = []
+        finish_reason = None
+        usage = None
+
+        for line in response.iter_lines():
+            # Blank lines separate events; ':' lines are keep-alive comments
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+
+            event = json.loads(data)
+            if "error" in event:
+                metrics.UPSTREAM_RESPONSES.labels(status="stream_error").inc()
+                upstream_span.status = "error"
+                print(f"API Error (stream): {event['error']}")
                 return None
 
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed: {e}")
-            return None
+            usage = event.get("usage") or usage
+            for choice in event.get("choices", []):
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    if not parts:
+                        first_token = time.perf_counter() - start
+                        metrics.observe_stage("upstream_first_token", first_token)
+                        upstream_span.set_attribute("first_token_ms", round(first_token * 1000, 1))
+                    parts.append(content)
+                finish_reason = choice.get("finish_reason") or finish_reason
+
+        metrics.UPSTREAM_RESPONSES.labels(status="200").inc()
+        content = "".join(parts)
+        upstream_span.set_attribute("http.status_code", 200)
+        upstream_span.set_attribute("response_bytes", len(content))
+        return {
+            "choices": [{"message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    def generate_code(self, design_data, user_request, previous: Optional[Dict[str, Any]] = None,
+                      analyzed: bool = False) -> Dict[str, Any]:
+        """previous: {design_analysis, user_request, code} of the project's last artifact, for
+        incremental regeneration; analyzed: design_data already went through analyze_design()"""
+        with tracing.span("generate_code") as generate_span:
+            if not analyzed:
+                design_data = self.analyze_design(design_data)
+            with journal.entry(design_data, user_request):
+                code_data = self._generate_code(design_data, user_request, previous)
+                generate_span.set_attribute("files", len(code_data.get("project_structure", [])))
+                generate_span.set_attribute("layout_type", code_data.get("layout_type", ""))
+                fallback = code_data.get("layout_type") == "fallback-functional"
+                journal.annotate(
+                    outcome="fallback" if fallback else "ok",
+                    fallback_reason=code_data.get("notes") if fallback else None,
+                    files=len(code_data.get("project_structure", [])),
+                )
+                return code_data
+
+    def analyze_design(self, design_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Derive design_analysis from the fabric canvas JSON instead of trusting the client's"""
+        canvas_data = design_data.get('canvas_data') or {}
+        if not canvas_data.get('objects'):
+            return design_data
+        with tracing.stage("design_analysis"):
+            design_data = dict(design_data)
+            design_data['design_analysis'] = canvas_analysis.analyze_canvas(canvas_data, design_data.get('canvas_size'))
+        return design_data
+
+    def _generate_code(self, design_data, user_request, previous=None) -> Dict[str, Any]:
+        # Small edits to a generated project only touch the files they affect
+        if previous is not None and self.api_key:
+            updated = design_diff.regenerate(self, design_data, user_request, previous)
+            if updated is not None:
+                with tracing.stage("postprocess"):
+                    return self._postprocess_code_data(updated)
+
+        templated = self._generate_from_templates(design_data, user_request)
+        if templated is not None:
+            return templated
 
-    def generate_code(self, design_data, user_request) -> Dict[str, Any]:
         if not self.api_key:
+            metrics.GENERATION_FALLBACKS.labels(reason="no_api_key").inc()
             return self._get_functional_fallback("API key not configured")
-                # Shrink large images before sending to OpenRouter
-        design_data = self._shrink_images_in_design(design_data)
 
+        # Shrink large images before sending to OpenRouter
+        with tracing.stage("image_shrink"):
+            design_data = self._shrink_images_in_design(design_data)
+
+        if GENERATION_MODE == "fanout":
+            with tracing.stage("fanout"):
+                code_data = fanout.generate(self, design_data, user_request)
+            if code_data is not None:
+                with tracing.stage("postprocess"):
+                    code_data = self._postprocess_code_data(code_data)
+                print(f"📁 Generated {len(code_data.get('project_structure', []))} files")
+                return code_data
 
-        prompt = self.create_code_generation_prompt(design_data, user_request)
+        with tracing.stage("prompt_build"):
+            prompt = self.create_code_generation_prompt(design_data, user_request)
+        journal.annotate(prompt=prompt, prompt_version=PROMPT_VERSION)
+        # Model, token budget and deadline scale with the design instead of one size for all
+        budget = complexity.budget_model.choose(
+            design_data.get('design_analysis', {}),
+            self._detect_interactive_elements(design_data.get('design_analysis', {})),
+        )
+        journal.annotate(complexity=budget)
         print("🚀 Sending request to AI for FUNCTIONAL code generation...")
         print(f"📝 User request: {user_request}")
-
-        ai_response = self.call_ai_api(prompt)
+        print(f"📏 Complexity {budget['tier']}: {budget['model']}, max_tokens={budget['max_tokens']}, timeout={budget['timeout']}s")
+
+        start = time.perf_counter()
+        ai_response = self.call_ai_api(prompt, model=budget["model"], max_tokens=budget["max_tokens"],
+                                       timeout=budget["timeout"])
+        complexity.budget_model.record(budget, ai_response, time.perf_counter() - start)
+
+        # Cut off at the tier's cap: one retry a tier up rather than a truncated site
+        retry = None
+        if ai_response and ai_response.get('choices') and ai_response['choices'][0].get('finish_reason') == "length":
+            retry = complexity.budget_model.escalate(budget)
+        if retry is not None:
+            print(f"✂️ Cut off at {budget['max_tokens']} tokens, retrying as {retry['tier']}: "
+                  f"{retry['model']}, max_tokens={retry['max_tokens']}, timeout={retry['timeout']}s")
+            journal.annotate(complexity_retry=retry)
+            start = time.perf_counter()
+            retried = self.call_ai_api(prompt, model=retry["model"], max_tokens=retry["max_tokens"],
+                                       timeout=retry["timeout"])
+            complexity.budget_model.record(retry, retried, time.perf_counter() - start)
+            # A failed retry still leaves the truncated reply, which JSON recovery may salvage
+            if retried and retried.get('choices'):
+                ai_response = retried
 
         if ai_response and 'choices' in ai_response:
             content = ai_response['choices'][0]['message']['content']
             print("✅ AI response received")
-            
-            try:
-                clean_content = self.extract_json_from_response(content)
-                code_data = json.loads(clean_content)
-                print("✅ JSON parsed successfully")
-                
-                # Ensure required fields exist
-                # Fix: also detect empty or incomplete project_structure
-                if (
-                    'project_structure' not in code_data or
-                    not code_data['project_structure'] or
-                    not any(f.get("file") == "index.html" for f in code_data['project_structure'])
-                ):
-                    code_data = self._convert_to_project_structure(code_data)
-
-                
-                # Add functional features list if not present
-                if 'functional_features' not in code_data:
-                    code_data['functional_features'] = self._infer_functional_features(code_data)
-                
-                # Add instructions if not present
-                if 'instructions' not in code_data:
-                    code_data['instructions'] = self._generate_instructions(code_data)
-                
-                print(f"📁 Generated {len(code_data.get('project_structure', []))} files")
-                print(f"⚡ Functional features: {code_data.get('functional_features', [])}")
-                
-                return code_data
-                
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing failed: {e}")
-                
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        extracted_json = json_match.group()
-                        code_data = json.loads(extracted_json)
-                        print("✅ JSON extracted from response")
-                        return code_data
-
-                    except json.JSONDecodeError:
-                        pass
-                
+            journal.annotate(
+                content=content,
+                finish_reason=ai_response['choices'][0].get('finish_reason'),
+                usage=ai_response.get('usage'),
+            )
+            metrics.record_usage(ai_response.get('usage'))
+            if ai_response.get('usage'):
+                tracing.current_span().set_attribute("completion_tokens", ai_response['usage'].get('completion_tokens', 0))
+
+            with tracing.stage("json_parse"):
+                code_data, parse_error = self._parse_code_json(content)
+
+            if code_data is None:
                 # Return functional fallback
-                return self._get_functional_fallback(f"JSON parsing error: {str(e)}", content)
-        
+                metrics.GENERATION_FALLBACKS.labels(reason="json_parse").inc()
+                return self._get_functional_fallback(f"JSON parsing error: {parse_error}", content)
+
+            with tracing.stage("postprocess"):
+                code_data = self._postprocess_code_data(code_data)
+
+            print(f"📁 Generated {len(code_data.get('project_structure', []))} files")
+            print(f"⚡ Functional features: {code_data.get('functional_features', [])}")
+
+            return code_data
+
         print("❌ No response from AI API")
+        metrics.GENERATION_FALLBACKS.labels(reason="upstream_unavailable").inc()
         return self._get_functional_fallback("AI service unavailable")
 
+    def _generate_from_templates(self, design_data: Dict[str, Any], user_request: str) -> Optional[Dict[str, Any]]:
+        """Simple boards are assembled locally; None escalates to the model"""
+        # Templates can't follow custom instructions or embed the user's images
+        if not is_stock_request(user_request) or design_data.get("images"):
+            metrics.TEMPLATE_GENERATIONS.labels(outcome="escalated").inc()
+            journal.annotate(template_skipped="images" if design_data.get("images") else "custom_request")
+            return None
+
+        with tracing.stage("template_match"):
+            code_data, confidence = template_generator.generate(design_data.get('design_analysis', {}))
+        journal.annotate(template_confidence=confidence)
+        tracing.current_span().set_attribute("template_confidence", confidence)
+
+        if code_data is None or confidence < TEMPLATE_CONFIDENCE_THRESHOLD:
+            metrics.TEMPLATE_GENERATIONS.labels(outcome="escalated").inc()
+            return None
+
+        metrics.TEMPLATE_GENERATIONS.labels(outcome="served").inc()
+        print(f"🧩 Served from templates ({code_data['layout_type']}, confidence {confidence:.2f})")
+        return self._postprocess_code_data(code_data)
+
+    def _parse_code_json(self, content: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """Parse the model output, falling back to the outermost {...} block"""
+        try:
+            clean_content = self.extract_json_from_response(content)
+            code_data = json.loads(clean_content)
+            print("✅ JSON parsed successfully")
+            return code_data, None
+
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON parsing failed: {e}")
+
+            code_data = self._recover_json(content)
+            if code_data is not None:
+                print("✅ JSON extracted from response")
+                return code_data, None
+
+            return None, str(e)
+
+    def _recover_json(self, content: str) -> Optional[Dict]:
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+        if json_match:
+            try:
+                return json.loads(json_match.group())
+            except json.JSONDecodeError:
+                pass
+        return None
+
+    def _postprocess_code_data(self, code_data: Dict) -> Dict:
+        """Normalize parsed AI output into the v2 response format"""
+        # Ensure required fields exist
+        # Fix: also detect empty or incomplete project_structure
+        if (
+            'project_structure' not in code_data or
+            not code_data['project_structure'] or
+            not any(f.get("file") == "index.html" for f in code_data['project_structure'])
+        ):
+            code_data = self._convert_to_project_structure(code_data)
+
+        code_data = self._link_main_files(code_data)
+
+        # Add functional features list if not present
+        if 'functional_features' not in code_data:
+            code_data['functional_features'] = self._infer_functional_features(code_data)
+
+        # Add instructions if not present
+        if 'instructions' not in code_data:
+            code_data['instructions'] = self._generate_instructions(code_data)
+
+        return code_data
+
     def _convert_to_project_structure(self, code_data: Dict) -> Dict:
         """Convert old format to new project_structure format"""
-        project_structure = []
-        
-        # Add HTML
-        if 'html' in code_data:
-            project_structure.append({
-                "file": "index.html",
-                "content": code_data['html']
-            })
-            code_data['main_html'] = code_data['html']
-        
-        # Add CSS
-        if 'css' in code_data:
-            project_structure.append({
-                "file": "styles.css",
-                "content": code_data['css']
-            })
-            code_data['main_css'] = code_data['css']
-        
-        # Add JavaScript
-        if 'javascript' in code_data:
-            project_structure.append({
-                "file": "script.js",
-                "content": code_data['javascript']
-            })
-            code_data['main_js'] = code_data['javascript']
-        
+        project_structure = list(code_data.get('project_structure') or [])
+        existing = {f.get("file") for f in project_structure}
+        existing_contents = {f.get("content") for f in project_structure}
+
+        # Move html/css/javascript (or inline main_* content) into files
+        for legacy_key, main_key, filename in (
+            ('html', 'main_html', 'index.html'),
+            ('css', 'main_css', 'styles.css'),
+            ('javascript', 'main_js', 'script.js'),
+        ):
+            content = code_data.pop(legacy_key, None)
+            if content is None and code_data.get(main_key) not in (None, filename):
+                content = code_data.pop(main_key)
+            if content is not None and filename not in existing and content not in existing_contents:
+                project_structure.append({
+                    "file": filename,
+                    "content": content
+                })
+                existing.add(filename)
+
         code_data['project_structure'] = project_structure
         return code_data
 
+    def _link_main_files(self, code_data: Dict) -> Dict:
+        """Replace main_html/main_css/main_js with references into project_structure"""
+        files = code_data.get('project_structure', [])
+        names = [f.get("file", "") for f in files]
+
+        for key, (default_name, ext) in MAIN_FILE_DEFAULTS.items():
+            value = code_data.pop(key, None)
+
+            if default_name in names:
+                ref = default_name
+            else:
+                ref = next((n for n in names if n.endswith(ext)), None)
+
+            # The model sometimes inlines content here that is not in project_structure
+            if ref is None and value and value not in names:
+                files.append({"file": default_name, "content": value})
+                names.append(default_name)
+                ref = default_name
+
+            if ref:
+                code_data[key] = ref
+
+        code_data['format_version'] = RESPONSE_FORMAT_VERSION
+        return code_data
+
+    def _get_file_content(self, code_data: Dict, main_key: str) -> str:
+        """Resolve a main_* reference to the file content in project_structure"""
+        ref = code_data.get(main_key)
+        for f in code_data.get('project_structure', []):
+            if f.get("file") == ref:
+                return f.get("content", "") or ''
+        return ''
+
     def _infer_functional_features(self, code_data: Dict) -> List[str]:
         """Infer functional features from generated code"""
         features = ["responsive"]
         
-        js_content = code_data.get('main_js', '') or ''
-        html_content = code_data.get('main_html', '') or ''
+        js_content = self._get_file_content(code_data, 'main_js')
+        html_content = self._get_file_content(code_data, 'main_html')
         
         # Check for form functionality
         if 'addEventListener' in js_content and ('submit' in js_content or 'click' in js_content):
@@ -466,9 +744,10 @@ Return ONLY valid JSON format:
                     "content": self._get_basic_functional_js()
                 }
             ],
-            "main_html": self._get_basic_functional_html(),
-            "main_css": self._get_basic_functional_css(),
-            "main_js": self._get_basic_functional_js(),
+            "main_html": "index.html",
+            "main_css": "styles.css",
+            "main_js": "script.js",
+            "format_version": RESPONSE_FORMAT_VERSION,
             "explanation": f"Functional fallback template - {error_message}",
             "layout_type": "fallback-functional",
             "functional_features": ["responsive", "forms", "buttons", "navigation", "validation"],
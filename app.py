@@ -1,19 +1,86 @@
 import ai_service
-from flask import Flask, request, jsonify, render_template, session, redirect
+import assets
+import auth_pool
+import fingerprint
+import journal
+import metrics
+import tracing
+import profiling
+import memory
+import mongo_pool
+import speculation
+import thumbnails
+import zip_export
+import preview
+import project_search
+from artifact_store import ArtifactStore
+from flask import Flask, request, jsonify, render_template, session, redirect, Response, stream_with_context, send_from_directory
 from flask_cors import CORS
-from pymongo import MongoClient
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from bson import ObjectId
+from functools import wraps
 import datetime
+import hmac
+import os
+import secrets
+import time
+import uuid
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
-app.secret_key = "supersecretkey"   # REQUIRED for login sessions
+
+
+def secret_from_env(name):
+    """A signing key from the environment; unset, a random one that only lives as long as this process tree"""
+    value = os.getenv(name)
+    if not value:
+        value = secrets.token_hex(32)
+        # Processes started from here (hashing pool, ...) see the same key
+        os.environ[name] = value
+        print(f"⚠️ {name} is not set: using a random key, so it changes on every restart")
+    return value
+
+
+# Signs login sessions (REQUIRED); the preview key signs /preview/ and download tokens
+app.secret_key = secret_from_env("SECRET_KEY")
 
 CORS(app)
 
+# remote_addr (login throttling keys on it) is the client, not the reverse proxy
+if auth_pool.TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=auth_pool.TRUSTED_PROXY_HOPS,
+                            x_proto=auth_pool.TRUSTED_PROXY_HOPS)
+
+# Minified, fingerprinted static files + asset_url() for templates
+assets.init_app(app)
+metrics.init_app(app)
+tracing.init_app(app)
+memory.init_app(app)
+
 ai_assistant = ai_service.AIdesignAssistant()
 
+
+def is_admin_request():
+    """True when the request carries ADMIN_TOKEN in X-Admin-Token (never the URL: it would end up in logs)"""
+    expected = os.getenv("ADMIN_TOKEN")
+    supplied = request.headers.get("X-Admin-Token") or ""
+    return bool(expected) and hmac.compare_digest(supplied, expected)
+
+
+def admin_required(view):
+    """Debug/ops routes: when ADMIN_TOKEN is not configured they don't exist at all"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({"error": "Not found"}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Admin-only ?__profile= / X-Profile on generation and project routes
+profiling.init_app(app, is_admin=is_admin_request)
+
+
 # -------------------------------
 # 🚀 PUBLIC LANDING PAGE (Home)
 # -------------------------------
@@ -51,20 +118,59 @@ def home_page():
 
 
 
+def auth_response(route, start, outcome, body, status=200, retry_after=None):
+    """JSON answer for login/signup, timed under its outcome"""
+    metrics.LOGIN_SECONDS.labels(route=route, outcome=outcome).observe(time.perf_counter() - start)
+    response = jsonify(body)
+    response.status_code = status
+    if retry_after:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def throttled(route, start, email=None):
+    """A 429 response when this IP (or email's failed logins) is over its limit, else None"""
+    ip_wait = auth_pool.ip_attempts.retry_after(request.remote_addr)
+    email_wait = auth_pool.email_failures.retry_after(email) if email else 0
+    if not ip_wait and not email_wait:
+        auth_pool.ip_attempts.add(request.remote_addr)
+        return None
+    metrics.AUTH_REJECTIONS.labels(reason="throttled_ip" if ip_wait else "throttled_email").inc()
+    wait = max(ip_wait, email_wait)
+    return auth_response(route, start, "throttled",
+                         {"success": False, "message": f"Too many attempts, try again in {wait} seconds"},
+                         429, retry_after=wait)
+
+
+def auth_busy(route, start, error):
+    print(f"⚠️ Password hashing unavailable: {error}")
+    metrics.AUTH_REJECTIONS.labels(reason="busy").inc()
+    return auth_response(route, start, "busy",
+                         {"success": False, "message": "Server busy, please try again"}, 503, retry_after=1)
+
+
 # -------------------------------
 # 🛠 SIGN UP
 # -------------------------------
 @app.route("/api/signup", methods=["POST"])
 def signup():
+    start = time.perf_counter()
     data = request.json
     name = data.get("name")
     email = data.get("email")
     password = data.get("password")
 
+    refused = throttled("signup", start)
+    if refused:
+        return refused
+
     if users_col.find_one({"email": email}):
-        return jsonify({"success": False, "message": "Email already exists"})
+        return auth_response("signup", start, "exists", {"success": False, "message": "Email already exists"})
 
-    hashed = generate_password_hash(password)
+    try:
+        hashed = auth_pool.hash_pool.hash(password)
+    except auth_pool.AuthUnavailable as e:
+        return auth_busy("signup", start, e)
 
     user_id = users_col.insert_one({
         "name": name,
@@ -74,7 +180,7 @@ def signup():
     }).inserted_id
 
     session["user_id"] = str(user_id)
-    return jsonify({"success": True, "redirect": "/home"})
+    return auth_response("signup", start, "success", {"success": True, "redirect": "/home"})
 
 
 # -------------------------------
@@ -82,21 +188,34 @@ def signup():
 # -------------------------------
 @app.route("/api/login", methods=["POST"])
 def login():
+    start = time.perf_counter()
     data = request.json
     email = data.get("email")
     password = data.get("password")
+    email_key = (email or "").strip().lower()
+
+    # Credential stuffing is turned away here, before any hashing
+    refused = throttled("login", start, email_key)
+    if refused:
+        return refused
 
     user = users_col.find_one({"email": email})
 
     if not user:
-        return jsonify({"success": False, "message": "User not found"})
+        return auth_response("login", start, "no_user", {"success": False, "message": "User not found"})
 
-    if not check_password_hash(user["password"], password):
-        return jsonify({"success": False, "message": "Incorrect password"})
+    try:
+        valid = auth_pool.hash_pool.verify(user["password"], password)
+    except auth_pool.AuthUnavailable as e:
+        return auth_busy("login", start, e)
+    if not valid:
+        auth_pool.email_failures.add(email_key)
+        return auth_response("login", start, "wrong_password", {"success": False, "message": "Incorrect password"})
 
     # login success
+    auth_pool.email_failures.reset(email_key)
     session["user_id"] = str(user["_id"])
-    return jsonify({"success": True, "redirect": "/home"})
+    return auth_response("login", start, "success", {"success": True, "redirect": "/home"})
 
 
 # -------------------------------
@@ -111,6 +230,101 @@ def logout():
 # --------------------------------------
 # ✨ AI CODE GENERATION (unchanged)
 # --------------------------------------
+def find_near_duplicate(user_id, design_fingerprint):
+    """(artifact, similarity) of the user's most similar earlier generation for the same request"""
+    try:
+        with tracing.span("near_duplicate_lookup") as lookup_span:
+            candidates = artifact_store.find_by_bands(user_id, design_fingerprint["request"], design_fingerprint["bands"])
+            best, score = fingerprint.best_match(design_fingerprint, candidates)
+            lookup_span.set_attribute("candidates", len(candidates))
+            lookup_span.set_attribute("similarity", score)
+            if best is None:
+                return None, 0.0
+            return artifact_store.get(str(best["_id"])), score
+    except Exception as e:
+        print(f"⚠️ Near-duplicate lookup failed: {e}")
+        return None, 0.0
+
+
+def run_generation(design_data, user_prompt, project_id, user_id):
+    """Generate (or reuse) code for an analyzed design and store it; the result carries artifact_id"""
+    # Regenerating a saved project only redoes what changed since its last artifact
+    previous = None
+    if project_id and user_id:
+        try:
+            with tracing.span("artifact_lookup"):
+                previous = artifact_store.latest_for_project(project_id, user_id)
+        except Exception as e:
+            print(f"⚠️ Failed to load the previous artifact: {e}")
+
+    # A design that is structurally the same as an earlier one (a few pixels nudged) with
+    # the same request and text gets that result back; a merely similar one of the same
+    # project seeds an incremental update when it is closer than the project's latest artifact
+    design_fingerprint = None
+    if user_id:
+        design_fingerprint = fingerprint.fingerprint(design_data.get('design_analysis', {}), user_prompt)
+        match, score = find_near_duplicate(user_id, design_fingerprint)
+        if match and score >= fingerprint.NEAR_DUPLICATE_THRESHOLD \
+                and match["fingerprint"].get("content") == design_fingerprint["content"]:
+            metrics.NEAR_DUPLICATE_LOOKUPS.labels(outcome="hit").inc()
+            print(f"🎯 Near-duplicate of artifact {match['_id']} (similarity {score:.2f})")
+            return with_preview_url(dict(match["code"], artifact_id=str(match["_id"])))
+        if match and score >= fingerprint.WARM_START_THRESHOLD \
+                and project_id and match.get("project_id") == project_id:
+            metrics.NEAR_DUPLICATE_LOOKUPS.labels(outcome="warm").inc()
+            previous = match
+        else:
+            metrics.NEAR_DUPLICATE_LOOKUPS.labels(outcome="miss").inc()
+
+    result = ai_assistant.generate_code(design_data, user_prompt, previous=previous, analyzed=True)
+    if result is None:
+        return None
+
+    # Keep the result server-side so downloads/previews don't need the browser to resend it
+    fallback = result.get("layout_type") == "fallback-functional"
+    try:
+        with tracing.span("artifact_save"):
+            result["artifact_id"] = artifact_store.save(
+                result, user_id=user_id, project_id=project_id,
+                design_analysis=design_data.get('design_analysis'), user_request=user_prompt,
+                fingerprint=None if fallback else design_fingerprint)
+    except Exception as e:
+        print(f"⚠️ Failed to store artifact: {e}")
+    if not fallback:
+        try:
+            project_index.index_artifact(project_id, user_id, result)
+        except Exception as e:
+            print(f"⚠️ Failed to index the artifact for search: {e}")
+    return with_preview_url(result)
+
+
+def with_preview_url(result):
+    """The owner gets the preview and download URLs along with the code; their token
+    authorizes the site's files and, for anonymous artifacts, the ZIP export"""
+    if result.get("artifact_id"):
+        artifact_id = result["artifact_id"]
+        result["preview_url"] = preview_host.url(artifact_id)
+        result["download_url"] = f"/api/artifacts/{artifact_id}/download?token={preview_host.token(artifact_id)}"
+    return result
+
+
+def speculation_owner():
+    """Whose speculative result this is: the user, or a random per-session key when anonymous"""
+    if session.get("user_id"):
+        return "user:" + session["user_id"]
+    if "speculation_key" not in session:
+        session["speculation_key"] = uuid.uuid4().hex
+    return "anon:" + session["speculation_key"]
+
+
+def speculation_key(design_data, user_prompt, project_id):
+    return "|".join([
+        journal.design_hash(design_data.get('design_analysis', {})),
+        fingerprint.request_key(user_prompt),
+        project_id or "",
+    ])
+
+
 @app.route('/api/generated', methods=['POST'])
 def generate_code_endpoint():
     if not request.json:
@@ -118,22 +332,143 @@ def generate_code_endpoint():
 
     design_data = request.json.get('design_data', {})
     user_prompt = request.json.get('user_prompt', '')
+    # Clients that still read main_html/main_css/main_js as content send 1
+    response_format = request.json.get('response_format', ai_service.RESPONSE_FORMAT_VERSION)
 
     if not user_prompt:
         return jsonify({"error": "user_prompt is required"}), 400
 
-    result = ai_assistant.generate_code(design_data, user_prompt)
+    project_id = request.json.get('project_id')
+    user_id = session.get("user_id")
+    design_data = ai_assistant.analyze_design(design_data)
+
+    # Usually already generated (or generating) since the whiteboard went idle
+    result = None
+    if speculation.SPECULATION_ENABLED:
+        with tracing.span("speculation_claim"):
+            result = speculator.claim(speculation_owner(), speculation_key(design_data, user_prompt, project_id))
+    if result is None:
+        result = run_generation(design_data, user_prompt, project_id, user_id)
 
     if result is None:
         return jsonify({"error": "Failed to generate code"}), 500
+
+    if response_format == 1:
+        result = ai_service.expand_main_file_refs(result)
     return jsonify({"success": True, "code": result}), 200
 
 
+@app.route('/api/generated/speculate', methods=['POST'])
+def speculate_endpoint():
+    """Debounced ping from an idle whiteboard: start generating before "Generate" is clicked"""
+    if not speculation.SPECULATION_ENABLED:
+        return jsonify({"success": True, "status": "disabled"}), 202
+    if not request.json or not request.json.get('user_prompt'):
+        return jsonify({"error": "design_data and user_prompt are required"}), 400
+
+    user_prompt = request.json['user_prompt']
+    project_id = request.json.get('project_id')
+    user_id = session.get("user_id")
+    design_data = ai_assistant.analyze_design(request.json.get('design_data', {}))
+    key = speculation_key(design_data, user_prompt, project_id)
+
+    status = speculator.submit(
+        speculation_owner(), key,
+        lambda: run_generation(design_data, user_prompt, project_id, user_id),
+    )
+    return jsonify({"success": True, "status": status}), 202
+
+
+# --------------------------------------
+# 📦 ZIP EXPORT OF A GENERATED PROJECT
+# --------------------------------------
+@app.route('/api/artifacts/<artifact_id>/download')
+def download_artifact(artifact_id):
+    has_token = preview_host.valid_token(artifact_id, request.args.get("token", ""))
+    artifact = artifact_store.get_for_user(artifact_id, session.get("user_id"), has_token)
+    if not artifact:
+        return jsonify({"success": False, "message": "Not found"}), 404
+
+    code_data = artifact["code"]
+    created_at = artifact.get("created_at")
+    files = zip_export.iter_project_files(code_data, created_at)
+
+    # No Content-Length: the archive is streamed with chunked transfer encoding
+    return Response(
+        stream_with_context(zip_export.stream_zip(files, created_at)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="whiteboard2web-{artifact_id}.zip"'}
+    )
+
+
+# --------------------------------------
+# 👁️ LIVE PREVIEW HOST FOR GENERATED SITES
+# --------------------------------------
+@app.route('/preview/<artifact_id>/<token>/', defaults={"path": ""})
+@app.route('/preview/<artifact_id>/<token>/<path:path>')
+def preview_artifact(artifact_id, token, path):
+    preview_file = preview_host.get_file(artifact_id, token, path)
+    if not preview_file:
+        return Response("Not found", status=404, mimetype="text/plain")
+    return preview.build_response(preview_file, request, Response)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    body, content_type = metrics.metrics_payload()
+    return Response(body, content_type=content_type)
+
+
+# --------------------------------------
+# 🔍 DEBUG: REQUEST TRACES
+# --------------------------------------
+@app.route('/debug/traces')
+@admin_required
+def debug_traces():
+    limit = min(request.args.get("limit", 50, type=int), tracing.TRACE_BUFFER_SIZE)
+    if request.args.get("format") == "json":
+        return jsonify({"traces": tracing.recent_traces(limit)})
+    return render_template("debug_traces.html", traces=tracing.recent_traces(limit))
+
+
+# --------------------------------------
+# 🔬 DEBUG: STORED REQUEST PROFILES
+# --------------------------------------
+@app.route('/debug/profiles')
+@admin_required
+def debug_profiles():
+    return jsonify({"profiles": profiling.list_profiles()})
+
+
+@app.route('/debug/profiles/<name>')
+@admin_required
+def debug_profile_file(name):
+    if not profiling.is_profile_name(name):
+        return jsonify({"error": "Not found"}), 404
+    return send_from_directory(profiling.PROFILE_DIR, name, as_attachment=True)
+
+
 @app.route('/health')
+@app.route('/health/live')
 def health_check():
+    """Liveness: the process answers requests; dependencies are /health/ready's business"""
     return jsonify({"status": "ok"})
 
 
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: MongoDB answers a ping. The upstream circuit is reported but only fails
+    readiness with READY_REQUIRES_UPSTREAM=1, since every instance shares that upstream"""
+    database = mongo_pool.ping(mongo)
+    upstream = ai_service.upstream_circuit.current_state()
+    ready = database["ok"] and (upstream != "open" or os.getenv("READY_REQUIRES_UPSTREAM", "0") != "1")
+    return jsonify({
+        "status": "ready" if ready else "unavailable",
+        "mongo": database,
+        "upstream_circuit": upstream,
+    }), 200 if ready else 503
+
+
 @app.route('/api/test', methods=['POST'])
 def test_connection():
     return jsonify({"status": "connected"})
@@ -162,6 +497,9 @@ def save_project():
     project_id = data.get("project_id")
     title = data.get("title")
     design = data.get("design")
+    # Mongo keeps milliseconds; the thumbnail worker matches on this exact value
+    now = datetime.datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
 
     # UPDATE existing project
     if project_id:
@@ -170,9 +508,11 @@ def save_project():
             {"$set": {
                 "title": title,
                 "design": design,
-                "updated_at": datetime.datetime.utcnow()
+                "canvas_text": project_search.canvas_text(design),
+                "updated_at": now
             }}
         )
+        thumbnail_store.schedule(project_id, design, now)
         return jsonify({"success": True, "project_id": project_id})
 
     # CREATE new project
@@ -180,10 +520,12 @@ def save_project():
         "user_id": session["user_id"],
         "title": title,
         "design": design,
-        "created_at": datetime.datetime.utcnow(),
-        "updated_at": datetime.datetime.utcnow()
+        "canvas_text": project_search.canvas_text(design),
+        "created_at": now,
+        "updated_at": now
     }).inserted_id
 
+    thumbnail_store.schedule(str(new_id), design, now)
     return jsonify({"success": True, "project_id": str(new_id)})
 
 @app.route("/api/projects", methods=["GET"])
@@ -191,12 +533,61 @@ def get_projects():
     if "user_id" not in session:
         return jsonify({"success": False, "projects": []})
 
-    projects = list(projects_col.find({"user_id": session["user_id"]}))
+    # The dashboard needs titles and thumbnails, not every design in full
+    projects = list(projects_col.find({"user_id": session["user_id"]}, {"title": 1, "updated_at": 1, "thumbnail": 1}))
     for p in projects:
         p["_id"] = str(p["_id"])
     return jsonify({"success": True, "projects": projects})
 
 
+@app.route("/api/projects/search", methods=["GET"])
+def search_projects():
+    """?q=words[&page=1&per_page=20]: the user's projects ranked by title, canvas text and generated code"""
+    if "user_id" not in session:
+        return jsonify({"success": False, "projects": []})
+
+    query = (request.args.get("q") or "").strip()[:200]
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", project_search.SEARCH_PER_PAGE, type=int)
+    if not query:
+        return jsonify({"success": True, "projects": [], "page": page, "has_more": False})
+
+    with tracing.span("project_search"):
+        projects, has_more = project_index.search(session["user_id"], query, page, per_page)
+    for p in projects:
+        p["_id"] = str(p["_id"])
+    return jsonify({"success": True, "projects": projects, "page": page, "has_more": has_more})
+
+
+@app.route("/api/projects/<project_id>/thumbnail", methods=["GET"])
+def project_thumbnail(project_id):
+    try:
+        oid = ObjectId(project_id)
+    except Exception:
+        return jsonify({"success": False, "message": "Not found"}), 404
+    project = projects_col.find_one({"_id": oid}, {"user_id": 1, "thumbnail": 1, "updated_at": 1})
+    if not project or project.get("user_id") != session.get("user_id"):
+        return jsonify({"success": False, "message": "Not found"}), 404
+
+    digest = project.get("thumbnail")
+    svg = thumbnail_store.get(digest) if digest else None
+    if svg is None:
+        # Saved before thumbnails existed (or still rendering): render now, briefly wait for it.
+        # Dashboard polls join the render already queued instead of queueing another
+        future = thumbnail_store.pending(project_id, project.get("updated_at"))
+        if future is None:
+            design = (projects_col.find_one({"_id": oid}, {"design": 1}) or {}).get("design") or {}
+            future = thumbnail_store.schedule(project_id, design, project.get("updated_at"))
+        try:
+            digest = future.result(timeout=thumbnails.THUMBNAIL_WAIT)
+        except Exception:
+            digest = None
+        svg = thumbnail_store.get(digest) if digest else None
+        if svg is None:
+            return thumbnails.build_response(thumbnails.PLACEHOLDER_SVG, None, False, request, Response)
+    return thumbnails.build_response(svg, digest, request.args.get("v") == digest, request, Response)
+
+
 @app.route("/api/projects/<project_id>", methods=["GET"])
 def load_project(project_id):
     project = projects_col.find_one({"_id": ObjectId(project_id)})
@@ -236,12 +627,21 @@ def list_projects():
 # --------------------------------------
 # 🗂 MongoDB Connection
 # --------------------------------------
-import os
-mongo = MongoClient(os.getenv("MONGO_URI"))
+mongo = mongo_pool.create_client()
 
 db = mongo["whiteboard2web"]
 users_col = db["users"]
 projects_col = db["projects"]
+artifact_store = ArtifactStore(db["artifacts"])
+project_index = project_search.ProjectSearch(projects_col)
+try:
+    artifact_store.ensure_indexes()
+    project_index.ensure_indexes()
+except Exception as e:
+    print(f"⚠️ Could not create indexes: {e}")
+preview_host = preview.PreviewHost(artifact_store, secret_from_env("PREVIEW_SECRET"))
+thumbnail_store = thumbnails.ThumbnailStore(db["thumbnails"], projects_col)
+speculator = speculation.Speculator(upstream_healthy=ai_service.upstream_circuit.healthy)
 
 # --------------------------------------
 # RUN SERVER
@@ -0,0 +1,68 @@
+import datetime
+from typing import Dict, Any, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class ArtifactStore:
+    """Generated code results, stored once per generation so they can be
+    downloaded, previewed and reused without the browser resending them."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def save(self, code_data: Dict[str, Any], user_id: Optional[str] = None,
+             project_id: Optional[str] = None, design_analysis: Optional[Dict[str, Any]] = None,
+             user_request: Optional[str] = None, fingerprint: Optional[Dict[str, Any]] = None) -> str:
+        artifact_id = self.collection.insert_one({
+            "user_id": user_id,
+            "project_id": project_id,
+            "code": code_data,
+            # What the code was generated from, so the next generation can diff against it
+            "design_analysis": design_analysis,
+            "user_request": user_request,
+            # fingerprint.fingerprint(): near-duplicate lookups by LSH band
+            "fingerprint": fingerprint,
+            "created_at": datetime.datetime.utcnow()
+        }).inserted_id
+        return str(artifact_id)
+
+    def latest_for_project(self, project_id: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The user's most recent artifact generated for project_id"""
+        if not project_id or not user_id:
+            return None
+        return self.collection.find_one(
+            {"project_id": project_id, "user_id": user_id},
+            sort=[("created_at", -1)],
+        )
+
+    def find_by_bands(self, user_id: str, request_key: str, bands: List[str], limit: int = 20) -> List[Dict[str, Any]]:
+        """The user's newest artifacts for the same request sharing an LSH band (fingerprints only)"""
+        return list(self.collection.find(
+            {"user_id": user_id, "fingerprint.request": request_key, "fingerprint.bands": {"$in": bands}},
+            {"fingerprint": 1, "created_at": 1},
+        ).sort("created_at", -1).limit(limit))
+
+    def ensure_indexes(self):
+        self.collection.create_index([("project_id", 1), ("user_id", 1), ("created_at", -1)])
+        self.collection.create_index([("user_id", 1), ("fingerprint.bands", 1)])
+
+    def get(self, artifact_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            oid = ObjectId(artifact_id)
+        except (InvalidId, TypeError):
+            return None
+        return self.collection.find_one({"_id": oid})
+
+    def get_for_user(self, artifact_id: str, user_id: Optional[str],
+                     has_token: bool = False) -> Optional[Dict[str, Any]]:
+        """Return the artifact only if user_id owns it, or it is anonymous and the caller
+        presented its token (ObjectIds are guessable, so an id alone proves nothing)"""
+        artifact = self.get(artifact_id)
+        if not artifact:
+            return None
+        owner = artifact.get("user_id")
+        if (owner and owner != user_id) or (not owner and not has_token):
+            return None
+        return artifact
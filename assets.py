@@ -0,0 +1,196 @@
+"""
+Static asset pipeline: minify, fingerprint and pre-compress the whiteboard's
+JS/CSS into static/dist/, and serve the results with immutable caching.
+
+Run `python assets.py` as a build step; app.py also rebuilds on startup
+whenever a source file changed since the last manifest was written.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import rjsmin
+except ImportError:  # JS is shipped unminified but still fingerprinted/compressed
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+ASSET_SOURCES = ["script.js", "component.js", "style.css"]
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_CSS_TOKENS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/|\s+|[^"\'/\s]+|/', re.DOTALL)
+_CSS_TIGHT = set("{};,>~")
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace; strings are copied verbatim."""
+    out = []
+    pending_space = False
+
+    for token in _CSS_TOKENS.findall(css):
+        if token.startswith("/*"):
+            pending_space = True
+            continue
+        if token.isspace():
+            pending_space = True
+            continue
+
+        if pending_space and out and out[-1][-1] not in _CSS_TIGHT and token[0] not in _CSS_TIGHT:
+            out.append(" ")
+        pending_space = False
+
+        if token[0] == "}" and out and out[-1] == ";":
+            out.pop()
+        out.append(token)
+
+    return "".join(out)
+
+
+def minify_js(js: str) -> str:
+    if rjsmin is None:
+        return js
+    return rjsmin.jsmin(js)
+
+
+def _write_atomic(path: str, data: bytes):
+    # Several gunicorn workers may build at once; names are content-addressed so the last write wins harmlessly
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _source_digest() -> str:
+    digest = hashlib.sha256()
+    for name in ASSET_SOURCES:
+        with open(os.path.join(STATIC_DIR, name), "rb") as f:
+            digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+
+def build_assets() -> dict:
+    """Build every asset in ASSET_SOURCES and write static/dist/manifest.json"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    entries = {}
+
+    for name in ASSET_SOURCES:
+        with open(os.path.join(STATIC_DIR, name), encoding="utf-8") as f:
+            source = f.read()
+
+        minified = minify_css(source) if name.endswith(".css") else minify_js(source)
+        body = minified.encode("utf-8")
+
+        stem, ext = os.path.splitext(name)
+        fingerprinted = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        target = os.path.join(DIST_DIR, fingerprinted)
+
+        if not os.path.exists(target):
+            _write_atomic(target + ".gz", gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target + ".br", brotli.compress(body, quality=11))
+            _write_atomic(target, body)
+
+        entries[name] = {
+            "file": fingerprinted,
+            "size": len(body),
+            "source_size": len(source.encode("utf-8")),
+            "br": brotli is not None,
+        }
+        print(f"📦 {name} → dist/{fingerprinted} ({len(body)} bytes)")
+
+    manifest = {"source_digest": _source_digest(), "assets": entries}
+    _write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=2).encode("utf-8"))
+    _remove_stale(entries)
+    return manifest
+
+
+def _remove_stale(entries: dict):
+    """Delete earlier builds of our assets (and their .gz/.br) that the manifest no longer names"""
+    current = {entry["file"] for entry in entries.values()}
+    builds = re.compile("^(?:%s)\\.[0-9a-f]{12}(?:%s)(?:\\.gz|\\.br)?$" % (
+        "|".join(re.escape(os.path.splitext(name)[0]) for name in ASSET_SOURCES),
+        "|".join(re.escape(ext) for ext in {os.path.splitext(name)[1] for name in ASSET_SOURCES})))
+
+    for filename in os.listdir(DIST_DIR):
+        # Anything else in dist/ (source maps, fonts, in-flight .tmp writes) is left alone
+        if not builds.match(filename) or re.sub(r"\.(gz|br)$", "", filename) in current:
+            continue
+        try:
+            os.remove(os.path.join(DIST_DIR, filename))
+            print(f"🧹 Removed stale dist/{filename}")
+        except OSError:
+            pass
+
+
+def load_manifest(rebuild_if_stale: bool = True) -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+
+    if rebuild_if_stale and (manifest is None or manifest.get("source_digest") != _source_digest()):
+        try:
+            manifest = build_assets()
+        except OSError as e:
+            print(f"⚠️ Asset build failed, serving unprocessed static files: {e}")
+            manifest = None
+
+    return manifest or {"assets": {}}
+
+
+def serve_dist_file(filename: str):
+    """Serve a fingerprinted file, preferring a precompressed variant the client accepts"""
+    path = os.path.join(DIST_DIR, filename)
+    if filename.endswith(".js"):
+        mimetype = "application/javascript"
+    else:
+        # Anything else that lands in dist/ (source maps, fonts, the manifest) keeps its own type
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    served_name, encoding = filename, None
+    if "br" in request.accept_encodings and os.path.exists(path + ".br"):
+        served_name, encoding = filename + ".br", "br"
+    elif "gzip" in request.accept_encodings and os.path.exists(path + ".gz"):
+        served_name, encoding = filename + ".gz", "gzip"
+
+    response = send_from_directory(DIST_DIR, served_name, mimetype=mimetype)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def init_app(app):
+    """Build/load the manifest and expose asset_url() to templates"""
+    manifest = load_manifest(rebuild_if_stale=os.getenv("ASSETS_AUTO_BUILD", "1") == "1")
+    assets = manifest.get("assets", {})
+
+    def asset_url(name: str) -> str:
+        entry = assets.get(name)
+        if entry:
+            return url_for("dist_asset", filename=entry["file"])
+        return url_for("static", filename=name)
+
+    app.add_url_rule("/static/dist/<path:filename>", "dist_asset", serve_dist_file)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+if __name__ == "__main__":
+    build_assets()
@@ -0,0 +1,175 @@
+"""
+Password hashing off the request threads, and login throttling.
+
+generate_password_hash/check_password_hash are deliberately slow KDFs; run
+inline, a burst of logins occupies every request thread and delays all
+other routes. They run here on a small process pool instead (AUTH_POOL_WORKERS
+per app worker), so they neither hold the GIL nor a request thread's CPU.
+A request whose hash has not started within AUTH_QUEUE_DEADLINE seconds is
+answered "busy" rather than queueing without bound, and at most
+AUTH_MAX_PENDING hashes may wait at once.
+
+The pool uses the forkserver start method, since forking a threaded app
+worker can copy held locks into the child. Like spawn, its children
+re-run a script __main__ (harmless under gunicorn; `python app.py` loads
+the app once more per hashing process).
+
+Throttles reject credential stuffing before any hashing: each client IP gets
+AUTH_IP_ATTEMPTS login/signup attempts per AUTH_IP_WINDOW seconds, and each
+email AUTH_EMAIL_FAILURES failed logins per AUTH_EMAIL_WINDOW. Counters are
+per app worker, which only loosens the limits by the worker count. Behind
+a reverse proxy every request comes from the proxy's address, so set
+TRUSTED_PROXY_HOPS to the number of proxies in front of the app: the
+client IP is then taken from that many X-Forwarded-For entries (ProxyFix).
+A client can't spoof it, since only the entries the proxies appended count.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+AUTH_POOL_WORKERS = int(os.getenv("AUTH_POOL_WORKERS", "2"))
+AUTH_QUEUE_DEADLINE = float(os.getenv("AUTH_QUEUE_DEADLINE", "2"))     # s a hash may wait to start
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))
+AUTH_HASH_TIMEOUT = 10                                                  # s a started hash may take
+AUTH_IP_ATTEMPTS = int(os.getenv("AUTH_IP_ATTEMPTS", "20"))
+AUTH_IP_WINDOW = int(os.getenv("AUTH_IP_WINDOW", "60"))
+AUTH_EMAIL_FAILURES = int(os.getenv("AUTH_EMAIL_FAILURES", "5"))
+AUTH_EMAIL_WINDOW = int(os.getenv("AUTH_EMAIL_WINDOW", "900"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+THROTTLE_MAX_KEYS = 10000
+
+_EXPIRED = "expired"
+
+
+class AuthUnavailable(Exception):
+    """The hashing pool is saturated or the queue deadline passed; retry later"""
+
+
+# --------------------------------------
+# Pool (functions below run in the worker processes)
+# --------------------------------------
+def _hash(password: str, deadline: float):
+    if time.time() > deadline:
+        return _EXPIRED
+    return generate_password_hash(password)
+
+
+def _verify(pwhash: str, password: str, deadline: float):
+    if time.time() > deadline:
+        return _EXPIRED
+    return check_password_hash(pwhash, password)
+
+
+class HashPool:
+    def __init__(self, workers: int = AUTH_POOL_WORKERS):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pid = None
+        self.pending = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created on first use in each app worker: a pool inherited through fork is unusable
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["auth_pool"])
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self.pid = os.getpid()
+            return self.pool
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next call starts a fresh one"""
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        # Reaps what is left of it without blocking this request
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        with self.lock:
+            if self.pending >= AUTH_MAX_PENDING:
+                raise AuthUnavailable("too many password hashes waiting")
+            self.pending += 1
+        try:
+            deadline = time.time() + AUTH_QUEUE_DEADLINE
+            pool = self._executor()
+            try:
+                future = pool.submit(fn, *args, deadline)
+                result = future.result(timeout=AUTH_QUEUE_DEADLINE + AUTH_HASH_TIMEOUT)
+            except FutureTimeout:
+                future.cancel()
+                raise AuthUnavailable("password hash timed out")
+            except BrokenProcessPool:
+                # A hashing process died (OOM killer, ...), now or before this call
+                self._discard(pool)
+                raise AuthUnavailable("password hashing pool broke")
+            if result == _EXPIRED:
+                raise AuthUnavailable("password hash queue deadline passed")
+            return result
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(_verify, pwhash, password)
+
+
+# --------------------------------------
+# Throttling
+# --------------------------------------
+class Throttle:
+    """At most `limit` events per key in a sliding `window` of seconds"""
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    def _recent(self, key: str, now: float) -> Deque[float]:
+        events = self.events.get(key)
+        if events is None:
+            events = self.events[key] = deque()
+            while len(self.events) > THROTTLE_MAX_KEYS:
+                self.events.popitem(last=False)
+        self.events.move_to_end(key)
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        return events
+
+    def retry_after(self, key: str) -> int:
+        """Seconds until key may try again; 0 when it is under the limit"""
+        if not key:
+            return 0
+        now = time.time()
+        with self.lock:
+            events = self._recent(key, now)
+            if len(events) < self.limit:
+                return 0
+            return max(1, int(events[0] + self.window - now) + 1)
+
+    def add(self, key: str):
+        if not key:
+            return
+        with self.lock:
+            self._recent(key, time.time()).append(time.time())
+
+    def reset(self, key: str):
+        with self.lock:
+            self.events.pop(key, None)
+
+
+hash_pool = HashPool()
+ip_attempts = Throttle(AUTH_IP_ATTEMPTS, AUTH_IP_WINDOW)
+email_failures = Throttle(AUTH_EMAIL_FAILURES, AUTH_EMAIL_WINDOW)
@@ -0,0 +1,276 @@
+"""
+Offline batch generation: regenerate many designs without the web UI.
+
+    python batch_generate.py designs.jsonl --output results.jsonl --concurrency 4
+    python batch_generate.py --from-projects --prompt "Convert this design..." --store --output results.jsonl
+    python batch_generate.py journal.jsonl --output results.jsonl      # rerun interrupted: resumes
+
+Input lines are JSON objects with an id (id/request_id), a design
+(design_data, canvas_data or design_analysis) and a prompt
+(user_prompt/user_request/prompt), so journal records can be fed back in
+as they are. --from-projects reads the projects collection instead
+(MONGO_URI), with --prompt for every project.
+
+Items run through AIdesignAssistant with at most --concurrency in flight
+while the input is still being read. Each finished item is appended to
+--output as one JSON line (id, status, timing, files; --include-code adds
+the files) and, when it succeeded, its id to the checkpoint file, so a
+rerun skips everything already done and retries the failures. --store also saves results to the artifact store.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import ai_service
+import fingerprint
+import tracing
+
+DEFAULT_PROMPT = ai_service.DEFAULT_USER_REQUEST
+
+
+# --------------------------------------
+# Sources
+# --------------------------------------
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                print(f"⚠️ Skipping line {number}: {e}", file=sys.stderr)
+                continue
+            yield normalize_item(record, f"line-{number}")
+
+
+def normalize_item(record: Dict[str, Any], fallback_id: str) -> Dict[str, Any]:
+    design_data = record.get("design_data")
+    if design_data is None:
+        design_data = {}
+        if record.get("canvas_data"):
+            design_data["canvas_data"] = record["canvas_data"]
+            design_data["canvas_size"] = record.get("canvas_size")
+        if record.get("design_analysis"):
+            design_data["design_analysis"] = record["design_analysis"]
+    return {
+        "id": str(record.get("id") or record.get("request_id") or fallback_id),
+        "design_data": design_data,
+        "user_prompt": record.get("user_prompt") or record.get("user_request") or record.get("prompt"),
+        "user_id": record.get("user_id"),
+        "project_id": record.get("project_id"),
+    }
+
+
+def read_projects(db, prompt: str, user_id: Optional[str]) -> Iterator[Dict[str, Any]]:
+    query = {"user_id": user_id} if user_id else {}
+    cursor = db["projects"].find(query, {"design": 1, "user_id": 1}).sort("_id", 1)
+    for project in cursor:
+        project_id = str(project["_id"])
+        yield {
+            "id": project_id,
+            "design_data": {"canvas_data": project.get("design") or {}},
+            "user_prompt": prompt,
+            "user_id": project.get("user_id"),
+            "project_id": project_id,
+        }
+
+
+# --------------------------------------
+# Checkpoint and output
+# --------------------------------------
+def load_checkpoint(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class ResultWriter:
+    """Appends result lines, then checkpoints their ids; one writer shared by all workers"""
+
+    def __init__(self, output: Optional[str], checkpoint: str):
+        self.lock = threading.Lock()
+        self.output = open(output, "a", encoding="utf-8") if output else None
+        self.checkpoint = open(checkpoint, "a", encoding="utf-8")
+
+    def write(self, row: Dict[str, Any]):
+        with self.lock:
+            if self.output:
+                self.output.write(json.dumps(row, default=str) + "\n")
+                self.output.flush()
+            # Checkpointed only once the result is on disk: a crash in between reruns the item.
+            # Fallbacks and errors are left out so a rerun retries them
+            if row["status"] == "ok":
+                self.checkpoint.write(row["id"] + "\n")
+                self.checkpoint.flush()
+
+    def close(self):
+        if self.output:
+            self.output.close()
+        self.checkpoint.close()
+
+
+# --------------------------------------
+# Runner
+# --------------------------------------
+class BatchRunner:
+    def __init__(self, assistant: ai_service.AIdesignAssistant, writer: ResultWriter,
+                 artifact_store=None, include_code: bool = False, project_index=None):
+        self.assistant = assistant
+        self.writer = writer
+        self.artifact_store = artifact_store
+        self.project_index = project_index
+        self.include_code = include_code
+        self.rows: List[Dict[str, Any]] = []
+
+    def run_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": item["id"], "project_id": item.get("project_id")}
+        start = time.perf_counter()
+        try:
+            with tracing.span("batch_item", item=item["id"]):
+                design_data = self.assistant.analyze_design(item["design_data"])
+                result = self.assistant.generate_code(design_data, item["user_prompt"], analyzed=True)
+                row["generate_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if self.artifact_store is not None:
+                    row["artifact_id"] = self._store(item, design_data, result)
+            fallback = result.get("layout_type") == "fallback-functional"
+            row.update(
+                status="fallback" if fallback else "ok",
+                layout_type=result.get("layout_type"),
+                files=[f.get("file") for f in result.get("project_structure", [])],
+                bytes=sum(len(f.get("content", "")) for f in result.get("project_structure", [])),
+            )
+            if fallback:
+                row["error"] = result.get("notes")
+            if self.include_code:
+                row["code"] = result
+        except Exception as e:
+            row.update(status="error", error=repr(e)[:500])
+        row["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.writer.write(row)
+        self.rows.append(row)
+        print(f"{'✅' if row['status'] == 'ok' else '⚠️' if row['status'] == 'fallback' else '❌'} "
+              f"{row['id']} {row['status']} in {row['ms']:.0f} ms")
+        return row
+
+    def _store(self, item: Dict[str, Any], design_data: Dict[str, Any], result: Dict[str, Any]) -> str:
+        design_analysis = design_data.get("design_analysis")
+        fallback = result.get("layout_type") == "fallback-functional"
+        artifact_id = self.artifact_store.save(
+            result, user_id=item.get("user_id"), project_id=item.get("project_id"),
+            design_analysis=design_analysis, user_request=item["user_prompt"],
+            fingerprint=None if fallback or not item.get("user_id") or not design_analysis
+            else fingerprint.fingerprint(design_analysis, item["user_prompt"]),
+        )
+        if self.project_index is not None and not fallback:
+            self.project_index.index_artifact(item.get("project_id"), item.get("user_id"), result)
+        return artifact_id
+
+    def run(self, items: Iterator[Dict[str, Any]], done: Set[str], concurrency: int, limit: int = 0) -> int:
+        """Run pending items with at most `concurrency` in flight; returns how many were skipped"""
+        slots = threading.BoundedSemaphore(concurrency)
+        skipped = submitted = 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+            for item in items:
+                if item["id"] in done:
+                    skipped += 1
+                    continue
+                if not item["user_prompt"]:
+                    print(f"⚠️ {item['id']}: no prompt, skipped", file=sys.stderr)
+                    continue
+                if limit and submitted >= limit:
+                    break
+                # Reading the input waits for a free slot, so huge inputs stream through
+                slots.acquire()
+                future = pool.submit(self.run_item, item)
+                future.add_done_callback(lambda _: slots.release())
+                submitted += 1
+        return skipped
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def print_summary(rows: List[Dict[str, Any]], skipped: int, wall_seconds: float):
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    timings = sorted(row["ms"] for row in rows)
+    print(f"\n{len(rows)} items in {wall_seconds:.1f} s ({skipped} already done): {counts}")
+    if timings:
+        print(f"ms per item  p50 {percentile(timings, 50):.0f}  p95 {percentile(timings, 95):.0f}  "
+              f"max {timings[-1]:.0f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="JSONL file of designs ('-' for stdin)")
+    parser.add_argument("--from-projects", action="store_true", help="read designs from the projects collection")
+    parser.add_argument("--user-id", help="with --from-projects: only this user's projects")
+    parser.add_argument("--prompt", default=None,
+                        help="prompt for projects and for input lines without one (default: the Generate button's)")
+    parser.add_argument("--output", help="JSONL file results are appended to")
+    parser.add_argument("--include-code", action="store_true", help="write the generated files into --output")
+    parser.add_argument("--store", action="store_true", help="save results to the artifact store (MONGO_URI)")
+    parser.add_argument("--checkpoint", help="ids of finished items (default: <output>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and redo everything")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many new items")
+    parser.add_argument("--base-url", help="upstream (default: OPENROUTER_BASE_URL)")
+    parser.add_argument("--api-key", help="default: OPENROUTER_API_KEY")
+    args = parser.parse_args(argv)
+
+    if bool(args.input) == args.from_projects:
+        parser.error("give either an input file or --from-projects")
+    if not args.output and not args.store:
+        parser.error("nowhere to put results: use --output and/or --store")
+    checkpoint = args.checkpoint or f"{args.output or 'batch'}.checkpoint"
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+
+    db = None
+    if args.from_projects or args.store:
+        import mongo_pool
+        db = mongo_pool.create_client()["whiteboard2web"]
+
+    artifact_store = project_index = None
+    if args.store:
+        from artifact_store import ArtifactStore
+        from project_search import ProjectSearch
+        artifact_store = ArtifactStore(db["artifacts"])
+        project_index = ProjectSearch(db["projects"])
+
+    prompt = args.prompt or DEFAULT_PROMPT
+    if args.from_projects:
+        items = read_projects(db, prompt, args.user_id)
+    else:
+        items = (dict(item, user_prompt=item["user_prompt"] or prompt) for item in read_jsonl(args.input))
+
+    assistant = ai_service.AIdesignAssistant(base_url=args.base_url, api_key=args.api_key)
+    writer = ResultWriter(args.output, checkpoint)
+    runner = BatchRunner(assistant, writer, artifact_store, args.include_code, project_index)
+    start = time.perf_counter()
+    try:
+        skipped = runner.run(items, done, max(1, args.concurrency), args.limit)
+    finally:
+        writer.close()
+    print_summary(runner.rows, skipped, time.perf_counter() - start)
+    return 1 if any(row["status"] == "error" for row in runner.rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
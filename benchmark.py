@@ -0,0 +1,221 @@
+"""
+Microbenchmarks for the ai_service hot paths on synthetic designs.
+
+    python benchmark.py                       # run and compare with benchmark_baseline.json
+    python benchmark.py --save-baseline       # record this machine's numbers as the baseline
+    python benchmark.py --sizes 10,1000 --cases prompt_build,detect_interactive
+
+Exits with status 1 when a case is slower than its baseline by more than
+--tolerance, so it can gate CI. Baselines are machine-specific: record them
+on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import ai_service
+import canvas_analysis
+import interactive_rules
+import synthetic_designs
+import template_generator
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def _cleanup_saved_images(design_data: Dict):
+    for img in design_data.get("images", []):
+        src = img.get("src", "")
+        if src.startswith("__SAVED_FILE__:"):
+            try:
+                os.remove(src.split(":", 1)[1])
+            except OSError:
+                pass
+
+
+def build_cases(assistant: ai_service.AIdesignAssistant) -> Dict[str, Callable[[int], Callable[[], None]]]:
+    """case name -> setup(n) returning the zero-argument function to time"""
+
+    def prompt_build(n):
+        design_data = synthetic_designs.make_design_data(n)
+        return lambda: assistant.create_code_generation_prompt(design_data, "Build a landing page")
+
+    def canvas_analyze(n):
+        canvas_json = synthetic_designs.make_fabric_canvas(n)
+        return lambda: canvas_analysis.analyze_canvas(canvas_json)
+
+    def detect_interactive(n):
+        analysis = synthetic_designs.make_design_analysis(n)
+        return lambda: assistant._detect_interactive_elements(analysis)
+
+    def detect_multilingual(n):
+        # Every built-in language compiled into one automaton: cost should stay linear in n
+        analysis = synthetic_designs.make_design_analysis(n)
+        packs = tuple(interactive_rules.KEYWORD_PACKS)
+        return lambda: interactive_rules.detect(analysis, packs)
+
+    def template_match(n):
+        # Classification runs on every generation, served or escalated
+        analysis = synthetic_designs.make_design_analysis(n)
+        return lambda: template_generator.generate(analysis)
+
+    def image_shrink(n):
+        # One image per 100 elements, alternating under/over the 200KB inline limit
+        count = max(1, n // 100)
+        images = synthetic_designs.make_images(count, 150000)
+        for i in range(1, count, 2):
+            images[i] = synthetic_designs.make_images(1, 300000, seed=i)[0]
+        design_data = {"design_analysis": {}, "images": images}
+
+        def run():
+            result = assistant._shrink_images_in_design(dict(design_data))
+            _cleanup_saved_images(result)
+        return run
+
+    def extract_json(n):
+        content = synthetic_designs.make_ai_content(5, file_bytes=n * 40)
+        return lambda: json.loads(assistant.extract_json_from_response(content))
+
+    def json_recovery(n):
+        content = synthetic_designs.make_unparseable_ai_content(5, file_bytes=n * 40)
+        return lambda: assistant._recover_json(content)
+
+    return {
+        "prompt_build": prompt_build,
+        "canvas_analysis": canvas_analyze,
+        "detect_interactive": detect_interactive,
+        "detect_multilingual": detect_multilingual,
+        "template_match": template_match,
+        "image_shrink": image_shrink,
+        "extract_json": extract_json,
+        "json_recovery": json_recovery,
+    }
+
+
+def time_per_op(fn: Callable[[], None], min_time: float, rounds: int) -> float:
+    """Best-of-rounds seconds per call, with loops calibrated to min_time per round"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / rounds or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_time / rounds / 10 else 2
+
+    best = elapsed / loops
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def peak_allocation(fn: Callable[[], None]) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run(cases: List[str], sizes: List[int], min_time: float, rounds: int) -> Dict[str, Dict]:
+    assistant = ai_service.AIdesignAssistant()
+    available = build_cases(assistant)
+    results = {}
+
+    print(f"{'case':<20}{'n':>8}{'ms/op':>12}{'ops/s':>12}{'elements/s':>14}{'peak KB':>12}")
+    for case in cases:
+        for n in sizes:
+            fn = available[case](n)
+            seconds = time_per_op(fn, min_time, rounds)
+            peak = peak_allocation(fn)
+            results[f"{case}:{n}"] = {"seconds": seconds, "peak_bytes": peak}
+            print(f"{case:<20}{n:>8}{seconds * 1000:>12.3f}{1 / seconds:>12.1f}{n / seconds:>14.0f}{peak / 1024:>12.1f}")
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    print(f"\n{'case:n':<28}{'baseline ms':>14}{'now ms':>12}{'change':>10}")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        change = current["seconds"] / previous["seconds"] - 1
+        flag = " ❌" if change > tolerance else ""
+        print(f"{key:<28}{previous['seconds'] * 1000:>14.3f}{current['seconds'] * 1000:>12.3f}{change:>+10.1%}{flag}")
+        if change > tolerance:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated element counts")
+    parser.add_argument("--cases", default="", help="comma-separated subset of cases")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds of timing per case/size")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown vs baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--output", help="also write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    all_cases = list(build_cases(ai_service.AIdesignAssistant()).keys())
+    cases = [c for c in args.cases.split(",") if c] or all_cases
+    unknown = set(cases) - set(all_cases)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))} (choose from {', '.join(all_cases)})")
+
+    # A fast matcher that finds the wrong keywords is no improvement
+    failures = interactive_rules.self_check()
+    for failure in failures:
+        print(f"❌ Keyword detection: {failure}")
+    if failures:
+        return 1
+
+    results = run(cases, sizes, args.min_time, args.rounds)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Circuit breaker for the chat-completion upstream.
+
+When OpenRouter is down every generation used to wait out its full
+timeout before falling back. After CIRCUIT_FAILURES consecutive failures
+(transport errors, 429 and 5xx) the circuit opens and calls fail at once
+for CIRCUIT_OPEN_SECONDS; then a single probe call is let through
+(half-open) and its outcome closes or re-opens the circuit. The state is
+per process and is reported by /health/ready.
+"""
+import os
+import threading
+import time
+
+import metrics
+
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = CIRCUIT_FAILURES, open_seconds: float = CIRCUIT_OPEN_SECONDS):
+        self.name = name
+        self.failure_limit = failures
+        self.open_seconds = open_seconds
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        metrics.CIRCUIT_STATE.labels(circuit=name).set(STATE_VALUES[CLOSED])
+
+    def _set(self, state: str):
+        if state != self.state:
+            print(f"🔌 Circuit {self.name}: {self.state} -> {state}")
+            self.state = state
+            metrics.CIRCUIT_STATE.labels(circuit=self.name).set(STATE_VALUES[state])
+            metrics.CIRCUIT_TRANSITIONS.labels(circuit=self.name, state=state).inc()
+
+    def current_state(self) -> str:
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self.state
+
+    def healthy(self) -> bool:
+        """Closed with no failures since the last success: spare capacity for optional calls"""
+        with self.lock:
+            return self.state == CLOSED and self.failures == 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; an open circuit lets one probe through once it has cooled down"""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self._set(HALF_OPEN)
+            # A probe that never reported back (it raised) doesn't block the circuit forever
+            if self.state == HALF_OPEN and (not self.probing or now - self.probe_started >= self.open_seconds):
+                self.probing = True
+                self.probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            self._set(CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_limit:
+                self.probing = False
+                self.opened_at = time.monotonic()
+                self._set(OPEN)
@@ -0,0 +1,198 @@
+"""
+Complexity-aware model, token budget and deadline selection.
+
+A two-element sketch and a five-page site used to get the same model,
+max_tokens=6000 and 30 s timeout: small jobs carried an oversized budget
+and big ones were cut off at max_tokens or timed out. The estimator scores
+a design from its element count, the pages it implies (distinct nav-like
+labels such as "About" or "Pricing") and the interactive features
+detected, and picks a tier:
+
+    small   a handful of elements on one page
+    medium  the common single-page board
+    large   many elements or several pages
+
+Each tier has its own model (COMPLEXITY_<TIER>_MODEL, all defaulting to the
+current model) and token cap. The budget is the expected file count times
+the completion tokens per file this process has seen for the tier
+(an EWMA, seeded with priors), plus headroom; truncated responses count as
+needing more than they got. The deadline follows the budget at the
+upstream throughput observed so far. A completion cut off at max_tokens
+is retried once with the next tier's model and full token cap: the small
+tier's cap is below the old fixed 6000, so an underestimate costs a
+retry, not a truncated site. COMPLEXITY_ROUTING=0 restores the fixed
+defaults.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import metrics
+
+COMPLEXITY_ROUTING = os.getenv("COMPLEXITY_ROUTING", "1") == "1"
+DEFAULT_MODEL = "deepseek/deepseek-chat"
+DEFAULT_MAX_TOKENS = 6000
+DEFAULT_TIMEOUT = 30
+
+SMALL_MAX_SCORE = int(os.getenv("COMPLEXITY_SMALL_MAX_SCORE", "12"))
+LARGE_MIN_SCORE = int(os.getenv("COMPLEXITY_LARGE_MIN_SCORE", "60"))
+PAGE_SCORE = 15              # an extra page costs about as much as 15 elements
+FEATURE_SCORE = 3            # each interactive feature (forms, search, ...) needs its own JS
+MAX_PAGES = 5
+
+TOKEN_HEADROOM = 1.5         # budget = expected tokens x headroom
+TRUNCATION_BOOST = 1.25      # a cut-off response needed at least this much more
+MIN_MAX_TOKENS = 1500
+EWMA_ALPHA = 0.2
+TIMEOUT_BASE = 10            # s of queueing and time to first token
+MIN_TIMEOUT = 20
+MAX_TIMEOUT = int(os.getenv("COMPLEXITY_MAX_TIMEOUT", "180"))
+PRIOR_TOKENS_PER_SECOND = 100.0
+
+TIERS: Dict[str, Dict[str, Any]] = {
+    "small": {
+        "model": os.getenv("COMPLEXITY_SMALL_MODEL", DEFAULT_MODEL),
+        "max_tokens": int(os.getenv("COMPLEXITY_SMALL_MAX_TOKENS", "4000")),
+        "tokens_per_file": 700.0,
+    },
+    "medium": {
+        "model": os.getenv("COMPLEXITY_MEDIUM_MODEL", DEFAULT_MODEL),
+        "max_tokens": int(os.getenv("COMPLEXITY_MEDIUM_MAX_TOKENS", "6000")),
+        "tokens_per_file": 1300.0,
+    },
+    "large": {
+        "model": os.getenv("COMPLEXITY_LARGE_MODEL", DEFAULT_MODEL),
+        "max_tokens": int(os.getenv("COMPLEXITY_LARGE_MAX_TOKENS", "8000")),
+        "tokens_per_file": 1500.0,
+    },
+}
+NEXT_TIER = {"small": "medium", "medium": "large"}
+
+# Groups holding each drawn object once; buttons, containers, forms, ... repeat shapes and text
+COUNTED_GROUPS = ("text", "shapes", "images")
+
+# Labels that usually become a page of their own in the generated site
+PAGE_WORDS = frozenset((
+    "about", "about us", "contact", "contact us", "services", "pricing", "blog", "shop", "store",
+    "products", "portfolio", "gallery", "team", "faq", "careers", "login", "sign in", "sign up",
+    "register", "dashboard", "profile", "settings", "cart", "checkout", "news", "events",
+))
+
+
+# --------------------------------------
+# Estimate
+# --------------------------------------
+def _label(text: str) -> str:
+    return " ".join(text.lower().strip(" .:|>").split())
+
+
+def estimate(design_analysis: Dict[str, Any], detected: Dict[str, Any]) -> Dict[str, Any]:
+    """Element count, implied pages, interactive features and the resulting score"""
+    elements = design_analysis.get("elements", {})
+    element_count = sum(len(elements[g]) for g in COUNTED_GROUPS if isinstance(elements.get(g), list))
+    page_labels = {
+        _label(e.get("content") or "")
+        for e in elements.get("text", []) if isinstance(e, dict)
+    } & PAGE_WORDS
+    pages = min(MAX_PAGES, 1 + len(page_labels))
+    features = sum(1 for flag, value in detected.items() if flag.startswith("has_") and value is True)
+    return {
+        "elements": element_count,
+        "pages": pages,
+        "features": features,
+        # One HTML file per page plus the shared stylesheet and script
+        "files": pages + 2,
+        "score": element_count + PAGE_SCORE * (pages - 1) + FEATURE_SCORE * features,
+    }
+
+
+def tier_for(score: int) -> str:
+    if score <= SMALL_MAX_SCORE:
+        return "small"
+    if score >= LARGE_MIN_SCORE:
+        return "large"
+    return "medium"
+
+
+# --------------------------------------
+# Selection and learning
+# --------------------------------------
+class BudgetModel:
+    """Per-tier completion tokens per file and upstream throughput, learned from usage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens_per_file = {tier: spec["tokens_per_file"] for tier, spec in TIERS.items()}
+        self.tokens_per_second = PRIOR_TOKENS_PER_SECOND
+
+    def choose(self, design_analysis: Dict[str, Any], detected: Dict[str, Any]) -> Dict[str, Any]:
+        """{tier, model, max_tokens, timeout} plus the estimate behind them"""
+        if not COMPLEXITY_ROUTING:
+            return {"tier": "fixed", "model": DEFAULT_MODEL, "max_tokens": DEFAULT_MAX_TOKENS,
+                    "timeout": DEFAULT_TIMEOUT, "expected_tokens": None}
+
+        est = estimate(design_analysis, detected)
+        tier = tier_for(est["score"])
+        spec = TIERS[tier]
+        with self.lock:
+            expected = self.tokens_per_file[tier] * est["files"]
+            tokens_per_second = self.tokens_per_second
+        max_tokens = int(min(spec["max_tokens"], max(MIN_MAX_TOKENS, expected * TOKEN_HEADROOM)))
+        timeout = int(min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_BASE + max_tokens / tokens_per_second)))
+
+        metrics.COMPLEXITY_DECISIONS.labels(tier=tier).inc()
+        metrics.COMPLEXITY_MAX_TOKENS.labels(tier=tier).observe(max_tokens)
+        return dict(est, tier=tier, model=spec["model"], max_tokens=max_tokens, timeout=timeout,
+                    expected_tokens=int(expected))
+
+    def escalate(self, decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The retry for a truncated completion: the next tier at its full cap, or None at the top"""
+        tier = NEXT_TIER.get(decision["tier"])
+        if tier is None:
+            return None
+        spec = TIERS[tier]
+        with self.lock:
+            tokens_per_second = self.tokens_per_second
+        max_tokens = max(spec["max_tokens"], decision["max_tokens"])
+        timeout = int(min(MAX_TIMEOUT, max(MIN_TIMEOUT, TIMEOUT_BASE + max_tokens / tokens_per_second)))
+        metrics.COMPLEXITY_DECISIONS.labels(tier=tier).inc()
+        return dict(decision, tier=tier, model=spec["model"], max_tokens=max_tokens, timeout=timeout,
+                    escalated_from=decision["tier"])
+
+    def record(self, decision: Dict[str, Any], response: Optional[Dict[str, Any]], seconds: float):
+        """Learn from how the completion chosen by `decision` went"""
+        tier = decision["tier"]
+        if response is None or not response.get("choices"):
+            # Out of time (or failed): nothing about size, but a timeout means we were optimistic
+            timed_out = seconds >= decision["timeout"] * 0.95
+            metrics.COMPLEXITY_OUTCOMES.labels(tier=tier, outcome="timeout" if timed_out else "error").inc()
+            if timed_out and decision.get("expected_tokens"):
+                self._update_throughput(decision["expected_tokens"] / seconds)
+            return
+
+        usage = response.get("usage") or {}
+        completion = usage.get("completion_tokens")
+        truncated = response["choices"][0].get("finish_reason") == "length"
+        metrics.COMPLEXITY_OUTCOMES.labels(tier=tier, outcome="truncated" if truncated else "ok").inc()
+        if not completion or tier not in self.tokens_per_file:
+            return
+        metrics.COMPLEXITY_BUDGET_USED.labels(tier=tier).observe(completion / decision["max_tokens"])
+
+        observed = completion * TRUNCATION_BOOST if truncated else completion
+        with self.lock:
+            current = self.tokens_per_file[tier]
+            self.tokens_per_file[tier] = current + EWMA_ALPHA * (observed / decision["files"] - current)
+        if seconds > 0:
+            self._update_throughput(completion / seconds)
+
+    def _update_throughput(self, tokens_per_second: float):
+        with self.lock:
+            self.tokens_per_second += EWMA_ALPHA * (max(1.0, tokens_per_second) - self.tokens_per_second)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"tokens_per_file": {t: round(v, 1) for t, v in self.tokens_per_file.items()},
+                    "tokens_per_second": round(self.tokens_per_second, 1)}
+
+
+budget_model = BudgetModel()
@@ -0,0 +1,292 @@
+"""
+Incremental regeneration of the parts of a design that changed.
+
+Moving one button or editing one heading used to regenerate the whole
+site. Instead, the new design_analysis is diffed against the one stored
+with the project's last artifact:
+
+- both are turned into layout trees (layout.py) and their sections are
+  aligned by content (difflib over per-section text/type signatures), so
+  inserted or removed sections don't shift everything after them;
+- aligned sections whose content is equal but whose geometry differs
+  are layout-only changes: styles.css, plus the page holding them when
+  their rows/columns were rearranged;
+- content changes, added and removed sections touch the pages whose
+  markup contains their text;
+- palette/font changes touch styles.css, and a change in the detected
+  interactive elements touches script.js.
+
+Only affected files are regenerated, concurrently, with their previous
+content as context; everything else is reused verbatim. An unchanged
+design reuses the previous artifact outright, and a design that changed
+too much (or a different user request) is regenerated from scratch.
+"""
+import difflib
+import hashlib
+import html
+import json
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import fanout
+import interactive_rules
+import journal
+import layout
+import metrics
+import tracing
+
+# Above this share of changed sections a full regeneration is cheaper and better
+INCREMENTAL_MAX_CHANGED_RATIO = float(os.getenv("INCREMENTAL_MAX_CHANGED_RATIO", "0.5"))
+MAX_CHANGE_TEXTS = 8
+MIN_MATCH_TEXT = 3     # shorter texts ("OK", "›") match too many pages to locate a section
+
+UPDATE_SYSTEM_PROMPT = """You are a senior full-stack developer updating ONE file of an existing,
+FUNCTIONAL website after the whiteboard design changed. Apply exactly the
+listed changes and keep everything else identical: structure, class
+names, ids, file names and behaviour the other files rely on. Return ONLY
+the full updated contents of the file: no markdown fences, no JSON, no
+commentary."""
+
+
+# --------------------------------------
+# Diff
+# --------------------------------------
+def _texts(nodes: List[Dict[str, Any]]) -> List[str]:
+    out = []
+    for node in nodes:
+        if node.get("text"):
+            out.append(node["text"])
+        for row in node.get("rows", []):
+            for col in row["cols"]:
+                out.extend(_texts(col))
+        out.extend(_texts(node.get("items", [])))
+    return out
+
+
+def _types(nodes: List[Dict[str, Any]]) -> List[str]:
+    out = []
+    for node in nodes:
+        out.append(node.get("type", ""))
+        for row in node.get("rows", []):
+            for col in row["cols"]:
+                out.extend(_types(col))
+        out.extend(_types(node.get("items", [])))
+    return out
+
+
+class _Section:
+    __slots__ = ("index", "section", "texts", "content_key", "geometry_key", "structure_key")
+
+    def __init__(self, index: int, section: Dict[str, Any]):
+        nodes = [node for row in section["rows"] for col in row["cols"] for node in col]
+        self.index = index
+        self.section = section
+        self.texts = _texts(nodes)
+        # What the section says and is made of, wherever it sits
+        self.content_key = _digest([sorted(self.texts), sorted(_types(nodes))])
+        # Everything else: sizes, gaps, alignment, colours (but not where the section starts)
+        self.geometry_key = _digest({k: v for k, v in section.items() if k != "top"})
+        # Rows and columns per row: when only sizes/spacing/colours move, the markup can stay
+        self.structure_key = _digest([len(row["cols"]) for row in section["rows"]])
+
+    def describe(self) -> str:
+        shown = ", ".join(repr(t) for t in self.texts[:MAX_CHANGE_TEXTS])
+        return f"section {self.index + 1}" + (f" ({shown})" if shown else "")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _style_key(design_analysis: Dict[str, Any]) -> str:
+    styles = design_analysis.get("styles", {})
+    return _digest([styles.get("colors"), styles.get("fonts"), styles.get("typography"),
+                    design_analysis.get("canvas", {}).get("backgroundColor")])
+
+
+def diff_designs(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Section-level changes between two design_analysis dicts"""
+    old_sections = [_Section(i, s) for i, s in enumerate(layout.build_layout_tree(old)["sections"])]
+    new_sections = [_Section(i, s) for i, s in enumerate(layout.build_layout_tree(new)["sections"])]
+
+    changes: List[Dict[str, Any]] = []
+    matcher = difflib.SequenceMatcher(
+        a=[s.content_key for s in old_sections], b=[s.content_key for s in new_sections], autojunk=False)
+    for op, a0, a1, b0, b1 in matcher.get_opcodes():
+        if op == "equal":
+            for before, after in zip(old_sections[a0:a1], new_sections[b0:b1]):
+                if before.geometry_key != after.geometry_key:
+                    changes.append({"kind": "layout", "old": before, "new": after})
+        elif op == "replace":
+            for k in range(max(a1 - a0, b1 - b0)):
+                before = old_sections[a0 + k] if a0 + k < a1 else None
+                after = new_sections[b0 + k] if b0 + k < b1 else None
+                kind = "content" if before and after else "removed" if before else "added"
+                changes.append({"kind": kind, "old": before, "new": after,
+                                "anchor": old_sections[a0 - 1] if a0 else None})
+        elif op == "delete":
+            changes.extend({"kind": "removed", "old": s, "new": None} for s in old_sections[a0:a1])
+        else:
+            changes.extend({"kind": "added", "old": None, "new": s,
+                            "anchor": old_sections[a0 - 1] if a0 else None} for s in new_sections[b0:b1])
+
+    old_flags, _ = interactive_rules.detect(old)
+    new_flags, _ = interactive_rules.detect(new)
+    return {
+        "sections": changes,
+        "section_count": max(len(old_sections), len(new_sections)),
+        "styles_changed": _style_key(old) != _style_key(new),
+        "interactions_changed": sorted(f for f in new_flags if old_flags[f] != new_flags[f]),
+    }
+
+
+def describe_change(change: Dict[str, Any]) -> str:
+    before, after = change["old"], change["new"]
+    if change["kind"] == "layout":
+        b, a = before.section, after.section
+        parts = [f"{label} {b.get(key)}px -> {a.get(key)}px"
+                 for key, label in (("gap_before", "space above"), ("height", "height")) if b.get(key) != a.get(key)]
+        if b["rows"] != a["rows"]:
+            parts.append("element sizes, positions or colours changed")
+        return f"{after.describe()}: layout changed ({'; '.join(parts)}), content is the same"
+    if change["kind"] == "added":
+        return f"new {after.describe()}"
+    if change["kind"] == "removed":
+        return f"{before.describe()} was removed"
+    added = list((Counter(after.texts) - Counter(before.texts)).elements())[:MAX_CHANGE_TEXTS]
+    removed = list((Counter(before.texts) - Counter(after.texts)).elements())[:MAX_CHANGE_TEXTS]
+    parts = []
+    if added:
+        parts.append("added " + ", ".join(repr(t) for t in added))
+    if removed:
+        parts.append("removed " + ", ".join(repr(t) for t in removed))
+    if not parts:
+        parts.append("elements were added, removed or changed type")
+    return f"{before.describe()}: " + "; ".join(parts)
+
+
+# --------------------------------------
+# Changes -> files
+# --------------------------------------
+def _pages_containing(texts: List[str], pages: Dict[str, str]) -> List[str]:
+    needles = [t for t in texts if len(t) >= MIN_MATCH_TEXT]
+    return [
+        name for name, content in pages.items()
+        if any(t in content or html.escape(t, quote=False) in content for t in needles)
+    ]
+
+
+def affected_files(diff: Dict[str, Any], files: Dict[str, str]) -> Dict[str, List[str]]:
+    """file name -> descriptions of the changes it has to absorb"""
+    pages = {name: content for name, content in files.items() if name.endswith(".html")}
+    stylesheets = [name for name in files if name.endswith(".css")]
+    scripts = [name for name in files if name.endswith(".js")]
+    affected: Dict[str, List[str]] = {}
+
+    def touch(names: List[str], description: str):
+        for name in names:
+            affected.setdefault(name, []).append(description)
+
+    for change in diff["sections"]:
+        description = describe_change(change)
+        located = change["old"] or change.get("anchor")
+        targets = _pages_containing(located.texts, pages) if located else []
+        if change["kind"] != "layout" or change["old"].structure_key != change["new"].structure_key:
+            touch(targets or ["index.html"], description)
+        if change["kind"] in ("layout", "added"):
+            touch(stylesheets, description)
+    if diff["styles_changed"]:
+        touch(stylesheets, "colours, fonts or typography changed (see DESIGN STYLES)")
+    if diff["interactions_changed"]:
+        touch(scripts, "detected interactive elements changed: " + ", ".join(diff["interactions_changed"]))
+    return {name: changes for name, changes in affected.items() if name in files}
+
+
+# --------------------------------------
+# Regeneration
+# --------------------------------------
+def update_prompt(file_name: str, changes: List[str], previous_content: str, other_files: List[str],
+                  design_description: str) -> str:
+    return f"""
+{design_description}
+
+# CHANGES SINCE THE PREVIOUS VERSION:
+{chr(10).join("- " + c for c in changes)}
+
+# OTHER FILES OF THE SITE (unchanged, keep compatible):
+{", ".join(other_files) or "none"}
+
+# PREVIOUS {file_name}:
+{previous_content}
+
+# YOUR FILE:
+Update {file_name} for the changes above and keep everything else as it is.
+Return ONLY the full updated contents of {file_name}.
+"""
+
+
+def regenerate(assistant, design_data: Dict[str, Any], user_request: str,
+               previous: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """code_data updated from the previous artifact, or None for a full regeneration"""
+    if not previous or not previous.get("design_analysis") or previous.get("user_request") != user_request:
+        return None
+    previous_code = previous.get("code") or {}
+    if previous_code.get("layout_type") == "fallback-functional":
+        return None
+    files = {f.get("file"): f.get("content", "") for f in previous_code.get("project_structure", []) if f.get("file")}
+    if "index.html" not in files:
+        return None
+
+    with tracing.stage("design_diff"):
+        diff = diff_designs(previous["design_analysis"], design_data.get("design_analysis", {}))
+        affected = affected_files(diff, files)
+    changed_ratio = len(diff["sections"]) / max(1, diff["section_count"])
+    summary = {"sections_changed": len(diff["sections"]), "changed_ratio": round(changed_ratio, 2),
+               "files": sorted(affected)}
+
+    unchanged = not diff["sections"] and not diff["styles_changed"] and not diff["interactions_changed"]
+    if unchanged:
+        print("♻️ Design unchanged since the last generation, reusing it")
+        metrics.INCREMENTAL_GENERATIONS.labels(outcome="reused").inc()
+        journal.annotate(incremental=dict(summary, outcome="reused"))
+        code_data = {k: v for k, v in previous_code.items() if k != "artifact_id"}
+        code_data["project_structure"] = [dict(f) for f in previous_code["project_structure"]]
+        return code_data
+
+    # Changes no previous file can absorb (a layout change without a stylesheet, ...)
+    if not affected or changed_ratio > INCREMENTAL_MAX_CHANGED_RATIO:
+        print(f"🔁 {len(diff['sections'])} of {diff['section_count']} sections changed, regenerating everything")
+        metrics.INCREMENTAL_GENERATIONS.labels(outcome="full").inc()
+        journal.annotate(incremental=dict(summary, outcome="full"))
+        return None
+
+    print(f"✏️ Incremental update of {', '.join(sorted(affected))} ({len(diff['sections'])} section changes)")
+    design_description = assistant.describe_design(design_data, user_request)
+    prompts = {
+        name: update_prompt(name, changes, files[name], [n for n in files if n != name], design_description)
+        for name, changes in affected.items()
+    }
+    with tracing.stage("incremental_files", files=len(prompts)):
+        results = fanout.generate_files(assistant, prompts, UPDATE_SYSTEM_PROMPT)
+    summary["calls"] = {r["file"]: {k: r.get(k) for k in ("ms", "finish_reason", "max_tokens", "upstream")}
+                        for r in results}
+
+    failed = [r["file"] for r in results if "content" not in r]
+    if failed:
+        print(f"❌ Incremental update failed for {', '.join(failed)}, regenerating everything")
+        metrics.INCREMENTAL_GENERATIONS.labels(outcome="failed").inc()
+        journal.annotate(incremental=dict(summary, outcome="failed", failed=failed))
+        return None
+
+    files.update({r["file"]: r["content"] for r in results})
+    files, issues = fanout.check_consistency(files, {})
+    for issue in issues:
+        print(f"⚠️ Incremental consistency: {issue}")
+    metrics.INCREMENTAL_GENERATIONS.labels(outcome="partial").inc()
+    journal.annotate(incremental=dict(summary, outcome="partial", issues=issues))
+
+    code_data = {k: v for k, v in previous_code.items() if k not in ("artifact_id", "project_structure")}
+    code_data["project_structure"] = [{"file": name, "content": content} for name, content in files.items()]
+    code_data["explanation"] = f"Updated {', '.join(sorted(affected))} for the design changes; other files reused verbatim"
+    return code_data
@@ -0,0 +1,197 @@
+"""
+Local stand-in for OpenRouter's chat-completions API, for load tests that
+must not spend real tokens.
+
+    python fake_openrouter.py --port 8001 --latency lognormal:1.5,0.5 --error-429 0.05
+    OPENROUTER_BASE_URL=http://localhost:8001/api/v1/chat/completions OPENROUTER_API_KEY=fake python app.py
+
+Latency specs: fixed:S | uniform:LO,HI | normal:MEAN,SD | lognormal:MU,SIGMA
+(seconds; lognormal parameters are of the underlying normal). Replies come
+from --outputs-dir (*.json / *.txt, cycled) or default to the built-in
+fallback site. A request can force an outcome with the X-Fake-Status header
+(e.g. 429, 503, truncate).
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, List
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+app = Flask(__name__)
+
+
+def parse_distribution(spec: str, rng: random.Random) -> Callable[[], float]:
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(values[0] if len(values) > 1 else math.log(values[0]), values[-1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def load_outputs(outputs_dir: str) -> List[str]:
+    if outputs_dir:
+        outputs = []
+        for name in sorted(os.listdir(outputs_dir)):
+            if name.endswith((".json", ".txt")):
+                with open(os.path.join(outputs_dir, name), encoding="utf-8") as f:
+                    outputs.append(f.read())
+        if outputs:
+            return outputs
+
+    # Same site the real service falls back to, wrapped the way models usually reply
+    import ai_service
+    fallback = ai_service.AIdesignAssistant(api_key="fake")._get_functional_fallback("fake upstream")
+    fallback.pop("notes", None)
+    fallback["explanation"] = "Canned response from fake_openrouter.py"
+    fallback["layout_type"] = "landing"
+    for key in ("main_html", "main_css", "main_js", "format_version"):
+        fallback.pop(key, None)
+    return ["```json\n" + json.dumps(fallback, indent=2) + "\n```"]
+
+
+class FakeUpstream:
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.latency = parse_distribution(args.latency, self.rng)
+        self.ttft = parse_distribution(args.ttft, self.rng)
+        self.error_429 = args.error_429
+        self.error_5xx = args.error_5xx
+        self.truncate = args.truncate
+        self.chunk_chars = args.chunk_chars
+        self.outputs = itertools.cycle(load_outputs(args.outputs_dir))
+
+    def draw(self):
+        """(outcome, total_latency, first_token_latency, content) for one request"""
+        with self.lock:
+            roll = self.rng.random()
+            server_error = self.rng.choice(["500", "502", "503"])
+            total = self.latency()
+            first = min(self.ttft(), total)
+            content = next(self.outputs)
+
+        forced = request.headers.get("X-Fake-Status", "")
+        if forced:
+            outcome = forced
+        elif roll < self.error_429:
+            outcome = "429"
+        elif roll < self.error_429 + self.error_5xx:
+            outcome = server_error
+        elif roll < self.error_429 + self.error_5xx + self.truncate:
+            outcome = "truncate"
+        else:
+            outcome = "ok"
+        return outcome, total, first, content
+
+
+upstream = None
+
+
+def _usage(prompt_chars: int, content: str):
+    prompt_tokens = prompt_chars // 4
+    completion_tokens = len(content) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.route("/api/v1/chat/completions", methods=["POST"])
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    payload = request.get_json(force=True, silent=True) or {}
+    prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+    model = payload.get("model", "fake/model")
+    outcome, total, first, content = upstream.draw()
+
+    if outcome not in ("ok", "truncate"):
+        time.sleep(first)
+        status = int(outcome) if outcome.isdigit() else 500
+        headers = {"Retry-After": "1"} if status == 429 else {}
+        return jsonify({"error": {"code": status, "message": f"Injected {status} from fake upstream"}}), status, headers
+
+    finish_reason = "stop"
+    if outcome == "truncate":
+        content = content[:len(content) // 2]
+        finish_reason = "length"
+
+    completion_id = f"gen-{uuid.uuid4().hex[:16]}"
+    created = int(time.time())
+
+    if not payload.get("stream"):
+        time.sleep(total)
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": finish_reason}],
+            "usage": _usage(prompt_chars, content),
+        })
+
+    chunks = [content[i:i + upstream.chunk_chars] for i in range(0, len(content), upstream.chunk_chars)] or [""]
+    gap = max(0.0, total - first) / len(chunks)
+
+    def events():
+        yield ": OPENROUTER PROCESSING\n\n"
+        time.sleep(first)
+        for i, piece in enumerate(chunks):
+            last = i == len(chunks) - 1
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece},
+                             "finish_reason": finish_reason if last else None}],
+            }
+            if last:
+                event["usage"] = _usage(prompt_chars, content)
+            yield f"data: {json.dumps(event)}\n\n"
+            if not last:
+                time.sleep(gap)
+        yield "data: [DONE]\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream")
+
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "ok"})
+
+
+def main(argv=None):
+    global upstream
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:1.0,0.5", help="total completion time distribution")
+    parser.add_argument("--ttft", default="uniform:0.2,0.8", help="time-to-first-token distribution (streaming)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="fraction answered 500/502/503")
+    parser.add_argument("--truncate", type=float, default=0.0, help="fraction cut off with finish_reason=length")
+    parser.add_argument("--chunk-chars", type=int, default=200, help="characters per streamed delta")
+    parser.add_argument("--outputs-dir", default="", help="directory of canned replies (*.json, *.txt)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    upstream = FakeUpstream(args)
+    print(f"🧪 Fake OpenRouter on http://{args.host}:{args.port}/api/v1/chat/completions")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
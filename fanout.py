@@ -0,0 +1,323 @@
+"""
+Per-file fan-out generation.
+
+One completion carrying every page, the stylesheet and the script takes as
+long as all of them together and is often cut off at max_tokens. Fan-out
+first asks for a small design contract (pages, shared class names and ids,
+JS hooks, palette), then generates each file from that contract in a
+thread pool shared by the whole process (FANOUT_WORKERS calls in flight
+however many requests fan out), so wall-clock time follows the largest
+file rather than the sum. A file cut off at max_tokens is retried once
+with FANOUT_FILE_RETRY_MAX_TOKENS and fails the fan-out if it is cut off
+again. The files are stitched into project_structure and checked
+for cross-file consistency: pages must load the shared stylesheet and
+script, links must point at generated pages, and the selectors the script
+uses must exist in some page.
+
+Enable with GENERATION_MODE=fanout; a failed plan or file returns None and
+the caller falls back to the single completion.
+"""
+import contextvars
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import journal
+import metrics
+import tracing
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "4"))
+FANOUT_PLAN_MAX_TOKENS = int(os.getenv("FANOUT_PLAN_MAX_TOKENS", "1200"))
+FANOUT_FILE_MAX_TOKENS = int(os.getenv("FANOUT_FILE_MAX_TOKENS", "4000"))
+FANOUT_FILE_RETRY_MAX_TOKENS = int(os.getenv("FANOUT_FILE_RETRY_MAX_TOKENS", str(FANOUT_FILE_MAX_TOKENS * 2)))
+FANOUT_TIMEOUT = int(os.getenv("FANOUT_TIMEOUT", "60"))
+FANOUT_MAX_PAGES = 5
+
+SHARED_FILES = ("styles.css", "script.js")
+
+PLAN_SYSTEM_PROMPT = """You are a senior front-end architect. You plan multi-file websites
+before they are written so that separate developers can write each file
+independently and still produce one consistent site. Return ONLY valid JSON."""
+
+FILE_SYSTEM_PROMPT = """You are a senior full-stack developer writing ONE file of a multi-file,
+FUNCTIONAL, PRODUCTION-READY website. Other files are written at the same
+time from the same design contract, so use exactly the class names, ids,
+file names and hooks it defines. Return ONLY the raw contents of the
+requested file: no markdown fences, no JSON, no commentary."""
+
+_FENCE_RE = re.compile(r"^```[\w-]*\s*\n(.*?)\n?```\s*$", re.DOTALL)
+_CLASS_ATTR_RE = re.compile(r"""class\s*=\s*["']([^"']+)["']""")
+_ID_ATTR_RE = re.compile(r"""id\s*=\s*["']([^"']+)["']""")
+_HREF_RE = re.compile(r"""href\s*=\s*["']([^"'#?]+\.html)""")
+_CSS_CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+_JS_ID_RE = re.compile(r"""getElementById\(\s*["']([\w-]+)["']""")
+_JS_SELECTOR_RE = re.compile(r"""querySelector(?:All)?\(\s*["']([^"']+)["']""")
+_SELECTOR_TOKEN_RE = re.compile(r"([.#])(-?[_a-zA-Z][\w-]*)")
+
+
+# --------------------------------------
+# Plan
+# --------------------------------------
+def plan_prompt(design_description: str) -> str:
+    return f"""
+Plan the website for this whiteboard design. Do NOT write any code yet.
+
+{design_description}
+
+# OUTPUT FORMAT:
+Return ONLY valid JSON:
+
+{{
+    "layout_type": "identified layout type",
+    "pages": [
+        {{"file": "index.html", "title": "Home", "sections": ["navbar", "hero", "..."]}}
+    ],
+    "classes": {{"class-name": "what it styles"}},
+    "ids": {{"element-id": "what it identifies"}},
+    "js_hooks": [
+        {{"selector": "#contact-form", "event": "submit", "behavior": "validate, then show a success toast"}}
+    ],
+    "palette": {{"primary": "#hex", "accent": "#hex", "background": "#hex", "text": "#hex"}},
+    "functional_features": ["list", "of", "working", "features"]
+}}
+
+- index.html is always the first page; add more pages only for distinct drawn sections (at most {FANOUT_MAX_PAGES})
+- Every page shares styles.css and script.js
+- Name every class, id and hook a page needs; the files will be written from this plan alone
+"""
+
+
+def parse_plan(content: str) -> Optional[Dict[str, Any]]:
+    """The contract, normalized; None when the reply is not a usable plan"""
+    match = re.search(r"\{.*\}", content or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        contract = json.loads(match.group())
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(contract, dict) or not isinstance(contract.get("pages"), list):
+        return None
+
+    pages, seen = [], set()
+    for page in contract["pages"]:
+        name = page.get("file") if isinstance(page, dict) else None
+        if not isinstance(name, str) or not re.fullmatch(r"[\w-]+\.html", name) or name in seen:
+            continue
+        seen.add(name)
+        pages.append(page)
+    if "index.html" not in seen:
+        pages.insert(0, {"file": "index.html", "title": "Home", "sections": []})
+    contract["pages"] = pages[:FANOUT_MAX_PAGES]
+
+    for key in ("classes", "ids", "palette"):
+        if not isinstance(contract.get(key), dict):
+            contract[key] = {}
+    if not isinstance(contract.get("js_hooks"), list):
+        contract["js_hooks"] = []
+    return contract
+
+
+# --------------------------------------
+# Files
+# --------------------------------------
+def file_prompt(file_name: str, contract: Dict[str, Any], design_description: str) -> str:
+    page_files = [p["file"] for p in contract["pages"]]
+    if file_name == "styles.css":
+        task = """Write styles.css, shared by every page:
+- style every class and id in the contract, using the palette as CSS variables
+- responsive (mobile, tablet, desktop), transitions and hover/focus states
+- styles for loading, success/error and toast states the hooks use"""
+    elif file_name == "script.js":
+        task = """Write script.js, loaded by every page:
+- implement every js_hook of the contract with real, working behaviour
+- the script runs on every page: skip hooks whose elements are not present
+- form validation with real-time feedback, mock submission with toast notifications
+- modern ES6+, wrapped in a DOMContentLoaded listener, with console.log messages for debugging"""
+    else:
+        page = next(p for p in contract["pages"] if p["file"] == file_name)
+        task = f"""Write {file_name} ({page.get("title", "")}), sections: {json.dumps(page.get("sections", []))}
+- a complete HTML5 document that links styles.css and loads script.js at the end of <body>
+- use only class names and ids from the contract so the shared CSS and JS apply
+- the same navbar and footer as the other pages, linking {", ".join(page_files)}
+- accessible markup (labels, ARIA attributes, alt text), no inline scripts or styles"""
+
+    return f"""
+{design_description}
+
+# DESIGN CONTRACT (shared by all files):
+{json.dumps(contract, separators=(',', ':'))}
+
+# YOUR FILE:
+{task}
+
+GIVE ME THE EXACT DESIGN THAT WAS DRAWN ON THE WHITEBOARD. Return ONLY the contents of {file_name}.
+"""
+
+
+def strip_fences(content: str) -> str:
+    content = (content or "").strip()
+    match = _FENCE_RE.match(content)
+    return match.group(1).strip() if match else content
+
+
+# --------------------------------------
+# Cross-file consistency
+# --------------------------------------
+def _ensure_asset_links(html_content: str) -> Tuple[str, List[str]]:
+    fixes = []
+    if "styles.css" not in html_content:
+        html_content = re.sub(r"</head>", '    <link rel="stylesheet" href="styles.css">\n</head>', html_content, count=1, flags=re.I)
+        fixes.append("linked styles.css")
+    if "script.js" not in html_content:
+        html_content = re.sub(r"</body>", '    <script src="script.js"></script>\n</body>', html_content, count=1, flags=re.I)
+        fixes.append("loaded script.js")
+    return html_content, fixes
+
+
+def check_consistency(files: Dict[str, str], contract: Dict[str, Any]) -> Tuple[Dict[str, str], List[str]]:
+    """(files with missing asset links added, remaining issues)"""
+    files = dict(files)
+    issues = []
+    classes, ids = set(), set()
+
+    pages = [name for name in files if name.endswith(".html")]
+    for name in pages:
+        files[name], fixes = _ensure_asset_links(files[name])
+        issues.extend(f"{name}: {fix}" for fix in fixes)
+        for attr in _CLASS_ATTR_RE.findall(files[name]):
+            classes.update(attr.split())
+        ids.update(_ID_ATTR_RE.findall(files[name]))
+        for target in sorted(set(_HREF_RE.findall(files[name]))):
+            if "://" not in target and target not in files:
+                issues.append(f"{name}: links to missing page {target}")
+
+    script = files.get("script.js", "")
+    missing = set()
+    for element_id in _JS_ID_RE.findall(script):
+        if element_id not in ids:
+            missing.add("#" + element_id)
+    for selector in _JS_SELECTOR_RE.findall(script):
+        for kind, token in _SELECTOR_TOKEN_RE.findall(selector):
+            if token not in (classes if kind == "." else ids):
+                missing.add(kind + token)
+    issues.extend(f"script.js: {selector} matches no page" for selector in sorted(missing))
+
+    styled = set(_CSS_CLASS_RE.findall(files.get("styles.css", "")))
+    unstyled = sorted(c for c in contract.get("classes", {}) if c in classes and c not in styled)
+    if unstyled:
+        issues.append(f"styles.css: no rules for {', '.join(unstyled[:10])}")
+    return files, issues
+
+
+# --------------------------------------
+# Orchestration
+# --------------------------------------
+# Threads start on first use, so app workers forked after import each get their own
+_pool = ThreadPoolExecutor(max_workers=max(1, FANOUT_WORKERS), thread_name_prefix="fanout")
+
+
+def _generate_file(assistant, file_name: str, prompt: str, system_prompt: str) -> Dict[str, Any]:
+    with tracing.span("fanout_file", file=file_name) as file_span:
+        start = time.perf_counter()
+        result = {"file": file_name}
+        for max_tokens in (FANOUT_FILE_MAX_TOKENS, FANOUT_FILE_RETRY_MAX_TOKENS):
+            # call_ai_api's journal notes would race with the other files'; the caller records them once
+            with journal.scratch() as notes:
+                response = assistant.call_ai_api(
+                    prompt,
+                    max_tokens=max_tokens,
+                    system_prompt=system_prompt,
+                    timeout=FANOUT_TIMEOUT,
+                )
+            result.update(ms=round((time.perf_counter() - start) * 1000, 1), max_tokens=max_tokens,
+                          upstream=notes.get("upstream"))
+            if not response or not response.get("choices"):
+                file_span.status = "error"
+                return result
+
+            choice = response["choices"][0]
+            metrics.record_usage(response.get("usage"))
+            result["finish_reason"] = choice.get("finish_reason")
+            if choice.get("finish_reason") != "length":
+                break
+            print(f"✂️ {file_name} cut off at {max_tokens} tokens")
+            file_span.set_attribute("truncated", True)
+        else:
+            # A truncated file would break the site; the caller falls back instead
+            file_span.status = "error"
+            return result
+
+        result["content"] = strip_fences(choice["message"]["content"])
+        result["chars"] = len(result["content"])
+        file_span.set_attribute("chars", result["chars"])
+        return result
+
+
+def generate_files(assistant, prompts: Dict[str, str], system_prompt: str = FILE_SYSTEM_PROMPT) -> List[Dict[str, Any]]:
+    """One completion per file, concurrently; results carry "content" unless the call failed or was cut off"""
+    # Each worker runs in a copy of this context so its spans land in this request's trace
+    futures = [
+        _pool.submit(contextvars.copy_context().run, _generate_file, assistant, name, prompt, system_prompt)
+        for name, prompt in prompts.items()
+    ]
+    return [f.result() for f in futures]
+
+
+def generate(assistant, design_data: Dict[str, Any], user_request: str) -> Optional[Dict[str, Any]]:
+    """code_data assembled from per-file completions, or None to fall back to one completion"""
+    design_description = assistant.describe_design(design_data, user_request)
+
+    with tracing.stage("fanout_plan"):
+        response = assistant.call_ai_api(
+            plan_prompt(design_description),
+            max_tokens=FANOUT_PLAN_MAX_TOKENS,
+            system_prompt=PLAN_SYSTEM_PROMPT,
+            timeout=FANOUT_TIMEOUT,
+        )
+        content = response["choices"][0]["message"]["content"] if response and response.get("choices") else ""
+        if response:
+            metrics.record_usage(response.get("usage"))
+        contract = parse_plan(content)
+    if contract is None:
+        print("⚠️ Fan-out plan unusable, falling back to a single completion")
+        metrics.FANOUT_GENERATIONS.labels(outcome="plan_failed").inc()
+        journal.annotate(fanout={"outcome": "plan_failed", "plan": content[:2000]})
+        return None
+
+    file_names = [p["file"] for p in contract["pages"]] + list(SHARED_FILES)
+    print(f"🔀 Fan-out: generating {len(file_names)} files ({', '.join(file_names)})")
+
+    with tracing.stage("fanout_files", files=len(file_names)):
+        results = generate_files(assistant, {name: file_prompt(name, contract, design_description) for name in file_names})
+
+    failed = [r["file"] for r in results if "content" not in r]
+    summary = {
+        "pages": len(contract["pages"]),
+        "files": {r["file"]: {k: r.get(k) for k in ("ms", "chars", "finish_reason", "max_tokens", "upstream")}
+                  for r in results},
+    }
+    if failed:
+        print(f"❌ Fan-out failed for {', '.join(failed)}, falling back to a single completion")
+        metrics.FANOUT_GENERATIONS.labels(outcome="file_failed").inc()
+        journal.annotate(fanout=dict(summary, outcome="file_failed", failed=failed))
+        return None
+
+    with tracing.stage("fanout_validate"):
+        files, issues = check_consistency({r["file"]: r["content"] for r in results}, contract)
+    for issue in issues:
+        print(f"⚠️ Fan-out consistency: {issue}")
+    metrics.FANOUT_GENERATIONS.labels(outcome="ok").inc()
+    journal.annotate(fanout=dict(summary, outcome="ok", issues=issues), plan=contract)
+
+    code_data = {
+        "project_structure": [{"file": name, "content": files[name]} for name in file_names],
+        "explanation": f"Generated {len(file_names)} files in parallel from a shared design contract",
+        "layout_type": contract.get("layout_type") or "fanout",
+    }
+    if contract.get("functional_features"):
+        code_data["functional_features"] = contract["functional_features"]
+    return code_data
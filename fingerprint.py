@@ -0,0 +1,149 @@
+"""
+Structural design fingerprints for near-duplicate lookups.
+
+An exact design hash misses the common case of nudging an element a few
+pixels and regenerating. A fingerprint is the set of shingles of a design:
+its layout tree with sizes and gaps quantized to FINGERPRINT_QUANTUM px,
+element kinds at their section/row/column path, normalized text content
+and a coarse palette. The set is summarized by a MinHash signature, whose
+agreement estimates Jaccard similarity, and the signature is cut into LSH
+bands. Artifacts store the band keys, so finding earlier generations that
+share a band is an indexed MongoDB query; the candidates' signatures then
+give their similarity.
+
+Generations at NEAR_DUPLICATE_THRESHOLD or above with identical text are
+returned as they are; from WARM_START_THRESHOLD an earlier generation of
+the same project seeds an incremental regeneration (design_diff.py) instead
+of a generation from scratch. Another project's code is never patched into
+this one: an empty diff would hand it back unchanged.
+"""
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+import interactive_rules
+import layout
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.97"))
+WARM_START_THRESHOLD = float(os.getenv("WARM_START_THRESHOLD", "0.6"))
+FINGERPRINT_QUANTUM = int(os.getenv("FINGERPRINT_QUANTUM", "24"))   # px
+NUM_PERM = 64
+BANDS = 16                   # 16 bands x 4 rows: designs ~50% similar become candidates
+ROWS = NUM_PERM // BANDS
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# a, b < 2^31 and 32-bit hashes keep a * x + b inside uint64
+_rng = np.random.RandomState(1337)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def _q(value: Any) -> int:
+    return int(round((value or 0) / FINGERPRINT_QUANTUM))
+
+
+def _colour(value: Any) -> str:
+    """#rrggbb reduced to 3 bits per channel; anything else as-is"""
+    if isinstance(value, str) and len(value) == 7 and value.startswith("#"):
+        try:
+            r, g, b = (int(value[i:i + 2], 16) >> 5 for i in (1, 3, 5))
+            return f"{r}{g}{b}"
+        except ValueError:
+            pass
+    return str(value)
+
+
+def _node_shingles(node: Dict[str, Any], path: str, out: Set[str]):
+    kind = node.get("type", "")
+    out.add(f"{path}:{kind}:{_q(node.get('w'))}x{_q(node.get('h'))}")
+    if node.get("text"):
+        text = interactive_rules.normalize(node["text"])
+        out.add(f"t:{text}")
+        out.add(f"{path}:{kind}:t:{text}")
+    if node.get("fill"):
+        out.add(f"{path}:fill:{_colour(node['fill'])}")
+    for r, row in enumerate(node.get("rows", [])):
+        _row_shingles(row, f"{path}/r{r}", out)
+    for i, item in enumerate(node.get("items", [])):
+        _node_shingles(item, f"{path}/i{i}", out)
+
+
+def _row_shingles(row: Dict[str, Any], path: str, out: Set[str]):
+    out.add(f"{path}:row:{len(row['cols'])}:{row.get('layout', '')}:{row.get('align', '')}:{_q(row.get('gap'))}")
+    for c, col in enumerate(row["cols"]):
+        for k, node in enumerate(col):
+            _node_shingles(node, f"{path}/c{c}/{k}", out)
+
+
+def shingles(design_analysis: Dict[str, Any]) -> Set[str]:
+    tree = layout.build_layout_tree(design_analysis)
+    out: Set[str] = set()
+    for s, section in enumerate(tree["sections"]):
+        out.add(f"s{s}:{_q(section.get('height'))}:{_q(section.get('gap_before'))}:{int(bool(section.get('band')))}")
+        for r, row in enumerate(section["rows"]):
+            _row_shingles(row, f"s{s}/r{r}", out)
+
+    styles = design_analysis.get("styles", {})
+    out.update(f"c:{_colour(c)}" for c in styles.get("colors", []))
+    out.update(f"f:{f}" for f in styles.get("fonts", []))
+    return out
+
+
+def minhash(items: Set[str]) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of a set of strings"""
+    if not items:
+        return np.full(NUM_PERM, _MERSENNE_PRIME, dtype=np.uint64)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items),
+        dtype=np.uint64, count=len(items),
+    )
+    return ((hashes[:, None] * _A + _B) % _MERSENNE_PRIME).min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> List[str]:
+    """One key per LSH band; designs sharing any key are candidates"""
+    return [
+        f"{band:02d}:{hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=6).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the designs behind two signatures"""
+    if len(a) != NUM_PERM or len(b) != NUM_PERM:
+        return 0.0
+    return float(np.mean(np.asarray(a, dtype=np.uint64) == np.asarray(b, dtype=np.uint64)))
+
+
+def best_match(target: Dict[str, Any], candidates: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], float]:
+    """The most similar candidate document (newest first on ties) and its similarity"""
+    best, best_score = None, 0.0
+    for candidate in candidates:
+        score = similarity(target["minhash"], (candidate.get("fingerprint") or {}).get("minhash") or [])
+        if score > best_score:
+            best, best_score = candidate, score
+    return best, best_score
+
+
+def request_key(user_request: str) -> str:
+    return hashlib.sha256(" ".join((user_request or "").split()).encode("utf-8")).hexdigest()[:16]
+
+
+def content_key(design_analysis: Dict[str, Any]) -> str:
+    """Digest of the design's text alone: near-duplicates must still say exactly the same thing"""
+    texts = sorted(interactive_rules.normalize(e.get("content") or "")
+                   for e in design_analysis.get("elements", {}).get("text", []) if isinstance(e, dict))
+    return hashlib.sha256("\x1f".join(texts).encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(design_analysis: Dict[str, Any], user_request: str) -> Dict[str, Any]:
+    """What an artifact stores to be found again by a similar design with the same request"""
+    signature = minhash(shingles(design_analysis))
+    return {
+        "request": request_key(user_request),
+        "content": content_key(design_analysis),
+        "minhash": [int(v) for v in signature],
+        "bands": band_keys(signature),
+    }
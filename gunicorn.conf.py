@@ -0,0 +1,43 @@
+# Picked up automatically by `gunicorn app:app` (see Procfile)
+import os
+import secrets
+import shutil
+import tempfile
+
+# prometheus_client reads this when it is first imported, so it has to be set
+# here in the master before any worker imports the app
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "whiteboard2web-metrics")
+)
+
+
+def on_starting(server):
+    # Samples from a previous run would otherwise be added to this one's
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    # Every worker must sign with the same keys, or sessions and preview links
+    # only work on the worker that issued them
+    for name in ("SECRET_KEY", "PREVIEW_SECRET"):
+        if not os.getenv(name):
+            server.log.warning("%s is not set: using a random key until the next restart", name)
+            os.environ[name] = secrets.token_hex(32)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_request(worker, req, environ, resp):
+    # RSS watchdog: finish this request, then let the master replace the worker
+    # (WORKER_MAX_RSS_MB) instead of letting it grow into swap
+    import memory
+    import metrics
+
+    if worker.alive and memory.should_recycle_worker():
+        rss_mb = memory.current_rss() / 1024 / 1024
+        worker.log.warning("Worker %s at %.0f MB RSS, recycling after this request", worker.pid, rss_mb)
+        metrics.WORKER_RECYCLES.inc()
+        worker.alive = False
@@ -0,0 +1,254 @@
+"""
+Declarative detection of interactive elements in a design_analysis.
+
+Each rule sets one flag (has_login, has_search, ...) when a design has
+elements in certain groups (buttons, images, containers, ...) or text
+containing one of its keywords as a whole word ("card" is found in "Add
+card" but not in "discard"). All keywords of the active packs are
+compiled into one Aho-Corasick automaton, so every text element is
+scanned once, in time linear in its length, whatever the number of rules
+and languages. Matches are returned as per-rule evidence.
+
+Packs are chosen with INTERACTIVE_KEYWORD_PACKS, a comma-separated list of
+built-in pack names (en, es, fr, de, pt) and/or paths to JSON files shaped
+like {"has_login": ["keyword", ...], ...}.
+"""
+import json
+import os
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+MAX_EVIDENCE = 3
+
+# flag -> element groups whose mere presence sets it
+GROUP_RULES: Dict[str, Tuple[str, ...]] = {
+    "has_forms": ("forms", "buttons"),
+    "has_buttons": ("buttons",),
+    "has_navigation": ("navigation",),
+    "has_inputs": ("inputs",),
+    "has_images": ("images",),
+    "has_cards": ("containers",),
+}
+
+# Keyword matches that also imply other flags
+IMPLIES: Dict[str, Tuple[str, ...]] = {
+    "has_search": ("has_inputs",),
+    "has_login": ("has_forms", "has_inputs"),
+    "has_contact": ("has_forms", "has_inputs"),
+}
+
+FLAGS = (
+    "has_forms", "has_buttons", "has_navigation", "has_inputs", "has_images",
+    "has_cards", "has_tables", "has_search", "has_login", "has_contact",
+)
+
+KEYWORD_PACKS: Dict[str, Dict[str, List[str]]] = {
+    "en": {
+        "has_navigation": ["nav", "navbar", "navigation", "menu"],
+        "has_search": ["search"],
+        "has_inputs": ["input", "inputs", "username", "password"],
+        "has_login": ["login", "log in", "sign in", "signin"],
+        "has_contact": ["contact", "contacts", "email", "e-mail"],
+        "has_cards": ["card", "cards"],
+        "has_tables": ["table", "tables"],
+    },
+    "es": {
+        "has_navigation": ["menú", "inicio"],
+        "has_search": ["buscar", "búsqueda"],
+        "has_inputs": ["contraseña", "usuario"],
+        "has_login": ["iniciar sesión", "acceder"],
+        "has_contact": ["contacto", "correo"],
+        "has_cards": ["tarjeta"],
+        "has_tables": ["tabla"],
+    },
+    "fr": {
+        "has_navigation": ["accueil"],
+        "has_search": ["recherche"],
+        "has_inputs": ["mot de passe", "identifiant"],
+        "has_login": ["connexion", "se connecter"],
+        "has_contact": ["courriel", "nous contacter"],
+        "has_cards": ["carte"],
+        "has_tables": ["tableau"],
+    },
+    "de": {
+        "has_navigation": ["startseite", "menü"],
+        "has_search": ["suche"],
+        "has_inputs": ["passwort", "benutzername"],
+        "has_login": ["anmelden", "einloggen"],
+        "has_contact": ["kontakt"],
+        "has_cards": ["karte"],
+        "has_tables": ["tabelle"],
+    },
+    "pt": {
+        "has_navigation": ["início"],
+        "has_search": ["pesquisar", "busca"],
+        "has_inputs": ["senha", "usuário"],
+        "has_login": ["entrar", "iniciar sessão"],
+        "has_contact": ["contato", "contacto"],
+        "has_cards": ["cartão"],
+        "has_tables": ["tabela"],
+    },
+}
+
+
+def normalize(text: str) -> str:
+    """Case-fold, strip accents and collapse whitespace"""
+    if text.isascii():
+        return " ".join(text.lower().split())
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.split())
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over (rule, keyword) pairs"""
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # (rule, keyword, normalized length) ending at each state
+        self.output: List[List[Tuple[str, str, int]]] = [[]]
+
+        for rule, keyword in keywords:
+            state = 0
+            normalized = normalize(keyword)
+            for ch in normalized:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            if state and (rule, keyword, len(normalized)) not in self.output[state]:
+                self.output[state].append((rule, keyword, len(normalized)))
+
+        # Breadth-first failure links; outputs inherit those of their fallback state
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self.goto[state].items():
+                pending.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0) if state else 0
+                self.output[nxt].extend(self.output[self.fail[nxt]])
+
+    def scan(self, text: str) -> List[Tuple[str, str]]:
+        """(rule, keyword) for every whole-word occurrence in already-normalized text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        found = []
+        last = len(text) - 1
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            # A keyword edge that is a word character must not continue a longer word
+            after = end < last and _is_word(ch) and _is_word(text[end + 1])
+            for rule, keyword, length in output[state]:
+                start = end - length + 1
+                if after or (start and _is_word(text[start]) and _is_word(text[start - 1])):
+                    continue
+                found.append((rule, keyword))
+        return found
+
+
+def _load_pack(name: str) -> Dict[str, List[str]]:
+    if name in KEYWORD_PACKS:
+        return KEYWORD_PACKS[name]
+    try:
+        with open(name, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring keyword pack {name!r}: {e}")
+        return {}
+
+
+@lru_cache(maxsize=8)
+def compile_packs(packs: Tuple[str, ...]) -> KeywordMatcher:
+    pairs = []
+    for name in packs:
+        for rule, keywords in _load_pack(name).items():
+            pairs.extend((rule, keyword) for keyword in keywords)
+    return KeywordMatcher(pairs)
+
+
+def configured_packs() -> Tuple[str, ...]:
+    return tuple(p.strip() for p in os.getenv("INTERACTIVE_KEYWORD_PACKS", "en").split(",") if p.strip())
+
+
+def detect(design_analysis: Dict[str, Any], packs: Tuple[str, ...] = None) -> Tuple[Dict[str, bool], Dict[str, List[Dict]]]:
+    """(flags, evidence) where evidence maps a flag to what triggered it"""
+    elements = design_analysis.get("elements", {})
+    matcher = compile_packs(packs or configured_packs())
+    flags = dict.fromkeys(FLAGS, False)
+    evidence: Dict[str, List[Dict]] = {}
+
+    for flag, groups in GROUP_RULES.items():
+        for group in groups:
+            if elements.get(group):
+                flags[flag] = True
+                evidence.setdefault(flag, []).append({"group": group, "count": len(elements[group])})
+
+    # Boards repeat labels (card grids, menus); scan each distinct text once
+    scanned: Dict[str, List[Tuple[str, str]]] = {}
+    full = set()
+    for index, element in enumerate(elements.get("text", [])):
+        content = element.get("content") if isinstance(element, dict) else None
+        if not content:
+            continue
+        hits = scanned.get(content)
+        if hits is None:
+            hits = scanned[content] = [
+                (flag, keyword)
+                for rule, keyword in matcher.scan(normalize(content))
+                for flag in (rule,) + IMPLIES.get(rule, ())
+            ]
+            for flag, _ in hits:
+                flags[flag] = True
+        for flag, keyword in hits:
+            if flag in full:
+                continue
+            found = evidence.setdefault(flag, [])
+            found.append({"element": index, "keyword": keyword, "text": content[:60]})
+            if len(found) >= MAX_EVIDENCE:
+                full.add(flag)
+
+    return flags, evidence
+
+
+# (text, flags detect() must raise for it and no others); benchmark.py runs these first
+SELF_CHECK_CASES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("Add card", ("has_cards",)),
+    ("Discard changes", ()),
+    ("Comfortable seating", ()),
+    ("Draw on the canvas", ()),
+    ("Navigation", ("has_navigation",)),
+    ("Pricing tables", ("has_tables",)),
+    ("Log in", ("has_login", "has_forms", "has_inputs")),
+    ("E-mail: hi@example.com", ("has_contact", "has_forms", "has_inputs")),
+    ("Iniciar sesión", ("has_login", "has_forms", "has_inputs")),
+]
+
+
+def self_check(packs: Tuple[str, ...] = None) -> List[str]:
+    """Descriptions of the SELF_CHECK_CASES detect() gets wrong (every built-in pack by default)"""
+    packs = packs or tuple(KEYWORD_PACKS)
+    failures = []
+    for text, expected in SELF_CHECK_CASES:
+        flags, _ = detect({"elements": {"text": [{"content": text}]}}, packs)
+        raised = {flag for flag, value in flags.items() if value}
+        if raised != set(expected):
+            failures.append(f"{text!r}: expected {sorted(expected)}, got {sorted(raised)}")
+    return failures
@@ -0,0 +1,377 @@
+"""
+Append-only journal of generation requests and upstream responses.
+
+With JOURNAL_DIR set, every generate_code() call appends one JSON line:
+design hash and analysis, user request, prompt and prompt version, model
+parameters, upstream status/timings/usage, the raw reply and the outcome.
+API keys, bearer tokens and e-mail addresses are redacted before writing.
+Lines go to a per-process segment that is rotated by size or age and then
+gzipped; only the newest JOURNAL_MAX_SEGMENTS gzipped segments are kept
+(0 keeps them all). Segments still open in any process are never pruned;
+segments left behind by workers that exited (or have been idle for longer
+than JOURNAL_SEGMENT_SECONDS) are gzipped by whichever process rotates next.
+Writing happens on a background thread, so requests never wait on disk.
+
+Replay recorded traffic offline, e.g. against fake_openrouter.py or with
+the current prompt builder instead of the recorded prompt:
+
+    python journal.py stats journal/
+    python journal.py replay journal/ --base-url http://localhost:8001/api/v1/chat/completions
+    python journal.py replay journal/ --prompt current --prompt-only
+"""
+import argparse
+import contextvars
+import glob
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import tracing
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "")
+JOURNAL_SEGMENT_BYTES = int(float(os.getenv("JOURNAL_SEGMENT_MB", "64")) * 1024 * 1024)
+JOURNAL_SEGMENT_SECONDS = int(os.getenv("JOURNAL_SEGMENT_SECONDS", "3600"))
+JOURNAL_MAX_SEGMENTS = int(os.getenv("JOURNAL_MAX_SEGMENTS", "48"))
+
+_API_KEY_RE = re.compile(r"\b(sk-[A-Za-z0-9_-]{16,}|Bearer\s+[A-Za-z0-9._~+/=-]{8,})")
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+_current_entry = contextvars.ContextVar("journal_entry", default=None)
+
+
+def enabled() -> bool:
+    return bool(JOURNAL_DIR)
+
+
+def redact(value: Any) -> Any:
+    """Mask API keys and e-mail addresses in every string of a JSON-like value"""
+    if isinstance(value, str):
+        secret = os.getenv("OPENROUTER_API_KEY")
+        if secret and len(secret) >= 8 and secret in value:
+            value = value.replace(secret, "[REDACTED_KEY]")
+        value = _API_KEY_RE.sub("[REDACTED_KEY]", value)
+        return _EMAIL_RE.sub("[REDACTED_EMAIL]", value)
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def design_hash(design_analysis: Dict[str, Any]) -> str:
+    canonical = json.dumps(design_analysis, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def entry(design_data: Dict[str, Any], user_request: str):
+    """Collect one journal record for the enclosed generation; no-op when disabled"""
+    if not enabled():
+        yield None
+        return
+
+    design_analysis = design_data.get("design_analysis", {})
+    record = {
+        "ts": time.time(),
+        "request_id": tracing.current_request_id(),
+        "design_hash": design_hash(design_analysis),
+        "design_analysis": design_analysis,
+        "image_count": len(design_data.get("images", [])),
+        "user_request": user_request,
+    }
+    token = _current_entry.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = repr(e)[:200]
+        raise
+    finally:
+        _current_entry.reset(token)
+        record["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _writer.submit(record)
+
+
+def annotate(**fields):
+    """Add fields to the record of the generation in progress, if any"""
+    record = _current_entry.get()
+    if record is not None:
+        record.update(fields)
+
+
+@contextmanager
+def scratch():
+    """Notes made inside go to a private dict, not the generation's record (worker threads)"""
+    notes: Dict[str, Any] = {}
+    token = _current_entry.set(notes if enabled() else None)
+    try:
+        yield notes
+    finally:
+        _current_entry.reset(token)
+
+
+# --------------------------------------
+# Segment writer
+# --------------------------------------
+class _SegmentWriter:
+    """Owns this process's open segment; rotates, compresses and prunes"""
+
+    def __init__(self, max_queue: int = 1000):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.file = None
+        self.path = None
+        self.opened_at = 0.0
+        self.sequence = 0
+
+    def submit(self, record: Dict[str, Any]):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            print("⚠️ Journal queue full, dropping record")
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                self._write(json.dumps(redact(record), separators=(",", ":"), default=str) + "\n")
+            except Exception as e:
+                # Never let the thread die: records queued until the next submit() would be lost
+                print(f"⚠️ Journal write failed: {type(e).__name__}: {e}")
+
+    def _write(self, line: str):
+        if self.file is not None and (
+            self.file.tell() >= JOURNAL_SEGMENT_BYTES or time.time() - self.opened_at >= JOURNAL_SEGMENT_SECONDS
+        ):
+            self._rotate()
+        if self.file is None:
+            os.makedirs(JOURNAL_DIR, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+            self.sequence += 1
+            self.path = os.path.join(JOURNAL_DIR, f"journal-{stamp}-{os.getpid()}-{self.sequence:04d}.jsonl")
+            self.file = open(self.path, "a", encoding="utf-8")
+            self.opened_at = time.time()
+        self.file.write(line)
+        self.file.flush()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        _compress(self.path)
+        self._sweep()
+        self._prune()
+
+    def _sweep(self):
+        """Compress .jsonl segments other processes will never rotate themselves"""
+        now = time.time()
+        for path in list_segments(JOURNAL_DIR):
+            if not path.endswith(".jsonl") or path == self.path:
+                continue
+            pid = _segment_pid(path)
+            try:
+                idle = now - os.path.getmtime(path) >= JOURNAL_SEGMENT_SECONDS
+            except OSError:
+                continue
+            # A live owner rotates an idle segment before its next write, so compressing it here is safe
+            if pid != os.getpid() and (idle or not _pid_alive(pid)):
+                _compress(path)
+
+    def _prune(self):
+        if JOURNAL_MAX_SEGMENTS <= 0:
+            return
+        # Only closed segments: other workers are still appending to their .jsonl
+        closed = [path for path in list_segments(JOURNAL_DIR) if path.endswith(".gz")]
+        for stale in closed[:max(0, len(closed) - JOURNAL_MAX_SEGMENTS)]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _compress(path: str):
+    # Claim the segment first so two processes sweeping at once don't both compress it
+    claimed = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return
+    with open(claimed, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(claimed)
+
+
+def _segment_pid(path: str) -> Optional[int]:
+    # journal-YYYYmmdd-HHMMSS-<pid>-<seq>.jsonl
+    parts = os.path.basename(path).split("-")
+    return int(parts[3]) if len(parts) == 5 and parts[3].isdigit() else None
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+_writer = _SegmentWriter()
+
+
+# --------------------------------------
+# Reading
+# --------------------------------------
+def list_segments(directory: str) -> List[str]:
+    """Segments oldest first (names start with their UTC open time)"""
+    paths = glob.glob(os.path.join(directory, "journal-*.jsonl")) + glob.glob(os.path.join(directory, "journal-*.jsonl.gz"))
+    return sorted(paths, key=os.path.basename)
+
+
+def iter_records(directory: str) -> Iterator[Dict[str, Any]]:
+    for path in list_segments(directory):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A crash can leave a half-written last line
+                    continue
+
+
+# --------------------------------------
+# Replay
+# --------------------------------------
+def _summarize(values: List[float]) -> str:
+    if not values:
+        return "-"
+    return f"p50 {statistics.median(values):.0f}  max {max(values):.0f}"
+
+
+def replay(records: List[Dict[str, Any]], base_url: Optional[str], api_key: Optional[str],
+           prompt_mode: str, prompt_only: bool) -> List[Dict[str, Any]]:
+    import ai_service
+
+    assistant = ai_service.AIdesignAssistant(base_url=base_url, api_key=api_key or "replay")
+    rows = []
+    for record in records:
+        if prompt_mode == "current":
+            prompt = assistant.create_code_generation_prompt(
+                {"design_analysis": record.get("design_analysis", {}), "images": []}, record.get("user_request", ""))
+        else:
+            prompt = record.get("prompt")
+        if not prompt:
+            continue
+
+        recorded_upstream = record.get("upstream", {})
+        row = {
+            "request_id": record.get("request_id"),
+            "design_hash": (record.get("design_hash") or "")[:12],
+            "prompt_chars_recorded": len(record.get("prompt") or ""),
+            "prompt_chars_replay": len(prompt),
+            "upstream_ms_recorded": recorded_upstream.get("duration_ms"),
+            "output_chars_recorded": len(record.get("content") or ""),
+        }
+
+        if not prompt_only:
+            start = time.perf_counter()
+            params = record.get("params") or {}
+            response = assistant.call_ai_api(prompt, model=record.get("model") or "deepseek/deepseek-chat",
+                                             max_tokens=params.get("max_tokens") or 6000)
+            row["upstream_ms_replay"] = round((time.perf_counter() - start) * 1000, 1)
+            content = response["choices"][0]["message"]["content"] if response and response.get("choices") else ""
+            code_data, _ = assistant._parse_code_json(content) if content else (None, None)
+            row["output_chars_replay"] = len(content)
+            row["parsed"] = code_data is not None
+            row["files"] = len(code_data.get("project_structure", [])) if code_data else 0
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    print(f"{'design':<14}{'prompt rec':>12}{'prompt now':>12}{'ms rec':>10}{'ms now':>10}{'out rec':>10}{'out now':>10}")
+    for row in rows:
+        print(f"{row['design_hash']:<14}{row['prompt_chars_recorded']:>12}{row['prompt_chars_replay']:>12}"
+              f"{str(row['upstream_ms_recorded'] or '-'):>10}{str(row.get('upstream_ms_replay', '-')):>10}"
+              f"{row['output_chars_recorded']:>10}{str(row.get('output_chars_replay', '-')):>10}")
+
+    def column(key):
+        return [row[key] for row in rows if isinstance(row.get(key), (int, float))]
+
+    print(f"\n{len(rows)} records")
+    print(f"prompt chars   recorded {_summarize(column('prompt_chars_recorded'))}   replay {_summarize(column('prompt_chars_replay'))}")
+    print(f"upstream ms    recorded {_summarize(column('upstream_ms_recorded'))}   replay {_summarize(column('upstream_ms_replay'))}")
+    print(f"output chars   recorded {_summarize(column('output_chars_recorded'))}   replay {_summarize(column('output_chars_replay'))}")
+    parsed = [row["parsed"] for row in rows if "parsed" in row]
+    if parsed:
+        print(f"parse success  {sum(parsed)}/{len(parsed)}")
+
+
+def print_stats(records: List[Dict[str, Any]]):
+    outcomes, models = {}, {}
+    for record in records:
+        outcomes[record.get("outcome", "unknown")] = outcomes.get(record.get("outcome", "unknown"), 0) + 1
+        models[record.get("model", "-")] = models.get(record.get("model", "-"), 0) + 1
+    print(f"{len(records)} records, {len({r.get('design_hash') for r in records})} distinct designs")
+    print(f"outcomes: {outcomes}")
+    print(f"models:   {models}")
+    print(f"total ms      {_summarize([r['total_ms'] for r in records if 'total_ms' in r])}")
+    print(f"prompt chars  {_summarize([len(r.get('prompt') or '') for r in records])}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = sub.add_parser("stats", help="summarize a journal directory")
+    stats_parser.add_argument("directory")
+
+    replay_parser = sub.add_parser("replay", help="re-run recorded generations")
+    replay_parser.add_argument("directory")
+    replay_parser.add_argument("--base-url", help="upstream to replay against (default: OPENROUTER_BASE_URL)")
+    replay_parser.add_argument("--api-key", help="default: OPENROUTER_API_KEY")
+    replay_parser.add_argument("--prompt", choices=["recorded", "current"], default="recorded",
+                               help="send the recorded prompt, or rebuild it with the current prompt code")
+    replay_parser.add_argument("--prompt-only", action="store_true", help="compare prompts without calling upstream")
+    replay_parser.add_argument("--limit", type=int, default=0)
+    replay_parser.add_argument("--output", help="also write per-record rows as JSON to this path")
+    args = parser.parse_args(argv)
+
+    records = list(iter_records(args.directory))
+    if args.command == "stats":
+        print_stats(records)
+        return 0
+
+    if args.limit:
+        records = records[-args.limit:]
+    rows = replay(records, args.base_url, args.api_key or os.getenv("OPENROUTER_API_KEY"), args.prompt, args.prompt_only)
+    print_report(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
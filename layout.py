@@ -0,0 +1,325 @@
+"""
+Hierarchical layout inference for the generation prompt.
+
+Turns the flat element lists of a design_analysis into a compact
+section -> row -> column tree:
+
+- containment: every element is attached to the smallest container shape
+  around it, found through a multi-level grid spatial index (each
+  container is registered in at most GRID_FANOUT x GRID_FANOUT cells of
+  the level matching its size, clipped to where elements start, so one
+  huge client-sent rect costs no more than a small one);
+- rows: siblings whose vertical extents overlap are merged with a
+  sweep over their intervals sorted by top;
+- columns: the same sweep on horizontal extents inside each row;
+- sections: runs of rows split at unusually large vertical gaps, with
+  full-width containers (hero bands, footers) as sections of their own.
+
+Rows carry the inferred gap, horizontal/vertical alignment and a flex or
+grid hint. Everything is sorting and linear sweeps, O(n log n) overall.
+The analysis comes from the client, so malformed elements are skipped and
+non-numeric positions or font sizes read as their defaults.
+"""
+import math
+from collections import defaultdict
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+ROW_TOLERANCE = 4          # px of vertical slack when merging rows
+SECTION_GAP_MIN = 48       # px; smaller gaps never start a new section
+SECTION_GAP_FACTOR = 1.5   # ... nor gaps below this multiple of the median row gap
+FULL_WIDTH_RATIO = 0.9     # containers at least this wide form their own section
+ALIGN_TOLERANCE = 0.05     # fraction of the parent width treated as "equal" margins
+GRID_WIDTH_TOLERANCE = 0.15
+BUTTON_MAX_HEIGHT = 80     # taller labelled shapes are cards, not buttons
+GRID_FANOUT = 16           # cells per side a container may span before moving a level up
+MAX_TEXT = 120
+MAX_DEPTH = 12
+
+
+def _num(value: Any, default: float = 0) -> float:
+    """value as a finite number (ints stay ints, numeric strings are parsed), else default"""
+    if isinstance(value, bool):
+        return default
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return default
+    return value if math.isfinite(value) else default
+
+
+def _dict(value: Any) -> Dict[str, Any]:
+    return value if isinstance(value, dict) else {}
+
+
+def _text(element: Dict[str, Any]) -> str:
+    content = element.get("content")
+    return (content if isinstance(content, str) else "")[:MAX_TEXT]
+
+
+class _Item:
+    __slots__ = ("index", "kind", "element", "left", "top", "right", "bottom", "container", "button", "children")
+
+    def __init__(self, index: int, kind: str, element: Dict[str, Any], container: bool, button: bool):
+        position = _dict(element.get("position"))
+        self.index = index
+        self.kind = kind
+        self.element = element
+        self.left = _num(position.get("left"))
+        self.top = _num(position.get("top"))
+        self.right = self.left + _num(position.get("width"))
+        self.bottom = self.top + _num(position.get("height"))
+        self.container = container
+        self.button = button
+        self.children: List["_Item"] = []
+
+    @property
+    def area(self) -> float:
+        return (self.right - self.left) * (self.bottom - self.top)
+
+    def contains(self, other: "_Item") -> bool:
+        return (other.left >= self.left and other.top >= self.top
+                and other.right <= self.right and other.bottom <= self.bottom)
+
+
+def _key(element: Dict[str, Any]):
+    p = _dict(element.get("position"))
+    return (str(element.get("type")), _num(p.get("left")), _num(p.get("top")), _num(p.get("width")), _num(p.get("height")))
+
+
+def _elements(elements: Dict[str, Any], kind: str) -> List[Dict[str, Any]]:
+    group = elements.get(kind)
+    return [e for e in group if isinstance(e, dict)] if isinstance(group, list) else []
+
+
+def _collect_items(design_analysis: Dict[str, Any]) -> List[_Item]:
+    elements = _dict(design_analysis.get("elements"))
+    # buttons/containers repeat entries of shapes; match them by value, as
+    # client-sent JSON does not preserve identity
+    buttons = {_key(e) for e in _elements(elements, "buttons")}
+    containers = {_key(e) for e in _elements(elements, "containers")}
+
+    items = []
+    for kind in ("text", "shapes", "images"):
+        for element in _elements(elements, kind):
+            key = _key(element)
+            items.append(_Item(len(items), kind, element, key in containers, key in buttons))
+    return items
+
+
+def _attach_children(items: List[_Item]) -> List[_Item]:
+    """Parent each item to the smallest enclosing container; returns the roots"""
+    containers = [c for c in items if c.container and c.area > 0]
+    if not containers:
+        return items
+
+    cell = max(64, int(median(max(c.right - c.left, c.bottom - c.top) for c in containers)))
+    # Lookups only ever happen at item top-left corners: cells outside their hull stay empty
+    min_x, max_x = min(i.left for i in items), max(i.left for i in items)
+    min_y, max_y = min(i.top for i in items), max(i.top for i in items)
+
+    # level -> cell -> containers; level k has cells of cell * GRID_FANOUT**k
+    grids: Dict[int, Dict[tuple, List[_Item]]] = defaultdict(lambda: defaultdict(list))
+    for c in containers:
+        left, right = max(c.left, min_x), min(c.right, max_x)
+        top, bottom = max(c.top, min_y), min(c.bottom, max_y)
+        if left > right or top > bottom:
+            continue
+        level, size = 0, cell
+        while max(right // size - left // size, bottom // size - top // size) >= GRID_FANOUT:
+            level, size = level + 1, size * GRID_FANOUT
+        for gx in range(int(left // size), int(right // size) + 1):
+            for gy in range(int(top // size), int(bottom // size) + 1):
+                grids[level][(gx, gy)].append(c)
+    sizes = {level: cell * GRID_FANOUT ** level for level in grids}
+
+    roots = []
+    for item in items:
+        parent: Optional[_Item] = None
+        # A container holding the item necessarily covers its top-left corner
+        candidates = (c for level, grid in grids.items()
+                      for c in grid.get((int(item.left // sizes[level]), int(item.top // sizes[level])), ()))
+        for c in candidates:
+            if c is item or not c.contains(item):
+                continue
+            # Identical boxes: the earlier one is the parent, so there are no cycles
+            if c.area < item.area or (c.area == item.area and c.index > item.index):
+                continue
+            if parent is None or c.area < parent.area or (c.area == parent.area and c.index < parent.index):
+                parent = c
+        if parent is None:
+            roots.append(item)
+        else:
+            parent.children.append(item)
+    return roots
+
+
+def _sweep(items: List[_Item], start: str, end: str, tolerance: float) -> List[List[_Item]]:
+    """Group items whose [start, end] intervals overlap (interval merging after a sort)"""
+    groups: List[List[_Item]] = []
+    reach = None
+    for item in sorted(items, key=lambda i: (getattr(i, start), getattr(i, end))):
+        if reach is None or getattr(item, start) > reach + tolerance:
+            groups.append([item])
+            reach = getattr(item, end)
+        else:
+            groups[-1].append(item)
+            reach = max(reach, getattr(item, end))
+    return groups
+
+
+def _leaf(item: _Item) -> Dict[str, Any]:
+    element = item.element
+    styles = _dict(element.get("styles"))
+    size = {"w": round(item.right - item.left), "h": round(item.bottom - item.top)}
+
+    if item.kind == "text":
+        font_size = _num(styles.get("fontSize"), 16)
+        level = "h1" if font_size > 32 else "h2" if font_size > 24 else "h3" if font_size > 18 else "text"
+        node = {"type": level, "text": _text(element)}
+        if styles.get("fontWeight") == "bold":
+            node["bold"] = True
+        if styles.get("fill") and styles["fill"] != "#000000":
+            node["color"] = styles["fill"]
+        return node
+    if item.kind == "images":
+        return dict({"type": "image"}, **size)
+
+    node = dict({"type": "shape", "shape": element.get("type")}, **size)
+    if styles.get("fill") and styles["fill"] != "transparent":
+        node["fill"] = styles["fill"]
+    if styles.get("borderRadius"):
+        node["radius"] = styles["borderRadius"]
+    return node
+
+
+def _node(item: _Item, depth: int) -> Dict[str, Any]:
+    if not item.children:
+        return _leaf(item)
+
+    node = _leaf(item)
+    node.pop("shape", None)
+    texts = [c for c in item.children if c.kind == "text" and not c.children]
+    if item.button and len(item.children) == 1 and texts and item.bottom - item.top <= BUTTON_MAX_HEIGHT:
+        # A shape with just a label on it is a button
+        node["type"] = "button"
+        node["text"] = _text(texts[0].element)
+        return node
+
+    node["type"] = "container"
+    children = item.children
+    if depth >= MAX_DEPTH:
+        node["items"] = [_leaf(c) for c in _flatten(children)]
+    else:
+        node["rows"] = _rows(children, item.left, item.right, depth + 1)
+    return node
+
+
+def _flatten(items: List[_Item]) -> List[_Item]:
+    out = []
+    stack = list(items)
+    while stack:
+        item = stack.pop()
+        out.append(item)
+        stack.extend(item.children)
+    return sorted(out, key=lambda i: (i.top, i.left))
+
+
+def _row_hints(columns: List[List[_Item]], parent_left: float, parent_right: float) -> Dict[str, Any]:
+    hints: Dict[str, Any] = {}
+    spans = [(min(i.left for i in col), max(i.right for i in col)) for col in columns]
+    left, right = spans[0][0], spans[-1][1]
+    width = max(1.0, parent_right - parent_left)
+    margin_left, margin_right = left - parent_left, parent_right - right
+
+    if len(columns) > 1:
+        gaps = [spans[k + 1][0] - spans[k][1] for k in range(len(spans) - 1)]
+        hints["gap"] = round(median(gaps))
+    if len(columns) > 1 and max(margin_left, margin_right) < ALIGN_TOLERANCE * width:
+        hints["align"] = "space-between"
+    elif abs(margin_left - margin_right) < ALIGN_TOLERANCE * width:
+        hints["align"] = "center"
+    else:
+        hints["align"] = "left" if margin_left < margin_right else "right"
+
+    if len(columns) > 1:
+        tops = [min(i.top for i in col) for col in columns]
+        bottoms = [max(i.bottom for i in col) for col in columns]
+        centers = [(t + b) / 2 for t, b in zip(tops, bottoms)]
+        spread = {name: max(v) - min(v) for name, v in (("top", tops), ("center", centers), ("bottom", bottoms))}
+        hints["valign"] = min(spread, key=spread.get)
+
+        # Grid: three or more equally wide columns at equal spacing (cards), otherwise flex (navbars)
+        widths = [b - a for a, b in spans]
+        mean = sum(widths) / len(widths)
+        mean_gap = sum(gaps) / len(gaps)
+        equal = (mean > 0 and max(abs(w - mean) for w in widths) <= GRID_WIDTH_TOLERANCE * mean
+                 and max(abs(g - mean_gap) for g in gaps) <= GRID_WIDTH_TOLERANCE * mean_gap + ROW_TOLERANCE)
+        hints["layout"] = "grid" if equal and len(columns) >= 3 else "flex"
+        if hints["layout"] == "grid":
+            hints["columns"] = len(columns)
+    return hints
+
+
+def _row(row_items: List[_Item], parent_left: float, parent_right: float, depth: int) -> Dict[str, Any]:
+    columns = _sweep(row_items, "left", "right", 0)
+    top = min(i.top for i in row_items)
+    row = {"top": round(top), "height": round(max(i.bottom for i in row_items) - top)}
+    row.update(_row_hints(columns, parent_left, parent_right))
+    row["cols"] = [[_node(i, depth) for i in sorted(col, key=lambda i: i.top)] for col in columns]
+    return row
+
+
+def _rows(items: List[_Item], parent_left: float, parent_right: float, depth: int) -> List[Dict[str, Any]]:
+    return [_row(group, parent_left, parent_right, depth) for group in _sweep(items, "top", "bottom", ROW_TOLERANCE)]
+
+
+def _sections(rows: List[Dict[str, Any]], root_items_by_row: List[List[_Item]], canvas_width: float) -> List[Dict[str, Any]]:
+    gaps = [rows[k + 1]["top"] - (rows[k]["top"] + rows[k]["height"]) for k in range(len(rows) - 1)]
+    threshold = max(SECTION_GAP_MIN, SECTION_GAP_FACTOR * median(gaps)) if gaps else SECTION_GAP_MIN
+
+    def full_width(row_items):
+        return len(row_items) == 1 and row_items[0].container and \
+            (row_items[0].right - row_items[0].left) >= FULL_WIDTH_RATIO * canvas_width
+
+    groups: List[List[int]] = []
+    bands = set()
+    for k in range(len(rows)):
+        band = full_width(root_items_by_row[k])
+        if not groups or band or gaps[k - 1] >= threshold or groups[-1][0] in bands:
+            groups.append([])
+        groups[-1].append(k)
+        if band:
+            bands.add(k)
+
+    sections = []
+    for group in groups:
+        first, last = rows[group[0]], rows[group[-1]]
+        section = {
+            "top": first["top"],
+            "height": last["top"] + last["height"] - first["top"],
+            "gap_before": round(gaps[group[0] - 1]) if group[0] else first["top"],
+        }
+        if group[0] in bands:
+            section["band"] = True
+        section["rows"] = [rows[k] for k in group]
+        sections.append(section)
+    return sections
+
+
+def build_layout_tree(design_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact section/row/column tree for the prompt"""
+    canvas = _dict(design_analysis.get("canvas"))
+    items = _collect_items(design_analysis)
+    width = _num(canvas.get("width")) or max((i.right for i in items), default=0)
+    height = _num(canvas.get("height")) or max((i.bottom for i in items), default=0)
+    tree = {"width": width, "height": height, "sections": []}
+    if not items:
+        return tree
+
+    roots = _attach_children(items)
+    root_rows = _sweep(roots, "top", "bottom", ROW_TOLERANCE)
+    rows = [_row(group, 0, width, 1) for group in root_rows]
+    tree["sections"] = _sections(rows, root_rows, width)
+    return tree
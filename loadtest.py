@@ -0,0 +1,233 @@
+"""
+Open-loop load generator for a running Whiteboard2Web server.
+
+    python fake_openrouter.py --latency lognormal:1.0,0.5 &
+    OPENROUTER_BASE_URL=http://localhost:8001/api/v1/chat/completions OPENROUTER_API_KEY=fake \
+        AUTH_IP_ATTEMPTS=100000 python app.py &
+    python loadtest.py --target http://localhost:5000 --rps 5 --duration 60
+
+Requests are scheduled at a fixed rate regardless of how fast the server
+answers, and latency is measured from the scheduled start, so queueing
+shows up in the percentiles instead of silently lowering the offered load.
+
+Every virtual user signs up and logs in from this one IP, so start the
+server with AUTH_IP_ATTEMPTS raised as above; otherwise the per-IP login
+throttle answers 429 almost at once. 429s are counted separately from
+errors and left out of the latency percentiles.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+import synthetic_designs
+
+DEFAULT_MIX = "generate=1,login=1,save=2,projects=3,load=2"
+
+
+class Throttled(Exception):
+    """The server answered 429"""
+
+
+def succeeded(response: requests.Response) -> bool:
+    if response.status_code == 429:
+        raise Throttled()
+    return response.ok and response.json().get("success", False)
+
+
+class VirtualUser:
+    def __init__(self, target: str, index: int, run_id: str):
+        self.target = target
+        self.email = f"loadtest-{run_id}-{index}@example.test"
+        self.password = f"pw-{run_id}-{index}"
+        self.session = requests.Session()
+        self.project_ids: List[str] = []
+        self.lock = threading.Lock()
+
+    def signup(self):
+        response = self.session.post(f"{self.target}/api/signup", json={
+            "name": self.email.split("@")[0],
+            "email": self.email,
+            "password": self.password,
+        }, timeout=30)
+        if response.status_code == 429:
+            raise SystemExit("❌ Signup throttled: start the server with AUTH_IP_ATTEMPTS raised for load runs")
+        response.raise_for_status()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.results: Dict[str, List[Tuple[float, str]]] = {}
+        self.results_lock = threading.Lock()
+        run_id = uuid.uuid4().hex[:8]
+        self.users = [VirtualUser(args.target, i, run_id) for i in range(args.users)]
+        # What the whiteboard sends: the server derives design_analysis from the canvas itself
+        self.designs = [
+            {"canvas_data": synthetic_designs.make_fabric_canvas(n, seed=n),
+             "canvas_size": {"width": 1400, "height": max(900, n * 12)}}
+            for n in (10, 50, 200)
+        ]
+        self.mix = self._parse_mix(args.mix)
+
+    @staticmethod
+    def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+        mix = []
+        for part in spec.split(","):
+            name, _, weight = part.partition("=")
+            mix.append((name.strip(), float(weight or 1)))
+        return mix
+
+    # Route handlers return True on success and raise Throttled on 429
+
+    def route_generate(self, user: VirtualUser) -> bool:
+        response = user.session.post(f"{self.args.target}/api/generated", json={
+            "design_data": self.rng.choice(self.designs),
+            "user_prompt": "Build a landing page",
+        }, timeout=self.args.timeout)
+        return succeeded(response)
+
+    def route_login(self, user: VirtualUser) -> bool:
+        # A returning user logging in again on their own session
+        response = user.session.post(f"{self.args.target}/api/login", json={
+            "email": user.email,
+            "password": user.password,
+        }, timeout=self.args.timeout)
+        return succeeded(response)
+
+    def route_save(self, user: VirtualUser) -> bool:
+        # Projects store the fabric canvas JSON, which search and thumbnails read
+        design = synthetic_designs.make_fabric_canvas(20, seed=self.rng.randint(0, 1000))
+        response = user.session.post(f"{self.args.target}/api/projects/save", json={
+            "title": f"Load test {uuid.uuid4().hex[:6]}",
+            "design": design,
+        }, timeout=self.args.timeout)
+        ok = succeeded(response)
+        if ok:
+            with user.lock:
+                user.project_ids.append(response.json()["project_id"])
+        return ok
+
+    def route_projects(self, user: VirtualUser) -> bool:
+        response = user.session.get(f"{self.args.target}/api/projects", timeout=self.args.timeout)
+        return succeeded(response)
+
+    def route_load(self, user: VirtualUser) -> bool:
+        with user.lock:
+            project_id = self.rng.choice(user.project_ids) if user.project_ids else None
+        if project_id is None:
+            return self.route_save(user)
+        response = user.session.get(f"{self.args.target}/api/projects/{project_id}", timeout=self.args.timeout)
+        return succeeded(response)
+
+    def _fire(self, route: str, user: VirtualUser, scheduled: float):
+        handler = getattr(self, f"route_{route}")
+        try:
+            outcome = "ok" if handler(user) else "error"
+        except Throttled:
+            outcome = "throttled"
+        except (requests.RequestException, ValueError):
+            outcome = "error"
+        latency = time.perf_counter() - scheduled
+        with self.results_lock:
+            self.results.setdefault(route, []).append((latency, outcome))
+
+    def prepare(self):
+        print(f"👥 Signing up {len(self.users)} virtual users...")
+        for user in self.users:
+            user.signup()
+            # Seed each user with a project so load has something to fetch
+            self.route_save(user)
+
+    def run(self) -> float:
+        names = [name for name, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+        interval = 1.0 / self.args.rps
+        total = int(self.args.rps * self.args.duration)
+
+        print(f"🚀 {total} requests at {self.args.rps} rps over {self.args.duration}s ({self.args.mix})")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for i in range(total):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                route = self.rng.choices(names, weights)[0]
+                pool.submit(self._fire, route, self.rng.choice(self.users), scheduled)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        summary = {}
+        print(f"\n{'route':<12}{'count':>8}{'errors':>9}{'429s':>8}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for route in sorted(self.results):
+            samples = self.results[route]
+            # A 429 is answered without doing the work, so it would only drag the percentiles down
+            latencies = sorted(latency for latency, outcome in samples if outcome != "throttled")
+            errors = sum(1 for _, outcome in samples if outcome == "error")
+            throttled = sum(1 for _, outcome in samples if outcome == "throttled")
+            row = {
+                "count": len(samples),
+                "error_rate": errors / len(samples),
+                "throttled_rate": throttled / len(samples),
+                "rps": len(samples) / elapsed,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+            }
+            summary[route] = row
+            print(f"{route:<12}{row['count']:>8}{row['error_rate']:>9.1%}{row['throttled_rate']:>8.1%}{row['rps']:>8.2f}"
+                  f"{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}")
+        if any(row["throttled_rate"] for row in summary.values()):
+            print("⚠️ Some requests were throttled (429): raise AUTH_IP_ATTEMPTS on the server for load runs")
+        return summary
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="http://localhost:5000")
+    parser.add_argument("--rps", type=float, default=2.0, help="offered load, requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="route weights; routes: generate, login, save, projects, load")
+    parser.add_argument("--users", type=int, default=10, help="virtual users signed up before the run")
+    parser.add_argument("--concurrency", type=int, default=200, help="max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="also write the summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    test = LoadTest(args)
+    unknown = [name for name, _ in test.mix if not hasattr(test, f"route_{name}")]
+    if unknown:
+        parser.error(f"unknown routes in --mix: {', '.join(unknown)}")
+
+    test.prepare()
+    elapsed = test.run()
+    summary = test.report(elapsed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"elapsed": elapsed, "routes": summary}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Per-request memory accounting.
+
+With MEMORY_TRACKING=1, tracemalloc measures the peak Python allocation of
+each generation/project request (relative to where the request started),
+exports it as a histogram and logs the top allocation sites when it goes
+over MEMORY_LOG_THRESHOLD_MB. tracemalloc is process-wide, so the numbers
+are exact for gunicorn's default sync workers and approximate when one
+worker serves several requests concurrently.
+
+current_rss() also backs the worker watchdog in gunicorn.conf.py.
+"""
+import os
+import resource
+import tracemalloc
+
+from flask import g, request
+
+import metrics
+
+MEMORY_TRACKING = os.getenv("MEMORY_TRACKING", "0") == "1"
+MEMORY_TRACKING_FRAMES = int(os.getenv("MEMORY_TRACKING_FRAMES", "1"))
+MEMORY_LOG_THRESHOLD_BYTES = int(float(os.getenv("MEMORY_LOG_THRESHOLD_MB", "100")) * 1024 * 1024)
+
+# Recycle a worker after the current request once its RSS passes this (0 = off)
+WORKER_MAX_RSS_BYTES = int(float(os.getenv("WORKER_MAX_RSS_MB", "0")) * 1024 * 1024)
+
+TRACKED_ENDPOINTS = {
+    "generate_code_endpoint",
+    "save_project",
+    "get_projects",
+    "load_project",
+    "list_projects",
+}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> int:
+    """Resident set size in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+def should_recycle_worker() -> bool:
+    return WORKER_MAX_RSS_BYTES > 0 and current_rss() > WORKER_MAX_RSS_BYTES
+
+
+def _log_top_allocations(route: str, peak: int):
+    print(f"🐘 {route} peaked at {peak / 1024 / 1024:.1f} MB of Python allocations")
+    snapshot = tracemalloc.take_snapshot()
+    for stat in snapshot.statistics("lineno")[:5]:
+        print(f"   {stat.size / 1024:.0f} KB in {stat.count} blocks — {stat.traceback[0]}")
+
+
+def init_app(app):
+    @app.before_request
+    def _start_memory_tracking():
+        if not MEMORY_TRACKING or request.endpoint not in TRACKED_ENDPOINTS:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACKING_FRAMES)
+        tracemalloc.reset_peak()
+        g.memory_baseline = tracemalloc.get_traced_memory()[0]
+
+    @app.teardown_request
+    def _finish_memory_tracking(error=None):
+        baseline = g.pop("memory_baseline", None)
+        if baseline is not None:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            metrics.REQUEST_PEAK_ALLOC_BYTES.labels(route=request.endpoint).observe(peak)
+            if peak > MEMORY_LOG_THRESHOLD_BYTES:
+                _log_top_allocations(request.endpoint, peak)
+
+        metrics.WORKER_RSS_BYTES.set(current_rss())
@@ -0,0 +1,286 @@
+"""
+Prometheus metrics for the app and the generation pipeline.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up by gunicorn.conf.py) and /metrics aggregates all of them, so the
+numbers are the same whichever worker answers the scrape.
+"""
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+# Generation stages range from sub-millisecond (prompt build) to a minute (upstream)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+GENERATION_STAGE_SECONDS = Histogram(
+    "whiteboard_generation_stage_seconds",
+    "Time spent in each step of AIdesignAssistant.generate_code",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+UPSTREAM_RESPONSES = Counter(
+    "whiteboard_upstream_responses_total",
+    "Chat-completion responses by HTTP status ('error' for transport failures)",
+    ["status"],
+)
+GENERATION_FALLBACKS = Counter(
+    "whiteboard_generation_fallbacks_total",
+    "Generations answered with the built-in fallback site",
+    ["reason"],
+)
+TEMPLATE_GENERATIONS = Counter(
+    "whiteboard_template_generations_total",
+    "Designs served by template_generator ('served') or sent on to the model ('escalated')",
+    ["outcome"],
+)
+FANOUT_GENERATIONS = Counter(
+    "whiteboard_fanout_generations_total",
+    "Per-file fan-out generations by outcome (failures fall back to one completion)",
+    ["outcome"],
+)
+INCREMENTAL_GENERATIONS = Counter(
+    "whiteboard_incremental_generations_total",
+    "Generations diffed against the project's last artifact: reused, partial, full or failed",
+    ["outcome"],
+)
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    "whiteboard_near_duplicate_lookups_total",
+    "Fingerprint lookups: hit (earlier result returned), warm (incremental from it) or miss",
+    ["outcome"],
+)
+SPECULATIONS = Counter(
+    "whiteboard_speculations_total",
+    "Speculative pre-generation events (scheduled, completed, cancelled, discarded, throttled, upstream_unhealthy, busy, hit, hit_wait, miss)",
+    ["event"],
+)
+COMPLEXITY_DECISIONS = Counter(
+    "whiteboard_complexity_decisions_total",
+    "Single-completion generations by the complexity tier chosen for them",
+    ["tier"],
+)
+COMPLEXITY_MAX_TOKENS = Histogram(
+    "whiteboard_complexity_max_tokens",
+    "max_tokens chosen per generation",
+    ["tier"],
+    buckets=(1000, 1500, 2000, 3000, 4000, 5000, 6000, 8000, 12000, 16000),
+)
+COMPLEXITY_BUDGET_USED = Histogram(
+    "whiteboard_complexity_budget_used_ratio",
+    "Completion tokens as a fraction of the chosen max_tokens",
+    ["tier"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0),
+)
+COMPLEXITY_OUTCOMES = Counter(
+    "whiteboard_complexity_outcomes_total",
+    "How completions went under their chosen budget: ok, truncated, timeout or error",
+    ["tier", "outcome"],
+)
+LLM_TOKENS = Counter(
+    "whiteboard_llm_tokens_total",
+    "Tokens reported by the upstream usage block",
+    ["kind"],
+)
+THUMBNAILS = Counter(
+    "whiteboard_thumbnails_total",
+    "Project thumbnails rendered, reused from an identical design, or failed",
+    ["event"],
+)
+THUMBNAIL_RENDER_SECONDS = Histogram(
+    "whiteboard_thumbnail_render_seconds",
+    "Time to render one project thumbnail",
+    buckets=FAST_BUCKETS,
+)
+LOGIN_SECONDS = Histogram(
+    "whiteboard_login_seconds",
+    "Login and signup latency by outcome, including the wait for the hashing pool",
+    ["route", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+AUTH_REJECTIONS = Counter(
+    "whiteboard_auth_rejections_total",
+    "Login/signup attempts refused before or instead of hashing",
+    ["reason"],
+)
+MONGO_OPERATION_SECONDS = Histogram(
+    "whiteboard_mongo_operation_seconds",
+    "MongoDB command latency by Flask route",
+    ["route", "command", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "whiteboard_mongo_pool_checked_out",
+    "MongoDB connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "whiteboard_mongo_pool_connections",
+    "Open MongoDB connections (idle and checked out)",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_WAIT_SECONDS = Histogram(
+    "whiteboard_mongo_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=FAST_BUCKETS,
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "whiteboard_mongo_pool_checkout_failures_total",
+    "Connection checkouts that failed (timeout, connection_error, pool_closed)",
+    ["reason"],
+)
+CIRCUIT_STATE = Gauge(
+    "whiteboard_circuit_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open (worst worker)",
+    ["circuit"],
+    multiprocess_mode="max",
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "whiteboard_circuit_transitions_total",
+    "Circuit breaker state changes by the state entered",
+    ["circuit", "state"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "whiteboard_http_request_seconds",
+    "Flask request latency by route",
+    ["route", "method", "status"],
+    buckets=STAGE_BUCKETS,
+)
+
+REQUEST_PEAK_ALLOC_BYTES = Histogram(
+    "whiteboard_request_peak_alloc_bytes",
+    "Peak Python allocation above the request's starting point (tracemalloc)",
+    ["route"],
+    buckets=(1e5, 5e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9),
+)
+WORKER_RSS_BYTES = Gauge(
+    "whiteboard_worker_rss_bytes",
+    "Resident set size of each live worker, sampled after every request",
+    multiprocess_mode="liveall",
+)
+WORKER_RECYCLES = Counter(
+    "whiteboard_worker_recycles_total",
+    "Workers asked to exit gracefully by the RSS watchdog",
+)
+
+
+def observe_stage(name: str, seconds: float):
+    GENERATION_STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+
+def record_usage(usage: dict):
+    if not usage:
+        return
+    if usage.get("prompt_tokens"):
+        LLM_TOKENS.labels(kind="prompt").inc(usage["prompt_tokens"])
+    if usage.get("completion_tokens"):
+        LLM_TOKENS.labels(kind="completion").inc(usage["completion_tokens"])
+
+
+def current_route() -> str:
+    if has_request_context():
+        return request.endpoint or "unknown"
+    return "none"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command listeners run in the thread that issued the command, so the
+    Flask request context (and therefore the route) is available here."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_OPERATION_SECONDS.labels(
+            route=current_route(), command=event.command_name, outcome="ok"
+        ).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_OPERATION_SECONDS.labels(
+            route=current_route(), command=event.command_name, outcome="error"
+        ).observe(event.duration_micros / 1e6)
+
+
+CHECKOUT_FAILURE_REASONS = {"timeout": "timeout", "poolClosed": "pool_closed", "connectionError": "connection_error"}
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Checkout events fire in the thread doing the checkout, so the wait is
+    timed per thread from check_out_started to checked_out/failed."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _observe_wait(self):
+        started = getattr(self._local, "checkout_started", None)
+        if started is not None:
+            MONGO_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+            self._local.checkout_started = None
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._observe_wait()
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(reason=CHECKOUT_FAILURE_REASONS.get(event.reason, "other")).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc()
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def metrics_payload():
+    """(body, content_type) for the /metrics endpoint"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None and request.endpoint != "metrics_endpoint":
+            HTTP_REQUEST_SECONDS.labels(
+                route=request.endpoint or "unknown",
+                method=request.method,
+                status=str(response.status_code),
+            ).observe(time.perf_counter() - started)
+        return response
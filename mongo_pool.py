@@ -0,0 +1,94 @@
+"""
+MongoDB client construction and readiness checks.
+
+The client's pool and timeouts come from the environment instead of
+pymongo's defaults (100 connections, no socket timeout, 30 s server
+selection), so a stalled or unreachable server fails requests in seconds
+rather than holding worker threads:
+
+    MONGO_MAX_POOL_SIZE            connections per app worker (50)
+    MONGO_MIN_POOL_SIZE            kept open while idle (0)
+    MONGO_MAX_IDLE_MS              idle connections are closed after this (60000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS    wait for a free connection (2000)
+    MONGO_SERVER_SELECTION_MS      wait for a usable server (5000)
+    MONGO_CONNECT_TIMEOUT_MS       (5000)
+    MONGO_SOCKET_TIMEOUT_MS        per operation (10000)
+
+A variable that is set takes precedence over the same option in
+MONGO_URI; an unset one leaves the URI's value (or, without one, the
+default above) in place.
+
+Writes and reads are retried once on transient errors (retryable writes
+need a replica set or sharded cluster; standalone servers ignore it).
+"""
+import atexit
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+import pymongo
+from pymongo import MongoClient
+
+import metrics
+
+READY_PING_TIMEOUT_MS = 1000
+
+
+# client option -> (environment variable, default)
+ENV_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", 50),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", 0),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_MS", 60000),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_MS", 5000),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", 5000),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", 10000),
+    "retryWrites": (None, True),
+    "retryReads": (None, True),
+    "appname": (None, "whiteboard2web"),
+}
+
+
+def _uri_options(uri: Optional[str]) -> set:
+    """Lower-cased names of the options given in the URI's query string"""
+    if not uri or "?" not in uri:
+        return set()
+    return {name.lower() for name, _ in parse_qsl(uri.split("?", 1)[1])}
+
+
+def client_options(uri: Optional[str] = None) -> Dict[str, Any]:
+    """Keyword options for MongoClient; pymongo lets these override the URI, so only pass what it lacks"""
+    in_uri = _uri_options(uri)
+    options = {}
+    for option, (env, default) in ENV_OPTIONS.items():
+        if env and os.getenv(env):
+            options[option] = int(os.environ[env])
+        elif option.lower() not in in_uri:
+            options[option] = default
+    return options
+
+
+def create_client(uri: str = None) -> MongoClient:
+    """The app's client: pool settings from the environment, command and pool metrics, closed at exit"""
+    uri = uri or os.getenv("MONGO_URI")
+    client = MongoClient(
+        uri,
+        event_listeners=[metrics.MongoCommandMetrics(), metrics.MongoPoolMetrics()],
+        **client_options(uri),
+    )
+    atexit.register(client.close)
+    return client
+
+
+def ping(client: MongoClient) -> Dict[str, Any]:
+    """{"ok": bool, "ms": round trip[, "error": ...]} for a readiness probe"""
+    start = time.perf_counter()
+    try:
+        # Bounds server selection too, which maxTimeMS alone doesn't: an unreachable
+        # server would otherwise hold the probe for serverSelectionTimeoutMS
+        with pymongo.timeout(READY_PING_TIMEOUT_MS / 1000):
+            client.admin.command("ping")
+        return {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        return {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)[:200]}
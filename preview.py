@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import hmac
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Artifacts never change once stored, so everything under /preview/ can be cached forever.
+# private: previews can belong to a logged-in user and must not land in shared caches
+PREVIEW_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Generated pages run in an opaque origin: they can script themselves but cannot
+# read the app's cookies or call its APIs as the logged-in user. For the same reason
+# their CSS/JS requests carry no session cookie, so the URL itself authorizes them:
+# /preview/<artifact_id>/<token>/ with an HMAC token only the artifact's owner is given
+PREVIEW_CSP = "sandbox allow-scripts allow-forms allow-popups allow-modals"
+
+PREVIEW_ARTIFACT_CACHE_SIZE = int(os.getenv("PREVIEW_ARTIFACT_CACHE_SIZE", "64"))
+PREVIEW_GZIP_MIN_BYTES = 512
+
+_TEXT_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+def normalize_path(path: str) -> str:
+    parts = [p for p in (path or "").replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    name = "/".join(parts)
+    if not name or path.endswith("/"):
+        name = f"{name}/index.html" if name else "index.html"
+    return name
+
+
+def guess_mimetype(filename: str) -> str:
+    mimetype, _ = mimetypes.guess_type(filename)
+    if filename.endswith(".js"):
+        mimetype = "application/javascript"
+    mimetype = mimetype or "application/octet-stream"
+    if mimetype.startswith(_TEXT_TYPES):
+        mimetype += "; charset=utf-8"
+    return mimetype
+
+
+class PreviewFile:
+    __slots__ = ("body", "mimetype", "etag", "_gzipped")
+
+    def __init__(self, filename: str, content: str):
+        self.body = content.encode("utf-8")
+        self.mimetype = guess_mimetype(filename)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self._gzipped = None
+
+    def gzipped(self) -> Optional[bytes]:
+        """Compressed once on first request, then reused by every page that links it"""
+        if len(self.body) < PREVIEW_GZIP_MIN_BYTES or not self.mimetype.startswith(_TEXT_TYPES):
+            return None
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+
+class PreviewHost:
+    """Serves the files of a stored artifact like a small static site."""
+
+    def __init__(self, artifact_store, secret: str, max_artifacts: int = PREVIEW_ARTIFACT_CACHE_SIZE):
+        self.artifact_store = artifact_store
+        self.secret = secret.encode("utf-8")
+        self.max_artifacts = max_artifacts
+        self.sites = OrderedDict()
+        self.lock = threading.Lock()
+
+    def token(self, artifact_id: str) -> str:
+        return hmac.new(self.secret, f"preview:{artifact_id}".encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def valid_token(self, artifact_id: str, token: str) -> bool:
+        return hmac.compare_digest(token or "", self.token(artifact_id))
+
+    def url(self, artifact_id: str) -> str:
+        """Where the artifact's site is served; whoever has it can view the site"""
+        return f"/preview/{artifact_id}/{self.token(artifact_id)}/"
+
+    def _load_site(self, artifact_id: str) -> Optional[Dict[str, PreviewFile]]:
+        with self.lock:
+            site = self.sites.get(artifact_id)
+            if site is not None:
+                self.sites.move_to_end(artifact_id)
+                return site
+
+        artifact = self.artifact_store.get(artifact_id)
+        if not artifact:
+            return None
+
+        files = {}
+        for f in artifact.get("code", {}).get("project_structure", []):
+            name = normalize_path(str(f.get("file", "")))
+            files.setdefault(name, PreviewFile(name, f.get("content") or ""))
+        site = files
+
+        with self.lock:
+            self.sites[artifact_id] = site
+            while len(self.sites) > self.max_artifacts:
+                self.sites.popitem(last=False)
+        return site
+
+    def get_file(self, artifact_id: str, token: str, path: str) -> Optional[PreviewFile]:
+        if not self.valid_token(artifact_id, token):
+            return None
+        files = self._load_site(artifact_id)
+        if files is None:
+            return None
+        return files.get(normalize_path(path))
+
+
+def build_response(preview_file: PreviewFile, request, response_class):
+    """Response with validators, far-future caching and gzip when the client accepts it"""
+    body = preview_file.body
+    etag = preview_file.etag
+    gzipped = preview_file.gzipped() if "gzip" in request.accept_encodings else None
+    # Each representation has its own strong validator
+    if gzipped is not None:
+        body = gzipped
+        etag += "-gzip"
+
+    headers = {
+        "Cache-Control": PREVIEW_CACHE_CONTROL,
+        "ETag": f'"{etag}"',
+        "Content-Security-Policy": PREVIEW_CSP,
+        "X-Content-Type-Options": "nosniff",
+        "Vary": "Accept-Encoding",
+    }
+    if gzipped is not None:
+        headers["Content-Encoding"] = "gzip"
+
+    if etag in request.if_none_match:
+        return response_class(status=304, headers=headers)
+
+    return response_class(body, content_type=preview_file.mimetype, headers=headers)
@@ -0,0 +1,161 @@
+"""
+Opt-in profiling of single live requests.
+
+An admin sends `X-Profile: cprofile` (deterministic, pstats output) or
+`X-Profile: sample` (stack sampling, folded output for flamegraph.pl /
+speedscope) — or `?__profile=...` — to one of PROFILED_ENDPOINTS. The
+profile is written to PROFILE_DIR, which keeps only the newest
+PROFILE_MAX_FILES files. Requests without the flag pay one header lookup.
+"""
+import cProfile
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+
+from flask import g, request
+
+import tracing
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "whiteboard2web-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+PROFILED_ENDPOINTS = {
+    "generate_code_endpoint",
+    "save_project",
+    "get_projects",
+    "load_project",
+    "list_projects",
+}
+
+PROFILE_EXTENSIONS = {"cprofile": ".prof", "sample": ".folded"}
+
+_PROFILE_NAME_RE = re.compile(r"^[A-Za-z0-9._-]+\.(prof|folded)$")
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and counts folded stacks"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _requested_mode() -> str:
+    mode = request.headers.get("X-Profile") or request.args.get("__profile") or ""
+    mode = mode.lower()
+    if mode in ("1", "true"):
+        mode = "cprofile"
+    return mode if mode in PROFILE_EXTENSIONS else ""
+
+
+def _prune():
+    files = list_profiles()
+    for stale in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, stale["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[Dict]:
+    """Stored profiles, newest first"""
+    try:
+        names = [n for n in os.listdir(PROFILE_DIR) if _PROFILE_NAME_RE.match(n)]
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            continue
+        profiles.append({
+            "name": name,
+            "kind": "cprofile" if name.endswith(".prof") else "sample",
+            "size": stat.st_size,
+            "created": stat.st_mtime,
+        })
+    profiles.sort(key=lambda p: p["created"], reverse=True)
+    return profiles
+
+
+def is_profile_name(name: str) -> bool:
+    return bool(_PROFILE_NAME_RE.match(name))
+
+
+def init_app(app, is_admin):
+    @app.before_request
+    def _start_profile():
+        if request.endpoint not in PROFILED_ENDPOINTS:
+            return
+        mode = _requested_mode()
+        if not mode or not is_admin():
+            return
+
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        g.profile = (mode, profiler, time.time())
+
+    @app.teardown_request
+    def _stop_profile(error=None):
+        active = g.pop("profile", None)
+        if active is None:
+            return
+
+        mode, profiler, started = active
+        if mode == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        request_id = tracing.current_request_id() or str(os.getpid())
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(started))}-{request.endpoint}-{request_id}{PROFILE_EXTENSIONS[mode]}"
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            if mode == "cprofile":
+                profiler.dump_stats(path)
+            else:
+                profiler.dump(path)
+            print(f"🔬 Profile written: {path}")
+            _prune()
+        except OSError as e:
+            print(f"⚠️ Failed to write profile: {e}")
@@ -0,0 +1,130 @@
+"""
+Full-text search over a user's projects.
+
+Each project document carries two derived fields next to its title:
+canvas_text, the text on its whiteboard (extracted from the fabric JSON
+when it is saved), and artifact_text, the explanation, layout type and
+features of the latest code generated for it (set when that artifact is
+stored). A MongoDB text index over the three, prefixed by user_id, answers
+searches from one user's index entries only, so latency follows the size
+of a user's projects rather than the collection. Results are ranked by
+text score, titles weighing most.
+
+The index uses no language (no stemming or stop words): boards are written
+in several languages and short labels such as "About" would otherwise be
+dropped. Projects saved before this change are indexed by
+
+    python project_search.py --backfill
+"""
+import argparse
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+
+MAX_INDEXED_CHARS = 4000
+SEARCH_PER_PAGE = 20
+SEARCH_MAX_PER_PAGE = 50
+TEXT_WEIGHTS = {"title": 10, "canvas_text": 3, "artifact_text": 1}
+TEXT_TYPES = ("text", "i-text", "textbox")
+INDEX_NAME = "project_text"
+
+
+def _texts(objects: Any) -> Iterator[str]:
+    for obj in objects or []:
+        if not isinstance(obj, dict):
+            continue
+        if str(obj.get("type", "")).lower() in TEXT_TYPES and obj.get("text"):
+            yield str(obj["text"])
+        # Grouped objects keep their own children
+        yield from _texts(obj.get("objects"))
+
+
+def canvas_text(design: Optional[Dict[str, Any]]) -> str:
+    """The distinct text on a fabric canvas, in drawing order, capped at MAX_INDEXED_CHARS"""
+    seen = dict.fromkeys(" ".join(t.split()) for t in _texts((design or {}).get("objects")))
+    return "\n".join(t for t in seen if t)[:MAX_INDEXED_CHARS]
+
+
+def artifact_text(code_data: Optional[Dict[str, Any]]) -> str:
+    code_data = code_data or {}
+    features = code_data.get("functional_features") or []
+    parts = [
+        str(code_data.get("explanation") or ""),
+        str(code_data.get("layout_type") or ""),
+        " ".join(str(f) for f in features if isinstance(f, (str, int, float))),
+    ]
+    return "\n".join(p for p in parts if p)[:MAX_INDEXED_CHARS]
+
+
+class ProjectSearch:
+    """Maintains the derived search fields of the projects collection and queries them"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [("user_id", 1), ("title", "text"), ("canvas_text", "text"), ("artifact_text", "text")],
+            weights=TEXT_WEIGHTS,
+            default_language="none",
+            name=INDEX_NAME,
+        )
+
+    def index_artifact(self, project_id: Optional[str], user_id: Optional[str], code_data: Dict[str, Any]):
+        """Make the project findable by what was generated for it"""
+        if not project_id or not user_id:
+            return
+        try:
+            oid = ObjectId(project_id)
+        except Exception:
+            return
+        self.collection.update_one({"_id": oid, "user_id": user_id},
+                                   {"$set": {"artifact_text": artifact_text(code_data)}})
+
+    def search(self, user_id: str, query: str, page: int = 1,
+               per_page: int = SEARCH_PER_PAGE) -> Tuple[List[Dict[str, Any]], bool]:
+        """(projects on this page, best first, whether more pages follow)"""
+        per_page = max(1, min(per_page, SEARCH_MAX_PER_PAGE))
+        page = max(1, page)
+        # One extra document tells whether there is a next page without counting every match
+        cursor = self.collection.find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            {"title": 1, "updated_at": 1, "thumbnail": 1, "score": {"$meta": "textScore"}},
+        ).sort([("score", {"$meta": "textScore"}), ("updated_at", -1)]).skip((page - 1) * per_page).limit(per_page + 1)
+        results = list(cursor)
+        return results[:per_page], len(results) > per_page
+
+    def backfill(self, artifacts=None, batch: int = 500) -> int:
+        """Fill canvas_text (and artifact_text from the latest artifact) for projects without it"""
+        updated = 0
+        for project in self.collection.find({"canvas_text": {"$exists": False}}, {"design": 1, "user_id": 1}).batch_size(batch):
+            fields = {"canvas_text": canvas_text(project.get("design"))}
+            if artifacts is not None:
+                latest = artifacts.find_one({"project_id": str(project["_id"]), "user_id": project.get("user_id")},
+                                            {"code": 1}, sort=[("created_at", -1)])
+                if latest:
+                    fields["artifact_text"] = artifact_text(latest.get("code"))
+            self.collection.update_one({"_id": project["_id"]}, {"$set": fields})
+            updated += 1
+        return updated
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", help="index projects saved before search existed")
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.print_help()
+        return 1
+
+    import mongo_pool
+    db = mongo_pool.create_client()["whiteboard2web"]
+    search = ProjectSearch(db["projects"])
+    search.ensure_indexes()
+    print(f"✅ Indexed {search.backfill(db['artifacts'])} projects")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Speculative pre-generation while the user is still at the whiteboard.
+
+Users usually click "Generate" right after they stop drawing. The
+whiteboard pings /api/generated/speculate once the board has been idle
+for a few seconds; the design is generated right away on a small pool of
+SPECULATION_WORKERS threads, and the result is kept for that user under a key
+of design hash, request and project. A newer ping with a different design
+cancels the pending job (or discards the result of one already running),
+so each user has at most one speculation. The explicit request then
+claims a finished result at once, or waits for the one in flight instead
+of starting over. A finished result is kept for SPECULATION_TTL seconds
+after it completes.
+
+A job already calling the upstream can't be stopped, so discarded work
+still costs tokens: each user may start a new speculation at most once
+per SPECULATION_MIN_INTERVAL seconds, and none start while the upstream
+is unhealthy (circuit not closed or recent failures), when every spare
+call should go to explicit requests.
+
+Results are stored as artifacts as soon as they finish, so with several
+workers a request landing on another process still finds them through
+the near-duplicate lookup (fingerprint.py) for logged-in users.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+import tracing
+
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "1") == "1"
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "2"))
+SPECULATION_MAX_PENDING = int(os.getenv("SPECULATION_MAX_PENDING", "8"))
+SPECULATION_TTL = int(os.getenv("SPECULATION_TTL", "600"))              # seconds a finished result is kept
+SPECULATION_MIN_INTERVAL = int(os.getenv("SPECULATION_MIN_INTERVAL", "20"))   # s between a user's new jobs
+SPECULATION_CLAIM_TIMEOUT = int(os.getenv("SPECULATION_CLAIM_TIMEOUT", "120"))
+SPECULATION_MAX_OWNERS = 1024
+
+
+class _Job:
+    __slots__ = ("key", "future", "cancelled", "finished")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.future: Optional[Future] = None
+        self.cancelled = threading.Event()
+        self.finished: Optional[float] = None
+
+    def start(self, future: Future):
+        self.future = future
+        future.add_done_callback(self._done)
+
+    def _done(self, _):
+        self.finished = time.time()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def expired(self) -> bool:
+        # A slow generation gets the full TTL once it is done
+        return self.finished is not None and time.time() - self.finished > SPECULATION_TTL
+
+
+class Speculator:
+    """At most one speculative generation per owner (user id or anonymous session key)"""
+
+    def __init__(self, workers: int = SPECULATION_WORKERS, upstream_healthy: Callable[[], bool] = lambda: True):
+        # Bounded by the small worker count, not by nice: threads these jobs start (the shared
+        # fan-out pool, the journal writer) would inherit a lowered priority for good
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculate")
+        self.upstream_healthy = upstream_healthy
+        self.lock = threading.Lock()
+        self.jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        # owner -> when their last job was scheduled
+        self.last_scheduled: "OrderedDict[str, float]" = OrderedDict()
+
+    def submit(self, owner: str, key: str, generate: Callable[[], Dict[str, Any]]) -> str:
+        """Start generating for owner unless the same key is already running or done"""
+        with self.lock:
+            current = self.jobs.get(owner)
+            if current is not None and current.key == key and not current.expired() and not current.future.cancelled():
+                self.jobs.move_to_end(owner)
+                return "ready" if current.future.done() else "running"
+            if current is not None:
+                current.cancel()
+                metrics.SPECULATIONS.labels(event="cancelled").inc()
+                del self.jobs[owner]
+
+            now = time.time()
+            if now - self.last_scheduled.get(owner, 0.0) < SPECULATION_MIN_INTERVAL:
+                metrics.SPECULATIONS.labels(event="throttled").inc()
+                return "throttled"
+            if not self.upstream_healthy():
+                metrics.SPECULATIONS.labels(event="upstream_unhealthy").inc()
+                return "busy"
+            pending = sum(1 for job in self.jobs.values() if not job.future.done())
+            if pending >= SPECULATION_MAX_PENDING:
+                metrics.SPECULATIONS.labels(event="busy").inc()
+                return "busy"
+
+            job = _Job(key)
+            job.start(self.pool.submit(self._run, job, generate))
+            self.jobs[owner] = job
+            self.last_scheduled[owner] = now
+            self.last_scheduled.move_to_end(owner)
+            while len(self.jobs) > SPECULATION_MAX_OWNERS:
+                _, evicted = self.jobs.popitem(last=False)
+                evicted.cancel()
+            while len(self.last_scheduled) > SPECULATION_MAX_OWNERS:
+                self.last_scheduled.popitem(last=False)
+            metrics.SPECULATIONS.labels(event="scheduled").inc()
+            return "scheduled"
+
+    def _run(self, job: _Job, generate: Callable[[], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if job.cancelled.is_set():
+            return None
+        with tracing.span("speculative_generation"):
+            result = generate()
+        metrics.SPECULATIONS.labels(event="discarded" if job.cancelled.is_set() else "completed").inc()
+        return result
+
+    def claim(self, owner: str, key: str) -> Optional[Dict[str, Any]]:
+        """The speculative result for key, waiting for it if still running; None on a miss"""
+        with self.lock:
+            job = self.jobs.pop(owner, None)
+        if job is None:
+            metrics.SPECULATIONS.labels(event="miss").inc()
+            return None
+        if job.key != key or job.expired():
+            # The design changed since the last ping: that work is of no use now
+            job.cancel()
+            metrics.SPECULATIONS.labels(event="miss").inc()
+            return None
+
+        event = "hit" if job.future.done() else "hit_wait"
+        try:
+            result = job.future.result(timeout=SPECULATION_CLAIM_TIMEOUT)
+        except (CancelledError, Exception) as e:
+            print(f"⚠️ Speculative generation unusable: {e!r}")
+            metrics.SPECULATIONS.labels(event="miss").inc()
+            return None
+        if result is None:
+            metrics.SPECULATIONS.labels(event="miss").inc()
+            return None
+        metrics.SPECULATIONS.labels(event=event).inc()
+        return result
@@ -1644,14 +1644,9 @@ if (saveProjectBtn) {
       output.innerHTML = '<div class="loading">🤖 Analyzing design and generating code...</div>';
       
       try {
-          const designAnalysis = extractDesignData();
+          // The server derives the design analysis from the canvas JSON
           const canvasData = canvas.toJSON();
-          
-          const combinedData = {
-              canvas_data: canvasData,
-              design_analysis: designAnalysis,
-              timestamp: new Date().toISOString()
-          };
+          const canvasSize = { width: canvas.getWidth(), height: canvas.getHeight() };
           
           const response = await fetch('http://localhost:5000/api/generated', {
               method: 'POST',
@@ -1661,9 +1656,11 @@ if (saveProjectBtn) {
               body: JSON.stringify({
                   design_data: {
                     canvas_data: canvasData,
-                    design_analysis: designAnalysis
+                    canvas_size: canvasSize
                   },
-                  user_prompt: prompt
+                  user_prompt: prompt,
+                  // Lets the server regenerate only what changed since this project's last generation
+                  project_id: currentProjectId
           })
         
         })
@@ -1746,9 +1743,9 @@ if (saveProjectBtn) {
         return;
       }
 
-      // Extract design + images
-      const designAnalysis = extractDesignData();
+      // Extract canvas + images (the server analyses the canvas JSON)
       const canvasData = canvas.toJSON();
+      const canvasSize = { width: canvas.getWidth(), height: canvas.getHeight() };
       const images = extractImagesFromCanvas(); // returns [{id, src}, ...]
 
       try {
@@ -1758,9 +1755,10 @@ if (saveProjectBtn) {
           body: JSON.stringify({
             design_data: {
               canvas_data: canvasData,
-              design_analysis: designAnalysis,
+              canvas_size: canvasSize,
               images: images
             },
+            project_id: currentProjectId,
             // you can tune this prompt as needed
             user_prompt: `
               Enhance the UI design drawn on the whiteboard with professional-level improvements.
@@ -1814,6 +1812,37 @@ if (saveProjectBtn) {
 
 
 
+  const GENERATE_PROMPT = "Convert this design into a modern, responsive website with proper HTML structure, CSS styling, and JavaScript interactivity.";
+
+  // Once the board has been idle for a moment, let the server start on what "Generate"
+  // would ask for; the click then usually finds the result ready
+  const SPECULATE_IDLE_MS = 3000;
+  let speculateTimer = null;
+
+  const scheduleSpeculation = () => {
+    clearTimeout(speculateTimer);
+    speculateTimer = setTimeout(() => {
+      if (canvas.getObjects().length === 0) return;
+      fetch('/api/generated/speculate', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          design_data: {
+            canvas_data: canvas.toJSON(),
+            canvas_size: { width: canvas.getWidth(), height: canvas.getHeight() },
+            images: extractImagesFromCanvas()
+          },
+          user_prompt: GENERATE_PROMPT,
+          project_id: currentProjectId
+        })
+      }).catch(() => {});   // best effort: the click still works without it
+    }, SPECULATE_IDLE_MS);
+  };
+
+  ['object:added', 'object:modified', 'object:removed', 'text:changed'].forEach(
+    (eventName) => canvas.on(eventName, scheduleSpeculation)
+  );
+
   document.getElementById('generate').addEventListener('click', async () => {
     const output = document.getElementById('aiOutput');
     
@@ -1825,13 +1854,14 @@ if (saveProjectBtn) {
     output.innerHTML = '<div class="loading">🤖 Converting your design to code...</div>';
     
     try {
-        const designAnalysis = extractDesignData();
         const canvasData = canvas.toJSON();
+        const canvasSize = { width: canvas.getWidth(), height: canvas.getHeight() };
         const images = extractImagesFromCanvas();
 
         console.log(`📊 Sending ${images.length} images to AI`);
         
-        const response = await fetch('http://localhost:5000/api/generated', {
+        // Same origin as the speculation ping, so the session (and its warm result) matches
+        const response = await fetch('/api/generated', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -1839,10 +1869,11 @@ if (saveProjectBtn) {
             body: JSON.stringify({
                 design_data: {
                     canvas_data: canvasData,
-                    design_analysis: designAnalysis,
+                    canvas_size: canvasSize,
                     images: images
                 },
-                user_prompt: "Convert this design into a modern, responsive website with proper HTML structure, CSS styling, and JavaScript interactivity."
+                user_prompt: GENERATE_PROMPT,
+                project_id: currentProjectId
             })
         });
         
@@ -2079,26 +2110,42 @@ window.viewGeneratedCode = function() {
   window.open('/code-display', '_blank');
 };
 
+// v2 responses store main_html/main_css/main_js as file names that point into
+// project_structure; resolve them back to contents for code that expects v1.
+function expandMainFileRefs(code) {
+  if (!code || code.format_version !== 2) return code;
+
+  const contents = {};
+  (code.project_structure || []).forEach(f => { contents[f.file] = f.content || ''; });
+
+  const expanded = Object.assign({}, code, { format_version: 1 });
+  ['main_html', 'main_css', 'main_js'].forEach(key => {
+    if (code[key]) expanded[key] = contents[code[key]] || '';
+  });
+  return expanded;
+}
+
 window.previewLiveWebsite = function() {
   if (!window.lastGeneratedCode) {
     alert('No code generated yet');
     return;
   }
   
+  const code = expandMainFileRefs(window.lastGeneratedCode);
   const previewWindow = window.open('', '_blank');
   const htmlContent =
-      window.lastGeneratedCode.html ||
-      window.lastGeneratedCode.main_html ||
+      code.html ||
+      code.main_html ||
       '<h1>No HTML generated</h1>';
 
   const cssContent =
-      window.lastGeneratedCode.css ||
-      window.lastGeneratedCode.main_css ||
+      code.css ||
+      code.main_css ||
       '/* No CSS */';
 
   const jsContent =
-      window.lastGeneratedCode.javascript ||
-      window.lastGeneratedCode.main_js ||
+      code.javascript ||
+      code.main_js ||
       '// No JS';
 
   
@@ -2183,17 +2230,20 @@ window.analyzeDesign = function() {
 
 window.downloadHTML = function() {
   if (!window.lastGeneratedCode) return;
-  downloadFile('index.html', window.lastGeneratedCode.html || '<!-- No HTML -->');
+  const code = expandMainFileRefs(window.lastGeneratedCode);
+  downloadFile('index.html', code.html || code.main_html || '<!-- No HTML -->');
 };
 
 window.downloadCSS = function() {
   if (!window.lastGeneratedCode) return;
-  downloadFile('styles.css', window.lastGeneratedCode.css || '/* No CSS */');
+  const code = expandMainFileRefs(window.lastGeneratedCode);
+  downloadFile('styles.css', code.css || code.main_css || '/* No CSS */');
 };
 
 window.downloadJS = function() {
   if (!window.lastGeneratedCode) return;
-  downloadFile('script.js', window.lastGeneratedCode.javascript || '// No JS');
+  const code = expandMainFileRefs(window.lastGeneratedCode);
+  downloadFile('script.js', code.javascript || code.main_js || '// No JS');
 };
 
 window.downloadAllFiles = function() {
@@ -0,0 +1,187 @@
+"""
+Synthetic whiteboard designs for benchmarks and load tests.
+
+make_design_analysis() mirrors the shape produced by extractDesignData()
+in static/script.js, so the server-side code sees realistic input at any
+size from a sketch to a 10,000-element board.
+"""
+import base64
+import json
+import random
+from typing import Any, Dict, List
+
+WORDS = [
+    "Home", "About", "Services", "Contact", "Login", "Sign in", "Search", "Email",
+    "Pricing", "Features", "Get started", "Learn more", "Subscribe", "Products",
+    "Card title", "Navigation", "Submit", "Welcome", "Our team", "Gallery",
+]
+FONTS = ["Arial", "Inter", "Roboto", "Georgia", "Verdana"]
+COLORS = ["#4361ee", "#3a0ca3", "#f72585", "#4cc9f0", "#ffffff", "#212529", "#f8f9fa", "#10b981"]
+SHAPES = ["rect", "circle", "triangle"]
+
+
+def _position(rng: random.Random, width: int, height: int) -> Dict[str, int]:
+    w = rng.randint(40, 400)
+    h = rng.randint(20, 200)
+    return {
+        "left": rng.randint(0, max(0, width - w)),
+        "top": rng.randint(0, max(0, height - h)),
+        "width": w,
+        "height": h,
+    }
+
+
+def make_design_analysis(n_elements: int, seed: int = 0) -> Dict[str, Any]:
+    """A design_analysis dict with n_elements objects spread over a tall canvas"""
+    rng = random.Random(seed)
+    width = 1400
+    height = max(900, n_elements * 12)
+
+    elements = {"text": [], "shapes": [], "images": [], "buttons": [], "containers": []}
+    colors, fonts = set(), set()
+    rows: List[List[Dict[str, Any]]] = []
+    typography = {}
+
+    for _ in range(n_elements):
+        kind = rng.random()
+        position = _position(rng, width, height)
+
+        if kind < 0.45:
+            font_size = rng.choice([14, 16, 18, 22, 28, 36, 48])
+            element = {
+                "type": rng.choice(["text", "i-text"]),
+                "position": position,
+                "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))),
+                "styles": {
+                    "fontSize": font_size,
+                    "fontFamily": rng.choice(FONTS),
+                    "fontWeight": rng.choice(["normal", "bold"]),
+                    "fill": rng.choice(COLORS),
+                    "textAlign": rng.choice(["left", "center"]),
+                },
+            }
+            elements["text"].append(element)
+            fonts.add(element["styles"]["fontFamily"])
+            level = "h1" if font_size > 32 else "h2" if font_size > 24 else "h3" if font_size > 18 else "body"
+            typography[level] = font_size
+        elif kind < 0.9:
+            element = {
+                "type": rng.choice(SHAPES),
+                "position": position,
+                "styles": {
+                    "fill": rng.choice(COLORS),
+                    "stroke": rng.choice(COLORS),
+                    "strokeWidth": 1,
+                    "borderRadius": rng.choice([0, 4, 8]),
+                },
+            }
+            elements["shapes"].append(element)
+            if rng.random() < 0.3:
+                elements["buttons"].append(element)
+            if rng.random() < 0.2:
+                elements["containers"].append(element)
+        else:
+            element = {"type": "image", "position": position, "styles": {"opacity": 1}}
+            elements["images"].append(element)
+
+        colors.add(element["styles"].get("fill", "#000000"))
+
+    # Same 50px row bucketing analyzeLayout() does in the browser
+    everything = sorted(
+        (e for group in ("text", "shapes", "images") for e in elements[group]),
+        key=lambda e: e["position"]["top"],
+    )
+    last_top = None
+    for e in everything:
+        entry = {"type": e["type"], "left": e["position"]["left"], "width": e["position"]["width"]}
+        if last_top is None or abs(e["position"]["top"] - last_top) >= 50:
+            rows.append([])
+        rows[-1].append(entry)
+        last_top = e["position"]["top"]
+
+    return {
+        "canvas": {"width": width, "height": height, "backgroundColor": "#ffffff"},
+        "elements": elements,
+        "layout": {"rows": rows, "spacing": {}, "alignment": {}},
+        "styles": {"colors": sorted(colors), "fonts": sorted(fonts), "spacing": {}, "typography": typography},
+    }
+
+
+def make_fabric_canvas(n_elements: int, seed: int = 0) -> Dict[str, Any]:
+    """canvas.toJSON() output with n_elements objects; some shapes carry a label on top"""
+    rng = random.Random(seed)
+    width = 1400
+    height = max(900, n_elements * 12)
+    objects = []
+
+    while len(objects) < n_elements:
+        kind = rng.random()
+        position = _position(rng, width, height)
+        base = {"left": position["left"], "top": position["top"], "scaleX": 1, "scaleY": 1, "angle": 0,
+                "originX": "left", "originY": "top", "opacity": 1}
+
+        if kind < 0.45:
+            objects.append(dict(base, type=rng.choice(["text", "i-text"]),
+                                text=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))),
+                                width=position["width"], height=30, fontSize=rng.choice([14, 16, 18, 22, 28, 36, 48]),
+                                fontFamily=rng.choice(FONTS), fontWeight=rng.choice(["normal", "bold"]),
+                                fill=rng.choice(COLORS), textAlign=rng.choice(["left", "center"])))
+        elif kind < 0.9:
+            shape = dict(base, type=rng.choice(SHAPES), width=position["width"], height=position["height"],
+                         fill=rng.choice(COLORS), stroke=rng.choice(COLORS), strokeWidth=1, rx=rng.choice([0, 4, 8]))
+            objects.append(shape)
+            if rng.random() < 0.3 and len(objects) < n_elements:
+                # Button-like: a short label inside the shape
+                objects.append(dict(base, type="text", text=rng.choice(WORDS), left=shape["left"] + 4,
+                                    top=shape["top"] + 4, width=max(1, shape["width"] - 10), height=14,
+                                    fontSize=14, fontFamily=rng.choice(FONTS), fill="#ffffff"))
+        else:
+            objects.append(dict(base, type="image", width=position["width"], height=position["height"]))
+
+    return {"version": "5.3.0", "objects": objects, "background": "#ffffff"}
+
+
+def make_images(count: int, size_bytes: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Data-URL images like extractImagesFromCanvas() sends"""
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        raw = rng.randbytes(size_bytes * 3 // 4)
+        images.append({
+            "id": f"img-{i}",
+            "src": "data:image/png;base64," + base64.b64encode(raw).decode("ascii"),
+            "width": 400,
+            "height": 300,
+            "type": "image",
+        })
+    return images
+
+
+def make_design_data(n_elements: int, n_images: int = 0, image_bytes: int = 50000, seed: int = 0) -> Dict[str, Any]:
+    return {
+        "canvas_data": {},
+        "design_analysis": make_design_analysis(n_elements, seed),
+        "images": make_images(n_images, image_bytes, seed),
+    }
+
+
+def make_ai_content(n_files: int, file_bytes: int = 4000, fenced: bool = True, seed: int = 0) -> str:
+    """A model reply carrying n_files generated files, optionally in a ```json fence"""
+    rng = random.Random(seed)
+    files = []
+    for i in range(n_files):
+        name = "index.html" if i == 0 else "styles.css" if i == 1 else "script.js" if i == 2 else f"page{i}.html"
+        body = "".join(rng.choice(WORDS) + "\n" for _ in range(file_bytes // 8))
+        files.append({"file": name, "content": body})
+    payload = json.dumps({
+        "project_structure": files,
+        "explanation": "Synthetic site",
+        "layout_type": "landing",
+        "functional_features": ["forms", "buttons"],
+    }, indent=2)
+    return f"```json\n{payload}\n```" if fenced else payload
+
+
+def make_unparseable_ai_content(n_files: int, file_bytes: int = 4000, seed: int = 0) -> str:
+    """Reply with prose around the JSON, which forces the regex recovery path"""
+    return "Sure! Here is your website:\n" + make_ai_content(n_files, file_bytes, fenced=False, seed=seed) + "\nLet me know if you need changes."
@@ -0,0 +1,609 @@
+"""
+Deterministic, template-based generation for simple designs.
+
+Many boards are a navbar, a hero, a form, a card grid and a footer. For
+those, the layout tree (layout.py) and the interactive flags
+(interactive_rules.py) are enough to assemble a complete, working site
+from parameterized components in milliseconds. Every section of the
+board is classified; the confidence is the share of sections a component
+recognised, discounted by elements no template renders, so anything
+unusual (or large) escalates to the model.
+"""
+import html
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import interactive_rules
+import layout
+
+# Component weight in the confidence score; unrecognised sections count 0
+COMPONENT_WEIGHTS = {
+    "navbar": 1.0,
+    "hero": 1.0,
+    "form": 1.0,
+    "cards": 1.0,
+    "footer": 1.0,
+    "gallery": 0.9,
+    "content": 0.9,
+}
+COMPLEX_BOARD_NODES = 80     # beyond this many nodes the model usually does better
+COMPLEX_BOARD_PENALTY = 0.8
+
+_HEADINGS = ("h1", "h2", "h3")
+
+
+def _esc(text: str) -> str:
+    return html.escape(text or "", quote=True)
+
+
+def _slug(text: str, fallback: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (text or "").lower()).strip("-")
+    return slug or fallback
+
+
+def _leaves(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Depth-first leaves (containers expanded) in reading order"""
+    out = []
+    for node in nodes:
+        if node.get("type") == "container":
+            out.append(node)
+            for row in node.get("rows", []):
+                for col in row["cols"]:
+                    out.extend(_leaves(col))
+            out.extend(_leaves(node.get("items", [])))
+        else:
+            out.append(node)
+    return out
+
+
+def _section_nodes(section: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [node for row in section["rows"] for col in row["cols"] for node in col]
+
+
+def _is_input(node: Dict[str, Any]) -> bool:
+    # Wide, short, unlabelled boxes are how people sketch text fields
+    return node.get("type") == "shape" and node.get("w", 0) >= 120 and node.get("h", 0) <= 60 \
+        and node.get("w", 0) >= 3 * max(1, node.get("h", 0))
+
+
+class _Section:
+    def __init__(self, section: Dict[str, Any], index: int, total: int):
+        self.index = index
+        self.total = total
+        self.height = section.get("height", 0)
+        self.rows = section["rows"]
+        self.nodes = _section_nodes(section)
+        self.leaves = _leaves(self.nodes)
+        self.headings = [n for n in self.leaves if n["type"] in _HEADINGS]
+        self.texts = [n for n in self.leaves if n["type"] == "text"]
+        self.buttons = [n for n in self.leaves if n["type"] == "button"]
+        self.images = [n for n in self.leaves if n["type"] == "image"]
+        self.inputs = [n for n in self.leaves if _is_input(n)]
+        self.grid_cards = [
+            node for row in self._all_rows() if row.get("layout") == "grid"
+            for col in row["cols"] for node in col if node.get("type") == "container"
+        ]
+        self.words = " ".join(n.get("text", "") for n in self.leaves)
+        # Bare shapes that are neither fields nor containers have no template equivalent
+        self.stray = [n for n in self.leaves if n["type"] == "shape" and not _is_input(n)]
+
+    def _all_rows(self):
+        pending = list(self.rows)
+        while pending:
+            row = pending.pop()
+            yield row
+            for col in row["cols"]:
+                for node in col:
+                    pending.extend(node.get("rows", []))
+
+    def classify(self) -> str:
+        first, last = self.index == 0, self.index == self.total - 1
+        if first and self.height <= 120 and len(self.texts) + len(self.buttons) + len(self.headings) >= 2 \
+                and not any(n["type"] == "h1" for n in self.headings) and not self.inputs:
+            return "navbar"
+        if self.inputs or (self._keyword("has_login", "has_contact") and self.buttons and not self.grid_cards):
+            return "form"
+        if len(self.grid_cards) >= 2:
+            return "cards"
+        if any(n["type"] == "h1" for n in self.headings) or (self.index <= 1 and self.headings and self.buttons):
+            return "hero"
+        if len(self.images) >= 2 and len(self.texts) + len(self.headings) <= len(self.images):
+            return "gallery"
+        if last and not self.headings and not self.images and len(self.texts) <= 6 and self.height <= 200:
+            return "footer"
+        if (self.texts or self.headings) and not self.images and len(self.leaves) <= 12:
+            return "content"
+        return "unknown"
+
+    def coverage(self) -> float:
+        """Share of the section's elements the templates can render"""
+        return 1.0 - len(self.stray) / len(self.leaves) if self.leaves else 0.0
+
+    def _keyword(self, *flags: str) -> bool:
+        matcher = interactive_rules.compile_packs(interactive_rules.configured_packs())
+        found = {rule for rule, _ in matcher.scan(interactive_rules.normalize(self.words))}
+        return any(f in found for f in flags)
+
+
+# --------------------------------------
+# Components
+# --------------------------------------
+def _navbar(section: _Section, ctx: Dict[str, Any]) -> str:
+    labels = [n for n in section.headings + section.texts]
+    brand = labels[0]["text"] if labels else "Brand"
+    links = [n["text"] for n in labels[1:]]
+    ctx["nav_links"] = links
+    items = "".join(f'<li><a href="#{_slug(link, "section")}">{_esc(link)}</a></li>' for link in links)
+    cta = "".join(f'<button class="btn btn-primary" data-action="cta">{_esc(b.get("text"))}</button>' for b in section.buttons)
+    return f"""
+    <header class="navbar">
+        <a class="brand" href="#">{_esc(brand)}</a>
+        <button class="nav-toggle" aria-label="Toggle navigation" aria-expanded="false">&#9776;</button>
+        <nav class="nav-menu">
+            <ul class="nav-links">{items}</ul>
+            {cta}
+        </nav>
+    </header>"""
+
+
+def _section_id(section: _Section, ctx: Dict[str, Any], fallback: str) -> str:
+    # Navbar links point at sections in order
+    links = ctx.get("nav_links", [])
+    position = ctx.setdefault("linked", 0)
+    if position < len(links):
+        ctx["linked"] += 1
+        return _slug(links[position], fallback)
+    return fallback
+
+
+def _hero(section: _Section, ctx: Dict[str, Any]) -> str:
+    title = section.headings[0]["text"] if section.headings else "Welcome"
+    subtitle = " ".join(n["text"] for n in section.headings[1:] + section.texts)
+    buttons = "".join(
+        f'<button class="btn {"btn-primary" if i == 0 else "btn-outline"}" data-action="cta">{_esc(b.get("text"))}</button>'
+        for i, b in enumerate(section.buttons)
+    )
+    return f"""
+    <section class="hero" id="{_section_id(section, ctx, f"section-{section.index}")}">
+        <h1>{_esc(title)}</h1>
+        {f"<p class='lead'>{_esc(subtitle)}</p>" if subtitle else ""}
+        <div class="hero-actions">{buttons}</div>
+    </section>"""
+
+
+def _field_type(label: str) -> str:
+    # Word boundaries, so "Hotel" or "Tell us about you" are not phone numbers
+    lowered = label.lower()
+    if re.search(r"\b(password|contraseña|passwort)", lowered):
+        return "password"
+    if re.search(r"\b(e-?mail|mail|correo)\b", lowered):
+        return "email"
+    if re.search(r"\b(message|mensaje|nachricht)", lowered):
+        return "textarea"
+    if re.search(r"\btel\b|phone|tel[eé]fono", lowered):
+        return "tel"
+    return "text"
+
+
+def _form(section: _Section, ctx: Dict[str, Any]) -> str:
+    login = section._keyword("has_login")
+    kind = "login" if login else "contact"
+    title = section.headings[0]["text"] if section.headings else ("Sign in" if login else "Contact us")
+    labels = [n["text"] for n in section.texts if n["text"]]
+    if len(labels) < max(1, len(section.inputs)):
+        labels = ["Email", "Password"] if login else ["Name", "Email", "Message"]
+
+    fields = []
+    for i, label in enumerate(labels[:max(len(section.inputs), 2)]):
+        field_type = _field_type(label)
+        name = _slug(label, f"field-{i}")
+        control = (
+            f'<textarea id="{name}" name="{name}" rows="4" required></textarea>' if field_type == "textarea"
+            else f'<input id="{name}" name="{name}" type="{field_type}" required>'
+        )
+        fields.append(f'<div class="form-field"><label for="{name}">{_esc(label)}</label>{control}'
+                      f'<small class="field-error" aria-live="polite"></small></div>')
+    submit = section.buttons[0].get("text") if section.buttons else ("Sign in" if login else "Send")
+    return f"""
+    <section class="form-section" id="{_section_id(section, ctx, kind)}">
+        <form class="site-form" data-form="{kind}" novalidate>
+            <h2>{_esc(title)}</h2>
+            {"".join(fields)}
+            <button type="submit" class="btn btn-primary">{_esc(submit)}</button>
+        </form>
+    </section>"""
+
+
+def _cards(section: _Section, ctx: Dict[str, Any]) -> str:
+    in_cards = {id(leaf) for card in section.grid_cards for leaf in _leaves([card])}
+    headings = [n["text"] for n in section.headings if id(n) not in in_cards]
+    heading = headings[0] if headings else ""
+    cards = []
+    for card in section.grid_cards:
+        leaves = [n for n in _leaves([card]) if n is not card]
+        texts = [n["text"] for n in leaves if n.get("text") and n["type"] != "button"]
+        buttons = [n["text"] for n in leaves if n["type"] == "button"]
+        title = texts[0] if texts else "Card"
+        body = " ".join(texts[1:])
+        action = buttons[0] if buttons else "Learn more"
+        cards.append(f"""
+            <article class="card" tabindex="0">
+                <h3>{_esc(title)}</h3>
+                {f"<p>{_esc(body)}</p>" if body else ""}
+                <button class="btn btn-outline" data-action="card">{_esc(action)}</button>
+            </article>""")
+    columns = max((row.get("columns", 0) for row in section._all_rows()), default=3) or 3
+    return f"""
+    <section class="cards-section" id="{_section_id(section, ctx, f"section-{section.index}")}">
+        {f"<h2>{_esc(heading)}</h2>" if heading else ""}
+        <div class="card-grid" style="--columns: {columns}">{"".join(cards)}</div>
+    </section>"""
+
+
+def _gallery(section: _Section, ctx: Dict[str, Any]) -> str:
+    items = "".join(
+        f'<figure class="gallery-item" tabindex="0" data-index="{i}"><div class="placeholder">Image {i + 1}</div></figure>'
+        for i in range(len(section.images))
+    )
+    heading = section.headings[0]["text"] if section.headings else ""
+    return f"""
+    <section class="gallery-section" id="{_section_id(section, ctx, f"section-{section.index}")}">
+        {f"<h2>{_esc(heading)}</h2>" if heading else ""}
+        <div class="gallery">{items}</div>
+    </section>"""
+
+
+def _content(section: _Section, ctx: Dict[str, Any]) -> str:
+    parts = []
+    for node in section.leaves:
+        if node["type"] in _HEADINGS:
+            level = "h2" if node["type"] == "h1" else node["type"]
+            parts.append(f"<{level}>{_esc(node['text'])}</{level}>")
+        elif node["type"] == "text":
+            parts.append(f"<p>{_esc(node['text'])}</p>")
+        elif node["type"] == "button":
+            parts.append(f'<button class="btn btn-primary" data-action="cta">{_esc(node.get("text"))}</button>')
+    return f"""
+    <section class="content-section" id="{_section_id(section, ctx, f"section-{section.index}")}">
+        {"".join(parts)}
+    </section>"""
+
+
+def _footer(section: _Section, ctx: Dict[str, Any]) -> str:
+    texts = " · ".join(_esc(n["text"]) for n in section.texts)
+    return f"""
+    <footer class="site-footer">
+        <p>{texts}</p>
+    </footer>"""
+
+
+COMPONENTS = {
+    "navbar": _navbar,
+    "hero": _hero,
+    "form": _form,
+    "cards": _cards,
+    "gallery": _gallery,
+    "content": _content,
+    "footer": _footer,
+}
+
+
+# --------------------------------------
+# Styles and behaviour shared by all components
+# --------------------------------------
+def _palette(design_analysis: Dict[str, Any]) -> Dict[str, str]:
+    styles = design_analysis.get("styles", {})
+    vivid = [c for c in styles.get("colors", []) if isinstance(c, str) and c.startswith("#")
+             and c.lower() not in ("#fff", "#ffffff", "#000", "#000000", "#eee", "#eeeeee")]
+    fonts = styles.get("fonts") or ["Inter"]
+    background = design_analysis.get("canvas", {}).get("backgroundColor")
+    return {
+        "primary": vivid[0] if vivid else "#4361ee",
+        "accent": vivid[1] if len(vivid) > 1 else "#f72585",
+        "background": background if isinstance(background, str) and background else "#ffffff",
+        "font": fonts[0],
+    }
+
+
+def _css(palette: Dict[str, str]) -> str:
+    return f""":root {{
+    --primary: {palette["primary"]};
+    --accent: {palette["accent"]};
+    --bg: {palette["background"]};
+    --text: #1f2933;
+    --muted: #6b7280;
+    --radius: 10px;
+}}
+
+* {{ box-sizing: border-box; margin: 0; padding: 0; }}
+
+body {{
+    font-family: '{palette["font"]}', system-ui, -apple-system, 'Segoe UI', sans-serif;
+    background: var(--bg);
+    color: var(--text);
+    line-height: 1.6;
+}}
+
+section {{ padding: 64px 24px; max-width: 1200px; margin: 0 auto; }}
+h1 {{ font-size: clamp(2rem, 5vw, 3.5rem); line-height: 1.15; margin-bottom: 16px; }}
+h2 {{ font-size: clamp(1.5rem, 3vw, 2.25rem); margin-bottom: 16px; }}
+h3 {{ font-size: 1.25rem; margin-bottom: 8px; }}
+p {{ margin-bottom: 12px; }}
+
+.btn {{
+    display: inline-block;
+    padding: 12px 24px;
+    border-radius: var(--radius);
+    border: 2px solid var(--primary);
+    font: inherit;
+    font-weight: 600;
+    cursor: pointer;
+    transition: transform 0.15s ease, box-shadow 0.15s ease, background 0.15s ease;
+}}
+.btn:hover {{ transform: translateY(-2px); box-shadow: 0 6px 18px rgba(0, 0, 0, 0.12); }}
+.btn:focus-visible, a:focus-visible, .card:focus-visible {{ outline: 3px solid var(--accent); outline-offset: 2px; }}
+.btn-primary {{ background: var(--primary); color: #fff; }}
+.btn-outline {{ background: transparent; color: var(--primary); }}
+.btn.is-loading {{ opacity: 0.7; pointer-events: none; }}
+
+.navbar {{
+    position: sticky; top: 0; z-index: 10;
+    display: flex; align-items: center; justify-content: space-between;
+    padding: 16px 24px; background: var(--bg);
+    box-shadow: 0 1px 8px rgba(0, 0, 0, 0.08);
+}}
+.brand {{ font-weight: 800; font-size: 1.35rem; color: var(--primary); text-decoration: none; }}
+.nav-menu {{ display: flex; align-items: center; gap: 24px; }}
+.nav-links {{ display: flex; gap: 24px; list-style: none; }}
+.nav-links a {{ color: var(--text); text-decoration: none; font-weight: 500; }}
+.nav-links a:hover {{ color: var(--primary); }}
+.nav-toggle {{ display: none; background: none; border: none; font-size: 1.6rem; cursor: pointer; }}
+
+.hero {{ text-align: center; padding: 96px 24px; }}
+.hero .lead {{ font-size: 1.2rem; color: var(--muted); max-width: 640px; margin: 0 auto 24px; }}
+.hero-actions {{ display: flex; gap: 12px; justify-content: center; flex-wrap: wrap; }}
+
+.card-grid {{ display: grid; grid-template-columns: repeat(var(--columns, 3), 1fr); gap: 24px; }}
+.card {{
+    padding: 24px; border-radius: var(--radius); background: #fff;
+    box-shadow: 0 4px 16px rgba(0, 0, 0, 0.08);
+    transition: transform 0.2s ease, box-shadow 0.2s ease;
+}}
+.card:hover {{ transform: translateY(-4px); box-shadow: 0 10px 28px rgba(0, 0, 0, 0.12); }}
+
+.site-form {{
+    max-width: 480px; margin: 0 auto; padding: 32px;
+    border-radius: var(--radius); background: #fff; box-shadow: 0 4px 16px rgba(0, 0, 0, 0.08);
+}}
+.form-field {{ display: flex; flex-direction: column; margin-bottom: 16px; }}
+.form-field label {{ font-weight: 600; margin-bottom: 6px; }}
+.form-field input, .form-field textarea {{
+    padding: 12px; border: 1px solid #d1d5db; border-radius: 8px; font: inherit;
+}}
+.form-field.invalid input, .form-field.invalid textarea {{ border-color: #dc2626; }}
+.field-error {{ color: #dc2626; min-height: 1em; }}
+
+.gallery {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 16px; }}
+.gallery-item {{ cursor: zoom-in; }}
+.placeholder {{
+    aspect-ratio: 4 / 3; border-radius: var(--radius);
+    display: flex; align-items: center; justify-content: center; color: #fff;
+    background: linear-gradient(135deg, var(--primary), var(--accent));
+}}
+.lightbox {{
+    position: fixed; inset: 0; background: rgba(0, 0, 0, 0.8);
+    display: flex; align-items: center; justify-content: center; z-index: 50;
+}}
+.lightbox .placeholder {{ width: min(80vw, 900px); }}
+
+.site-footer {{ text-align: center; padding: 32px 24px; color: var(--muted); border-top: 1px solid #e5e7eb; }}
+
+.toast {{
+    position: fixed; bottom: 24px; right: 24px; padding: 14px 20px; border-radius: var(--radius);
+    background: var(--text); color: #fff; opacity: 0; transform: translateY(12px);
+    transition: opacity 0.25s ease, transform 0.25s ease; z-index: 60;
+}}
+.toast.show {{ opacity: 1; transform: none; }}
+
+@media (max-width: 768px) {{
+    .nav-toggle {{ display: block; }}
+    .nav-menu {{
+        display: none; position: absolute; top: 100%; left: 0; right: 0;
+        flex-direction: column; padding: 16px; background: var(--bg);
+        box-shadow: 0 8px 16px rgba(0, 0, 0, 0.08);
+    }}
+    .nav-menu.open {{ display: flex; }}
+    .nav-links {{ flex-direction: column; align-items: center; }}
+    .card-grid {{ grid-template-columns: 1fr; }}
+}}
+"""
+
+
+_JS = """document.addEventListener('DOMContentLoaded', () => {
+    console.log('✅ Site ready');
+
+    const toast = (message) => {
+        const el = document.createElement('div');
+        el.className = 'toast';
+        el.setAttribute('role', 'status');
+        el.textContent = message;
+        document.body.appendChild(el);
+        requestAnimationFrame(() => el.classList.add('show'));
+        setTimeout(() => {
+            el.classList.remove('show');
+            setTimeout(() => el.remove(), 300);
+        }, 2500);
+    };
+
+    // Mobile navigation
+    const toggle = document.querySelector('.nav-toggle');
+    const menu = document.querySelector('.nav-menu');
+    if (toggle && menu) {
+        toggle.addEventListener('click', () => {
+            const open = menu.classList.toggle('open');
+            toggle.setAttribute('aria-expanded', String(open));
+        });
+    }
+
+    // Smooth scrolling for in-page links
+    document.querySelectorAll('a[href^="#"]').forEach(link => {
+        link.addEventListener('click', (event) => {
+            const target = document.querySelector(link.getAttribute('href'));
+            if (target) {
+                event.preventDefault();
+                target.scrollIntoView({ behavior: 'smooth' });
+                if (menu) menu.classList.remove('open');
+            }
+        });
+    });
+
+    // Buttons
+    document.querySelectorAll('[data-action]').forEach(button => {
+        button.addEventListener('click', () => {
+            console.log('🖱️ Button clicked:', button.textContent.trim());
+            const form = document.querySelector('.site-form');
+            if (button.dataset.action === 'cta' && form) {
+                form.scrollIntoView({ behavior: 'smooth' });
+            } else {
+                toast(`${button.textContent.trim()} clicked`);
+            }
+        });
+    });
+
+    // Cards open on Enter as well as click
+    document.querySelectorAll('.card').forEach(card => {
+        card.addEventListener('keydown', (event) => {
+            if (event.key === 'Enter') card.querySelector('button')?.click();
+        });
+    });
+
+    // Forms: validation and mock submission
+    const validate = (field) => {
+        const input = field.querySelector('input, textarea');
+        const error = field.querySelector('.field-error');
+        let message = '';
+        if (!input.value.trim()) {
+            message = 'This field is required';
+        } else if (input.type === 'email' && !/^[^\\s@]+@[^\\s@]+\\.[^\\s@]+$/.test(input.value)) {
+            message = 'Please enter a valid email address';
+        } else if (input.type === 'password' && input.value.length < 6) {
+            message = 'Password must be at least 6 characters';
+        }
+        field.classList.toggle('invalid', Boolean(message));
+        error.textContent = message;
+        return !message;
+    };
+
+    document.querySelectorAll('.site-form').forEach(form => {
+        const fields = [...form.querySelectorAll('.form-field')];
+        fields.forEach(field => field.querySelector('input, textarea')
+            .addEventListener('input', () => validate(field)));
+
+        form.addEventListener('submit', (event) => {
+            event.preventDefault();
+            if (!fields.map(validate).every(Boolean)) return;
+
+            const data = Object.fromEntries(new FormData(form).entries());
+            const submit = form.querySelector('[type="submit"]');
+            submit.classList.add('is-loading');
+            console.log(`📨 ${form.dataset.form} form submitted:`, data);
+            setTimeout(() => {
+                submit.classList.remove('is-loading');
+                if (form.dataset.form === 'login') {
+                    localStorage.setItem('user', JSON.stringify({ email: data.email || Object.values(data)[0] }));
+                    toast('Signed in successfully');
+                } else {
+                    toast('Thanks! Your message has been sent.');
+                }
+                form.reset();
+            }, 600);
+        });
+    });
+
+    // Gallery lightbox
+    document.querySelectorAll('.gallery-item').forEach(item => {
+        const open = () => {
+            const box = document.createElement('div');
+            box.className = 'lightbox';
+            box.appendChild(item.querySelector('.placeholder').cloneNode(true));
+            box.addEventListener('click', () => box.remove());
+            document.addEventListener('keydown', function close(event) {
+                if (event.key === 'Escape') {
+                    box.remove();
+                    document.removeEventListener('keydown', close);
+                }
+            });
+            document.body.appendChild(box);
+        };
+        item.addEventListener('click', open);
+        item.addEventListener('keydown', (event) => { if (event.key === 'Enter') open(); });
+    });
+});
+"""
+
+
+def _count_nodes(tree: Dict[str, Any]) -> int:
+    return sum(len(_leaves(_section_nodes(section))) for section in tree.get("sections", []))
+
+
+def plan(design_analysis: Dict[str, Any]) -> Tuple[List[Tuple[str, _Section]], float]:
+    """Classify each section; returns ([(component, section)], confidence)"""
+    tree = layout.build_layout_tree(design_analysis)
+    sections = tree.get("sections", [])
+    if not sections:
+        return [], 0.0
+
+    wrapped = [_Section(s, i, len(sections)) for i, s in enumerate(sections)]
+    planned = [(s.classify(), s) for s in wrapped]
+    confidence = sum(COMPONENT_WEIGHTS.get(kind, 0.0) * s.coverage() for kind, s in planned) / len(planned)
+    if _count_nodes(tree) > COMPLEX_BOARD_NODES:
+        confidence *= COMPLEX_BOARD_PENALTY
+    return planned, round(confidence, 3)
+
+
+def generate(design_analysis: Dict[str, Any], title: str = "My Website") -> Tuple[Optional[Dict[str, Any]], float]:
+    """(code_data in the v2 response format or None, confidence)"""
+    planned, confidence = plan(design_analysis)
+    if not planned or any(kind == "unknown" for kind, _ in planned):
+        return None, confidence
+
+    ctx: Dict[str, Any] = {}
+    header = "".join(COMPONENTS[kind](section, ctx) for kind, section in planned if kind == "navbar")
+    body = "".join(COMPONENTS[kind](section, ctx) for kind, section in planned if kind not in ("navbar", "footer"))
+    footer = "".join(COMPONENTS[kind](section, ctx) for kind, section in planned if kind == "footer")
+    kinds = [kind for kind, _ in planned]
+
+    index_html = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{_esc(title)}</title>
+    <link rel="stylesheet" href="styles.css">
+</head>
+<body>{header}
+    <main>{body}
+    </main>{footer}
+    <script src="script.js"></script>
+</body>
+</html>
+"""
+
+    features = ["responsive", "buttons"]
+    if "navbar" in kinds:
+        features.append("navigation")
+    if "form" in kinds:
+        features.extend(["forms", "validation"])
+    if "gallery" in kinds:
+        features.append("lightbox")
+
+    return {
+        "project_structure": [
+            {"file": "index.html", "content": index_html},
+            {"file": "styles.css", "content": _css(_palette(design_analysis))},
+            {"file": "script.js", "content": _JS},
+        ],
+        "explanation": f"Generated locally from templates ({' + '.join(kinds)}), confidence {confidence:.2f}",
+        "layout_type": "template:" + "+".join(kinds),
+        "functional_features": features,
+    }, confidence
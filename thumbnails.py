@@ -0,0 +1,298 @@
+"""
+Project thumbnails for the dashboard.
+
+The project grid used to show titles only; opening a project to see what
+it is meant downloading its whole design. Saving a project now schedules a
+small SVG rendering of its fabric JSON on a worker pool, off the request
+path. Thumbnails are stored once per design content hash in the
+thumbnails collection (duplicated or reverted designs share one) and the
+project records the hash of its current thumbnail.
+
+/api/projects/<id>/thumbnail?v=<hash> is cacheable forever, since a new
+design means a new hash and a new URL. Images are drawn as grey boxes:
+embedding data URLs would make thumbnails as heavy as the designs.
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from bson import ObjectId
+
+import metrics
+
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_CACHE_SIZE = int(os.getenv("THUMBNAIL_CACHE_SIZE", "512"))
+THUMBNAIL_WAIT = 2               # s the endpoint waits for a missing thumbnail
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_HEIGHT = 200
+THUMBNAIL_MAX_OBJECTS = 400
+THUMBNAIL_MAX_TEXT = 40
+THUMBNAIL_PADDING = 10
+
+# Thumbnails never change for a given hash; private: they show a user's own work
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+THUMBNAIL_CSP = "default-src 'none'; style-src 'unsafe-inline'"
+
+IMAGE_PLACEHOLDER = "#d0d4dc"
+_COLOUR_RE = re.compile(r"^[#\w(),.% -]{1,40}$")
+_ORIGINS = {"left": 0.0, "top": 0.0, "center": 0.5, "right": 1.0, "bottom": 1.0}
+
+PLACEHOLDER_SVG = (
+    f'<svg xmlns="http://www.w3.org/2000/svg" width="{THUMBNAIL_WIDTH}" height="{THUMBNAIL_HEIGHT}" '
+    f'viewBox="0 0 {THUMBNAIL_WIDTH} {THUMBNAIL_HEIGHT}"><rect width="100%" height="100%" fill="#f3f4f6"/></svg>'
+).encode("utf-8")
+
+
+def design_hash(design: Dict[str, Any]) -> str:
+    canonical = json.dumps(design, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+# --------------------------------------
+# Rendering
+# --------------------------------------
+def _num(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _colour(value: Any, default: str = "none") -> str:
+    # Gradients and patterns are objects; a flat grey is close enough at this size
+    if isinstance(value, dict):
+        return "#c0c4cc"
+    if isinstance(value, str) and _COLOUR_RE.match(value):
+        return value
+    return default
+
+
+def _box(obj: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """(x, y, w, h) of the object's unrotated box in its parent's coordinates"""
+    w = _num(obj.get("width")) * _num(obj.get("scaleX"), 1.0)
+    h = _num(obj.get("height")) * _num(obj.get("scaleY"), 1.0)
+    x = _num(obj.get("left")) - w * _ORIGINS.get(obj.get("originX"), 0.0)
+    y = _num(obj.get("top")) - h * _ORIGINS.get(obj.get("originY"), 0.0)
+    return x, y, w, h
+
+
+def _paint(obj: Dict[str, Any], default_fill: str = "none") -> str:
+    attrs = f' fill={quoteattr(_colour(obj.get("fill"), default_fill))}'
+    if obj.get("stroke"):
+        attrs += f' stroke={quoteattr(_colour(obj.get("stroke")))} stroke-width="{_fmt(_num(obj.get("strokeWidth"), 1.0))}"'
+    opacity = _num(obj.get("opacity"), 1.0)
+    if opacity < 1:
+        attrs += f' opacity="{_fmt(opacity)}"'
+    return attrs
+
+
+def _path_data(path: Any) -> str:
+    if not isinstance(path, list):
+        return ""
+    commands = []
+    for command in path[:2000]:
+        if isinstance(command, list) and command and isinstance(command[0], str):
+            commands.append(command[0][:1] + " ".join(_fmt(_num(v)) for v in command[1:]))
+    return "".join(commands)
+
+
+def _render_object(obj: Dict[str, Any], out: List[str]):
+    if not isinstance(obj, dict) or obj.get("visible") is False:
+        return
+    kind = str(obj.get("type", "")).lower()
+    x, y, w, h = _box(obj)
+    angle = _num(obj.get("angle"))
+    # fabric rotates about the object's origin point, i.e. (left, top)
+    rotate = f' transform="rotate({_fmt(angle)} {_fmt(_num(obj.get("left")))} {_fmt(_num(obj.get("top")))})"' if angle else ""
+
+    if kind == "rect":
+        rx = _num(obj.get("rx")) * _num(obj.get("scaleX"), 1.0)
+        radius = f' rx="{_fmt(rx)}"' if rx else ""
+        out.append(f'<rect x="{_fmt(x)}" y="{_fmt(y)}" width="{_fmt(w)}" height="{_fmt(h)}"{radius}{_paint(obj)}{rotate}/>')
+    elif kind in ("circle", "ellipse"):
+        out.append(f'<ellipse cx="{_fmt(x + w / 2)}" cy="{_fmt(y + h / 2)}" rx="{_fmt(w / 2)}" ry="{_fmt(h / 2)}"'
+                   f'{_paint(obj)}{rotate}/>')
+    elif kind == "triangle":
+        points = f"{_fmt(x + w / 2)},{_fmt(y)} {_fmt(x + w)},{_fmt(y + h)} {_fmt(x)},{_fmt(y + h)}"
+        out.append(f'<polygon points="{points}"{_paint(obj)}{rotate}/>')
+    elif kind == "line":
+        # x1..y2 are relative to the line's centre; their signs give its direction
+        flip_x = _num(obj.get("x1")) > _num(obj.get("x2"))
+        flip_y = _num(obj.get("y1")) > _num(obj.get("y2"))
+        x1, x2 = (x + w, x) if flip_x else (x, x + w)
+        y1, y2 = (y + h, y) if flip_y else (y, y + h)
+        out.append(f'<line x1="{_fmt(x1)}" y1="{_fmt(y1)}" x2="{_fmt(x2)}" y2="{_fmt(y2)}"'
+                   f'{_paint(dict(obj, fill=None, stroke=obj.get("stroke") or "#000000"))}{rotate}/>')
+    elif kind in ("text", "i-text", "textbox"):
+        text = str(obj.get("text") or "").split("\n")[0][:THUMBNAIL_MAX_TEXT]
+        if text.strip():
+            size = _num(obj.get("fontSize"), 16.0) * _num(obj.get("scaleY"), 1.0)
+            weight = ' font-weight="bold"' if str(obj.get("fontWeight")) in ("bold", "700", "800", "900") else ""
+            out.append(f'<text x="{_fmt(x)}" y="{_fmt(y + size)}" font-size="{_fmt(size)}" font-family="sans-serif"'
+                       f'{weight}{_paint(obj, "#000000")}{rotate}>{escape(text)}</text>')
+    elif kind == "image":
+        out.append(f'<rect x="{_fmt(x)}" y="{_fmt(y)}" width="{_fmt(w)}" height="{_fmt(h)}" fill="{IMAGE_PLACEHOLDER}"{rotate}/>')
+    elif kind in ("path", "polyline", "polygon"):
+        if kind == "path":
+            d = _path_data(obj.get("path"))
+        else:
+            points = [p for p in obj.get("points") or [] if isinstance(p, dict)]
+            d = "M" + "L".join(f"{_fmt(_num(p.get('x')))} {_fmt(_num(p.get('y')))}" for p in points) if points else ""
+            d += "Z" if d and kind == "polygon" else ""
+        if d:
+            # Path points are relative to pathOffset, which sits at the object's centre
+            offset = obj.get("pathOffset") or {}
+            transform = (f'translate({_fmt(x + w / 2)} {_fmt(y + h / 2)}) '
+                         f'scale({_fmt(_num(obj.get("scaleX"), 1.0))} {_fmt(_num(obj.get("scaleY"), 1.0))}) '
+                         f'translate({_fmt(-_num(offset.get("x")))} {_fmt(-_num(offset.get("y")))})')
+            out.append(f'<g{rotate}><path d={quoteattr(d)}{_paint(obj)} transform="{transform}"/></g>')
+    elif kind in ("group", "activeselection"):
+        # Children are positioned relative to the group's centre
+        transform = (f'translate({_fmt(x + w / 2)} {_fmt(y + h / 2)}) '
+                     f'scale({_fmt(_num(obj.get("scaleX"), 1.0))} {_fmt(_num(obj.get("scaleY"), 1.0))})')
+        out.append(f'<g{rotate}><g transform="{transform}">')
+        for child in (obj.get("objects") or [])[:THUMBNAIL_MAX_OBJECTS]:
+            _render_object(child, out)
+        out.append("</g></g>")
+
+
+def render_svg(design: Dict[str, Any]) -> bytes:
+    """A THUMBNAIL_WIDTH x THUMBNAIL_HEIGHT SVG of the design, fitted to its content"""
+    objects = [o for o in (design or {}).get("objects") or [] if isinstance(o, dict)][:THUMBNAIL_MAX_OBJECTS]
+    background = _colour((design or {}).get("background"), "#ffffff")
+    if not objects:
+        return PLACEHOLDER_SVG
+
+    boxes = [_box(o) for o in objects]
+    left = min(0.0, min(b[0] for b in boxes)) - THUMBNAIL_PADDING
+    top = min(0.0, min(b[1] for b in boxes)) - THUMBNAIL_PADDING
+    right = max(b[0] + b[2] for b in boxes) + THUMBNAIL_PADDING
+    bottom = max(b[1] + b[3] for b in boxes) + THUMBNAIL_PADDING
+    # Keep the thumbnail's aspect ratio so every card in the grid lines up
+    width, height = max(1.0, right - left), max(1.0, bottom - top)
+    if width / height < THUMBNAIL_WIDTH / THUMBNAIL_HEIGHT:
+        width = height * THUMBNAIL_WIDTH / THUMBNAIL_HEIGHT
+    else:
+        height = width * THUMBNAIL_HEIGHT / THUMBNAIL_WIDTH
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{THUMBNAIL_WIDTH}" height="{THUMBNAIL_HEIGHT}" '
+        f'viewBox="{_fmt(left)} {_fmt(top)} {_fmt(width)} {_fmt(height)}">',
+        f'<rect x="{_fmt(left)}" y="{_fmt(top)}" width="{_fmt(width)}" height="{_fmt(height)}" fill={quoteattr(background)}/>',
+    ]
+    for obj in objects:
+        _render_object(obj, out)
+    out.append("</svg>")
+    return "".join(out).encode("utf-8")
+
+
+# --------------------------------------
+# Store and worker pool
+# --------------------------------------
+class ThumbnailStore:
+    """Rendered thumbnails by design hash, with projects pointing at their current one"""
+
+    def __init__(self, collection, projects, workers: int = THUMBNAIL_WORKERS):
+        self.collection = collection
+        self.projects = projects
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.lock = threading.Lock()
+        self.cache: "OrderedDict[str, bytes]" = OrderedDict()
+        # project_id -> (updated_at, Future) of the render queued or running for it
+        self.in_flight: Dict[str, Tuple[datetime.datetime, Future]] = {}
+
+    def schedule(self, project_id: str, design: Dict[str, Any], updated_at: datetime.datetime) -> Future:
+        """Render in the background; the Future gives the thumbnail's hash.
+        A project's render for the same save is queued only once, however many requests ask"""
+        with self.lock:
+            pending = self.in_flight.get(project_id)
+            if pending is not None and pending[0] == updated_at:
+                return pending[1]
+            future = self.pool.submit(self._render_project, project_id, design, updated_at)
+            self.in_flight[project_id] = (updated_at, future)
+        future.add_done_callback(lambda f: self._finished(project_id, f))
+        return future
+
+    def pending(self, project_id: str, updated_at: datetime.datetime) -> Optional[Future]:
+        """The render already queued for this save of the project, if any"""
+        with self.lock:
+            pending = self.in_flight.get(project_id)
+        return pending[1] if pending is not None and pending[0] == updated_at else None
+
+    def _finished(self, project_id: str, future: Future):
+        with self.lock:
+            pending = self.in_flight.get(project_id)
+            if pending is not None and pending[1] is future:
+                del self.in_flight[project_id]
+
+    def _render_project(self, project_id: str, design: Dict[str, Any], updated_at: datetime.datetime) -> Optional[str]:
+        try:
+            digest = design_hash(design)
+            if self.get(digest) is None:
+                start = time.perf_counter()
+                svg = render_svg(design)
+                metrics.THUMBNAIL_RENDER_SECONDS.observe(time.perf_counter() - start)
+                self.collection.update_one(
+                    {"_id": digest},
+                    {"$setOnInsert": {"svg": svg, "created_at": datetime.datetime.utcnow()}},
+                    upsert=True,
+                )
+                self._remember(digest, svg)
+                metrics.THUMBNAILS.labels(event="rendered").inc()
+            else:
+                metrics.THUMBNAILS.labels(event="reused").inc()
+            # Only if the project was not saved again meanwhile: a newer save schedules its own
+            self.projects.update_one(
+                {"_id": ObjectId(project_id), "updated_at": updated_at},
+                {"$set": {"thumbnail": digest}},
+            )
+            return digest
+        except Exception as e:
+            print(f"⚠️ Thumbnail for project {project_id} failed: {e}")
+            metrics.THUMBNAILS.labels(event="failed").inc()
+            return None
+
+    def _remember(self, digest: str, svg: bytes):
+        with self.lock:
+            self.cache[digest] = svg
+            while len(self.cache) > THUMBNAIL_CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self.lock:
+            svg = self.cache.get(digest)
+            if svg is not None:
+                self.cache.move_to_end(digest)
+                return svg
+        doc = self.collection.find_one({"_id": digest})
+        if not doc:
+            return None
+        svg = bytes(doc["svg"])
+        self._remember(digest, svg)
+        return svg
+
+
+def build_response(svg: bytes, digest: Optional[str], versioned: bool, request, response_class):
+    """SVG response; cached forever when the URL names its hash, else revalidated by ETag"""
+    headers = {
+        "Cache-Control": THUMBNAIL_CACHE_CONTROL if versioned else "private, no-cache",
+        "Content-Security-Policy": THUMBNAIL_CSP,
+        "X-Content-Type-Options": "nosniff",
+    }
+    if digest:
+        headers["ETag"] = f'"{digest}"'
+        if digest in request.if_none_match:
+            return response_class(status=304, headers=headers)
+    return response_class(svg, mimetype="image/svg+xml", headers=headers)
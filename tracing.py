@@ -0,0 +1,292 @@
+"""
+Lightweight request tracing.
+
+Every Flask request gets a trace (id taken from X-Request-ID or generated)
+and code can open nested spans with `tracing.span(...)`. Finished traces
+go to a bounded in-memory ring buffer for /debug/traces and, when
+OTEL_EXPORTER_OTLP_ENDPOINT is set, are shipped as OTLP/JSON to a local
+collector from a background thread. X-Request-ID and traceparent are sent
+on to the chat-completion upstream only with TRACE_PROPAGATE_UPSTREAM=1,
+for a self-hosted or traced gateway: a third-party API has no use for our
+trace ids.
+"""
+import contextvars
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import requests
+from flask import g, request
+
+import metrics
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").rstrip("/")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "whiteboard2web")
+PROPAGATE_UPSTREAM = os.getenv("TRACE_PROPAGATE_UPSTREAM", "0") == "1"
+
+# Routes that would only flood the buffer
+UNTRACED_ENDPOINTS = {"static", "dist_asset", "metrics_endpoint", "debug_traces", None}
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+finished_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name: str, request_id: Optional[str] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id or self.trace_id
+        self.name = name
+        self.spans: List["Span"] = []
+        self.lock = threading.Lock()
+
+    @property
+    def root(self) -> "Span":
+        return self.spans[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.root
+        depths = {}
+        spans = []
+        for s in self.spans:
+            # Parents always start (and are appended) before their children
+            depths[s.span_id] = depths.get(s.parent_id, -1) + 1
+            spans.append(dict(s.to_dict(root.start_ns), depth=depths[s.span_id]))
+        return {
+            "trace_id": self.trace_id,
+            "request_id": self.request_id,
+            "name": self.name,
+            "start_ns": root.start_ns,
+            "duration_ms": root.duration_ms,
+            "status": root.status,
+            "spans": spans,
+        }
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        with trace.lock:
+            trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self, trace_start_ns: int) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": (self.start_ns - trace_start_ns) / 1e6,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    active = _current_span.get()
+    return active.trace.request_id if active else None
+
+
+def traceparent() -> Optional[str]:
+    """W3C trace context header value for outgoing calls"""
+    active = _current_span.get()
+    if not active:
+        return None
+    return f"00-{active.trace.trace_id}-{active.span_id}-01"
+
+
+def _start(name: str, attributes: Dict[str, Any], request_id: Optional[str] = None) -> Span:
+    parent = _current_span.get()
+    if parent is None:
+        return Span(Trace(name, request_id), name, None, attributes)
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def _finish(active: Span, error: Optional[BaseException] = None):
+    active.end_ns = time.time_ns()
+    if error is not None:
+        active.status = "error"
+        active.attributes.setdefault("error", repr(error)[:200])
+    if active.parent_id is None:
+        _record(active.trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a child of the current span (or a new trace when there is none)"""
+    active = _start(name, attributes)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        _finish(active, e)
+        raise
+    else:
+        _finish(active)
+    finally:
+        _current_span.reset(token)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """A span that is also observed into the generation stage histogram"""
+    with span(name, **attributes) as active:
+        try:
+            yield active
+        finally:
+            metrics.observe_stage(name, active.duration_ms / 1000)
+
+
+def _record(trace: Trace):
+    with _buffer_lock:
+        finished_traces.append(trace)
+    if OTLP_ENDPOINT:
+        _exporter.submit(trace)
+
+
+def recent_traces(limit: int = 50) -> List[Dict[str, Any]]:
+    with _buffer_lock:
+        traces = list(finished_traces)[-limit:]
+    return [t.to_dict() for t in reversed(traces)]
+
+
+def get_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    with _buffer_lock:
+        for t in finished_traces:
+            if t.trace_id == trace_id or t.request_id == trace_id:
+                return t.to_dict()
+    return None
+
+
+# --------------------------------------
+# OTLP/HTTP JSON export
+# --------------------------------------
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    spans = []
+    for s in trace.spans:
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 2 if s.parent_id is None else 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2 if s.status == "error" else 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "whiteboard2web.tracing"}, "spans": spans}],
+    }]}
+
+
+class _OTLPExporter:
+    """Ships traces off the request thread; drops them if the collector falls behind"""
+
+    def __init__(self, max_queue: int = 1000):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, trace: Trace):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                self.thread.start()
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            trace = self.queue.get()
+            try:
+                requests.post(f"{OTLP_ENDPOINT}/v1/traces", json=to_otlp(trace), timeout=2)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ OTLP export failed: {e}")
+
+
+_exporter = _OTLPExporter()
+
+
+# --------------------------------------
+# Flask integration
+# --------------------------------------
+def init_app(app):
+    @app.before_request
+    def _start_request_trace():
+        if request.endpoint in UNTRACED_ENDPOINTS:
+            return
+        incoming = request.headers.get("X-Request-ID", "")
+        request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        root = _start(f"{request.method} {request.url_rule.rule}", {
+            "http.method": request.method,
+            "http.route": request.endpoint,
+        }, request_id=request_id)
+        g.trace_span = root
+        g.trace_token = _current_span.set(root)
+
+    @app.after_request
+    def _tag_response(response):
+        root = g.get("trace_span")
+        if root is not None:
+            root.set_attribute("http.status_code", response.status_code)
+            if response.status_code >= 500:
+                root.status = "error"
+            response.headers["X-Request-ID"] = root.trace.request_id
+        return response
+
+    @app.teardown_request
+    def _end_request_trace(error=None):
+        root = g.pop("trace_span", None)
+        token = g.pop("trace_token", None)
+        if root is None:
+            return
+        _finish(root, error)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Streamed responses finish in a different context than they started
+            pass
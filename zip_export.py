@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
+
+# Streamed to the client in slices of this size
+ZIP_CHUNK_SIZE = 64 * 1024
+
+# Upper bound for the compressed-entry cache shared by all downloads in this worker
+ZIP_CACHE_MAX_BYTES = int(os.getenv("ZIP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_UTF8_FLAG = 0x0800
+_DEFLATED = 8
+_VERSION = 20
+# "Made by" UNIX (create_system 3): without it unzip ignores the mode in external_attr
+_MADE_BY_UNIX = (3 << 8) | _VERSION
+_FILE_MODE = 0o100644        # regular file, rw-r--r--
+
+
+class CompressedEntryCache:
+    """LRU of deflated file bodies keyed by the sha256 of the raw content.
+
+    Generated projects share a lot of files (fallback templates, re-downloads
+    of the same artifact), so repeat downloads skip compression entirely.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_compress(self, data: bytes) -> Tuple[int, bytes]:
+        key = hashlib.sha256(data).digest()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        entry = (zlib.crc32(data) & 0xFFFFFFFF, compressed)
+
+        with self.lock:
+            if key not in self.entries and len(compressed) <= self.max_bytes:
+                self.entries[key] = entry
+                self.size += len(compressed)
+                while self.size > self.max_bytes:
+                    _, (_, evicted) = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return entry
+
+
+entry_cache = CompressedEntryCache(ZIP_CACHE_MAX_BYTES)
+
+
+def _dos_datetime(when: datetime.datetime) -> Tuple[int, int]:
+    year = max(when.year, 1980)
+    dos_time = (when.hour << 11) | (when.minute << 5) | (when.second // 2)
+    dos_date = ((year - 1980) << 9) | (when.month << 5) | when.day
+    return dos_time, dos_date
+
+
+def stream_zip(files: Iterable[Tuple[str, bytes]], when: datetime.datetime = None) -> Iterator[bytes]:
+    """Yield a ZIP archive entry by entry.
+
+    Only one compressed entry is held at a time (or borrowed from the cache),
+    so the archive is never assembled in memory. Sizes are known before each
+    local header is written, which keeps the output readable by every unzip
+    tool without data descriptors.
+    """
+    dos_time, dos_date = _dos_datetime(when or datetime.datetime.utcnow())
+    central_directory = []
+    offset = 0
+
+    for name, data in files:
+        crc, compressed = entry_cache.get_or_compress(data)
+        encoded_name = name.encode("utf-8")
+
+        local_header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034b50, _VERSION, _UTF8_FLAG, _DEFLATED, dos_time, dos_date,
+            crc, len(compressed), len(data), len(encoded_name), 0
+        ) + encoded_name
+
+        central_directory.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014b50, _MADE_BY_UNIX, _VERSION, _UTF8_FLAG, _DEFLATED, dos_time, dos_date,
+            crc, len(compressed), len(data), len(encoded_name), 0, 0, 0, 0,
+            _FILE_MODE << 16, offset
+        ) + encoded_name)
+
+        yield local_header
+        for start in range(0, len(compressed), ZIP_CHUNK_SIZE):
+            yield compressed[start:start + ZIP_CHUNK_SIZE]
+        offset += len(local_header) + len(compressed)
+
+    directory = b"".join(central_directory)
+    yield directory
+    yield struct.pack(
+        "<IHHHHIIH",
+        0x06054b50, 0, 0, len(central_directory), len(central_directory),
+        len(directory), offset, 0
+    )
+
+
+def build_readme(code_data: Dict[str, Any], generated_at: datetime.datetime = None) -> str:
+    """Server-side copy of the README code_display.html used to download alongside the files"""
+    files: List[Dict[str, Any]] = code_data.get("project_structure", [])
+    features = code_data.get("functional_features") or []
+    first_html = next((f["file"] for f in files if f.get("file", "").endswith(".html")), "index.html")
+    generated_at = generated_at or datetime.datetime.utcnow()
+
+    return f"""# Generated by Whiteboard2Web
+
+## Project Information
+- Layout Type: {code_data.get('layout_type') or 'Web Design'}
+- Generated: {generated_at.strftime('%Y-%m-%d %H:%M:%S')} UTC
+- Features: {', '.join(features) if features else 'Responsive, Interactive'}
+
+## How to Run
+1. Place all files in the same directory
+2. Open {first_html} in a web browser
+3. All interactive features should work immediately
+
+## Files
+{chr(10).join(f"- {f.get('file')}" for f in files)}
+
+## Notes
+{code_data.get('explanation') or 'Generated from visual design using Whiteboard2Web AI.'}
+
+## Testing
+- Test all buttons and forms
+- Verify responsive design
+- Check console for any errors
+
+Enjoy your fully functional website! 🚀
+"""
+
+
+def iter_project_files(code_data: Dict[str, Any], generated_at: datetime.datetime = None) -> Iterator[Tuple[str, bytes]]:
+    """(name, bytes) pairs for every project file plus the generated README"""
+    seen = set()
+    for f in code_data.get("project_structure", []):
+        # Strip leading slashes and parent references so entries stay inside the archive
+        name = "/".join(p for p in str(f.get("file", "")).replace("\\", "/").split("/") if p not in ("", ".", ".."))
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        yield name, (f.get("content") or "").encode("utf-8")
+
+    if "README.md" not in seen:
+        yield "README.md", build_readme(code_data, generated_at).encode("utf-8")